@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useCallback } from "react";
 import dayjs from "dayjs";
-import { getAttendance, getUsersSummary, getRecentAttendance } from "./api";
+import { getAttendance, getUsersSummary, getRecentAttendance, pollAttendanceStream } from "./api";
 
 export default function Dashboard() {
   const [date, setDate] = useState(dayjs().format("YYYY-MM-DD"));
@@ -9,6 +9,7 @@ export default function Dashboard() {
   const [loading, setLoading] = useState(false);
   const [err, setErr] = useState("");
   const [viewMode, setViewMode] = useState("date"); // "date" or "recent"
+  const [cursor, setCursor] = useState(null);
 
   const load = useCallback(async () => {
     setLoading(true);
@@ -22,6 +23,7 @@ export default function Dashboard() {
       }
       
       const items = Array.isArray(data?.items) ? data.items : [];
+      setCursor(viewMode === "recent" ? data?.cursor || null : null);
 
       // Sort by timestamp descending (latest first)
       items.sort((a, b) => (b.timestamp || "").localeCompare(a.timestamp || ""));
@@ -43,6 +45,28 @@ export default function Dashboard() {
       .catch(() => setTotalUsers(0));
   }, [date, viewMode, load]);
 
+  // Recent view: long-poll for new check-ins instead of re-querying
+  useEffect(() => {
+    if (viewMode !== "recent" || !cursor) return;
+    const controller = new AbortController();
+    let position = cursor;
+    (async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const data = await pollAttendanceStream(position, 25, controller.signal);
+          position = data.cursor;
+          const fresh = Array.isArray(data.items) ? data.items.slice().reverse() : [];
+          if (data.reset) setRows(fresh.slice(0, 50));
+          else if (fresh.length) setRows(prev => [...fresh, ...prev].slice(0, 50));
+        } catch (e) {
+          if (controller.signal.aborted) return;
+          await new Promise(r => setTimeout(r, 5000));
+        }
+      }
+    })();
+    return () => controller.abort();
+  }, [viewMode, cursor]);
+
   // ✅ Convert UTC ISO string to readable IST time
   const prettyIST = (iso) =>
     iso
@@ -22,11 +22,16 @@ export const uploadAndEnroll = (payload) =>
 export const getAttendance = (dateStr) =>
   axios.get(withKey(`${BASE}/getattendance?date=${dateStr}`)).then(r=>r.data);
 
-export const listUsers = () =>
-  axios.get(withKey(`${BASE}/listusers`)).then(r=>r.data);
+// params: { limit, fields, q, continuation } -> { items, continuation }
+export const listUsers = (params = {}) =>
+  axios.get(withKey(`${BASE}/listusers`), { params }).then(r=>r.data);
 
 export const getUsersSummary = () =>
   axios.get(withKey(`${BASE}/userssummary`)).then(r=>r.data);
 
 export const getRecentAttendance = () =>
   axios.get(withKey(`${BASE}/attendancerecent`)).then(r=>r.data);
+
+// Long-poll: resolves with { cursor, reset, items } once newer check-ins arrive (or after `wait` s)
+export const pollAttendanceStream = (cursor, wait = 25, signal) =>
+  axios.get(withKey(`${BASE}/attendancestream`), { params: { cursor, wait }, signal }).then(r=>r.data);
@@ -0,0 +1,174 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on L2-normalized rows; returns k unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists from random rows so every list stays usable
+            sums[empty] = x[rng.choice(len(x), size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index for cosine similarity over unit-norm float32 vectors.
+    - Vectors are grouped by nearest centroid and stored contiguously per list,
+      so probing a list is one slice and one matmul.
+    - `nprobe` trades recall for latency: more lists probed -> closer to exact search.
+    - New vectors are assigned a list at insert time and kept in a small pending
+      buffer (scanned exhaustively) until it is merged into the main layout.
+    - save()/load() use plain .npy files; load() memory-maps the big arrays so a
+      cold start does not rebuild or copy the index.
+    """
+
+    FILES = ("centroids", "vectors", "ids", "offsets", "pending_vectors", "pending_ids")
+
+    def __init__(self, dim: int, nlist: int = 256, nprobe: int = 8, merge_fraction: float = 0.05,
+                 min_merge: int = 1024):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.merge_fraction = merge_fraction
+        self.min_merge = min_merge
+        self.centroids = None
+        self.vectors = np.zeros((0, dim), dtype=np.float32)   # list-ordered
+        self.ids = np.zeros(0, dtype=np.int64)                 # caller ids, list-ordered
+        self.offsets = np.zeros(1, dtype=np.int64)            # list i = [offsets[i], offsets[i+1])
+        self._pending_vectors = []
+        self._pending_ids = []
+        self._lock = threading.Lock()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.ids) + len(self._pending_ids)
+
+    def train(self, vectors: np.ndarray, ids: np.ndarray, iters: int = 10):
+        """Fit centroids on `vectors` and (re)build the index from them."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        nlist = max(1, min(self.nlist, len(vectors)))
+        centroids = _kmeans(vectors, nlist, iters=iters)
+        with self._lock:
+            self.centroids = centroids
+            self.nlist = nlist
+            self._pending_vectors, self._pending_ids = [], []
+            self._layout(vectors, np.asarray(ids, dtype=np.int64))
+
+    def _layout(self, vectors: np.ndarray, ids: np.ndarray):
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.ids = ids[order]
+        counts = np.bincount(assign, minlength=self.nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def add(self, vectors: np.ndarray, ids) -> bool:
+        """
+        Insert vectors incrementally; they are merged into the list layout in batches.
+        Returns True when this insert triggered a merge (the main arrays changed).
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            self._pending_vectors.extend(vectors)
+            self._pending_ids.extend(int(i) for i in np.atleast_1d(ids))
+            if self.trained and len(self._pending_ids) >= max(self.min_merge,
+                                                               self.merge_fraction * len(self.ids)):
+                self._merge_locked()
+                return True
+            return False
+
+    def _merge_locked(self):
+        vectors = np.concatenate([np.asarray(self.vectors), np.stack(self._pending_vectors)])
+        ids = np.concatenate([np.asarray(self.ids), np.asarray(self._pending_ids, dtype=np.int64)])
+        self._pending_vectors, self._pending_ids = [], []
+        self._layout(vectors, ids)
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = None):
+        """Return (ids, similarities) of up to k approximate nearest vectors, best first."""
+        nprobe = nprobe or self.nprobe
+        with self._lock:
+            centroids, vectors, ids, offsets = self.centroids, self.vectors, self.ids, self.offsets
+            pending_v = np.stack(self._pending_vectors) if self._pending_vectors else None
+            pending_i = np.asarray(self._pending_ids, dtype=np.int64) if self._pending_ids else None
+
+        cand_ids, cand_sims = [], []
+        if centroids is not None and len(ids):
+            probe = np.argpartition(-(centroids @ query), min(nprobe, len(centroids)) - 1)[:nprobe]
+            for lst in probe:
+                lo, hi = offsets[lst], offsets[lst + 1]
+                if hi > lo:
+                    cand_sims.append(vectors[lo:hi] @ query)
+                    cand_ids.append(ids[lo:hi])
+        if pending_v is not None:
+            cand_sims.append(pending_v @ query)
+            cand_ids.append(pending_i)
+        if not cand_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        sims = np.concatenate(cand_sims)
+        found = np.concatenate(cand_ids)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return found[top], sims[top]
+
+    def _pending_arrays_locked(self) -> dict:
+        return {
+            "pending_vectors": (np.stack(self._pending_vectors) if self._pending_vectors
+                                else np.zeros((0, self.dim), np.float32)),
+            "pending_ids": np.asarray(self._pending_ids, dtype=np.int64),
+        }
+
+    def save(self, directory: str, pending_only: bool = False):
+        """
+        Write the index as .npy files (pending inserts included).
+        `pending_only` rewrites just the small pending buffer after an incremental add.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            arrays = self._pending_arrays_locked()
+            if not pending_only:
+                arrays.update({
+                    "centroids": self.centroids if self.trained else np.zeros((0, self.dim), np.float32),
+                    "vectors": np.asarray(self.vectors),
+                    "ids": np.asarray(self.ids),
+                    "offsets": self.offsets,
+                })
+        for name, arr in arrays.items():
+            tmp = os.path.join(directory, f".{name}.tmp.npy")
+            np.save(tmp, arr)
+            os.replace(tmp, os.path.join(directory, f"{name}.npy"))
+
+    @classmethod
+    def load(cls, directory: str, nprobe: int = 8, **kwargs):
+        """Memory-map a saved index; returns None if nothing is saved there."""
+        if not all(os.path.exists(os.path.join(directory, f"{n}.npy")) for n in cls.FILES):
+            return None
+        arrays = {n: np.load(os.path.join(directory, f"{n}.npy"),
+                             mmap_mode="r" if n in ("vectors", "ids") else None)
+                  for n in cls.FILES}
+        index = cls(dim=arrays["vectors"].shape[1], nlist=max(1, len(arrays["centroids"])),
+                    nprobe=nprobe, **kwargs)
+        if len(arrays["centroids"]):
+            index.centroids = np.asarray(arrays["centroids"], dtype=np.float32)
+        index.vectors, index.ids, index.offsets = arrays["vectors"], arrays["ids"], arrays["offsets"]
+        index._pending_vectors = list(arrays["pending_vectors"])
+        index._pending_ids = [int(i) for i in arrays["pending_ids"]]
+        logging.info(f"IVF index loaded from {directory}: {len(index)} vectors, {index.nlist} lists")
+        return index
@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+def content_blob_name(prefix: str, data, day=None) -> str:
+    """
+    `<prefix>/<YYYY-MM-DD>/<sha256>.jpg`: the date folder (UTC today by default)
+    that exports and retention rely on, then the content hash, so identical
+    uploads on one day share one blob.
+    """
+    day = day or datetime.utcnow().date()
+    return f"{prefix}/{day}/{hashlib.sha256(data).hexdigest()}.jpg"
+
+
+def upload_if_absent(container, name: str, data) -> bool:
+    """Upload unless the blob already exists; True when this call wrote it."""
+    from azure.core.exceptions import ResourceExistsError
+
+    try:
+        container.upload_blob(name, data, overwrite=False, content_type="image/jpeg")
+        return True
+    except ResourceExistsError:
+        return False
+
+
+async def upload_if_absent_async(container, name: str, data) -> bool:
+    """upload_if_absent() for an azure.storage.blob.aio container client."""
+    from azure.core.exceptions import ResourceExistsError
+
+    try:
+        await container.upload_blob(name, data, overwrite=False, content_type="image/jpeg")
+        return True
+    except ResourceExistsError:
+        return False
+
+
+class BlobArchiver:
+    """
+    Spool-and-upload archival for images.
+    - put(name, data) writes the bytes under `spool_dir/<name>` (atomic rename)
+      and queues the upload; the blob name is final as soon as it returns.
+    - `workers` background threads upload with bounded concurrency. A cheap
+      existence check skips blobs already stored (content-hash names make
+      resubmissions duplicates); failures retry with exponential backoff.
+    - A worker claims a spooled file by renaming it (`<file>.<thread>.claim`)
+      before uploading, so a put() of the same name racing the upload writes a
+      fresh file and queues it again instead of having it deleted or dropped.
+    - Claimed files are deleted once uploaded; files (and claims) left by a
+      previous process are re-queued on start.
+    """
+
+    def __init__(self, container, spool_dir: str, workers: int = 4, max_attempts: int = 6,
+                 retry_backoff: float = 1.0):
+        self.container = container
+        self.spool_dir = spool_dir
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_backoff = float(retry_backoff)
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.uploaded = 0
+        self.skipped = 0
+        self.failed = 0
+
+        os.makedirs(spool_dir, exist_ok=True)
+        # Replayed before the workers start, so no claim is in flight while it runs
+        replayed = self._replay()
+        if replayed:
+            logging.info(f"Blob archiver re-queued {replayed} spooled images")
+        self._threads = [threading.Thread(target=self._run, name=f"blob-archiver-{i}", daemon=True)
+                         for i in range(max(1, int(workers)))]
+        for t in self._threads:
+            t.start()
+
+    @classmethod
+    def from_env(cls, container):
+        return cls(
+            container,
+            spool_dir=os.getenv("ARCHIVE_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "archive_spool")),
+            workers=int(os.getenv("ARCHIVE_WORKERS", "4")),
+            max_attempts=int(os.getenv("ARCHIVE_MAX_ATTEMPTS", "6")),
+        )
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.spool_dir, *name.split("/"))
+
+    def _replay(self) -> int:
+        count = 0
+        for root, _, files in os.walk(self.spool_dir):
+            for f in files:
+                if f.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, f)
+                if f.endswith(".claim"):
+                    # Claimed by a worker that never finished; put it back
+                    original = path.rsplit(".", 2)[0]
+                    os.replace(path, original)
+                    path = original
+                rel = os.path.relpath(path, self.spool_dir)
+                self._enqueue(rel.replace(os.sep, "/"))
+                count += 1
+        return count
+
+    def _enqueue(self, name: str, attempt: int = 1):
+        with self._lock:
+            if name in self._pending:
+                return
+            self._pending.add(name)
+        self._queue.put((name, attempt))
+
+    def put(self, name: str, data) -> str:
+        """Spool `data` for upload as `name`; returns `name`."""
+        path = self._path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        self._enqueue(name)
+        return name
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                name, attempt = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            claim = self._claim(name)
+            if claim is None:
+                continue  # a duplicate entry; the file was already uploaded
+            try:
+                self._upload(name, claim)
+            except Exception as e:
+                self._unclaim(name, claim)
+                if attempt >= self.max_attempts or self._stop.is_set():
+                    # Left in the spool; the next start retries it
+                    self.failed += 1
+                    logging.error(f"Archiving {name} failed after {attempt} attempts: {str(e)}")
+                    continue
+                delay = min(self.retry_backoff * 2 ** (attempt - 1), 60.0)
+                logging.warning(f"Archiving {name} failed: {str(e)}; retrying in {delay:.1f}s")
+                threading.Timer(delay, self._enqueue, args=(name, attempt + 1)).start()
+
+    def _claim(self, name: str):
+        """Move the spooled file aside for upload; None when there is none."""
+        path = self._path(name)
+        claim = f"{path}.{threading.get_ident()}.claim"
+        with self._lock:
+            # From here on a put() of this name writes a new file and queues it again
+            self._pending.discard(name)
+            try:
+                os.replace(path, claim)
+            except FileNotFoundError:
+                return None
+        return claim
+
+    def _unclaim(self, name: str, claim: str):
+        """Put a claimed file back after a failed upload (a newer put() has the same bytes)."""
+        with self._lock:
+            os.replace(claim, self._path(name))
+
+    def _upload(self, name: str, claim: str):
+        if self.container.get_blob_client(name).exists():
+            self.skipped += 1
+        else:
+            with open(claim, "rb") as f:
+                data = f.read()
+            if upload_if_absent(self.container, name, data):
+                self.uploaded += 1
+            else:
+                self.skipped += 1
+        os.remove(claim)
+
+    def close(self, timeout: float = 10.0):
+        """Upload what is queued (within `timeout`) and stop the workers."""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> dict:
+        return {
+            "queueDepth": self.depth,
+            "uploaded": self.uploaded,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,65 @@
+import logging
+import threading
+
+
+def attendance_id(user_id: str, local_date) -> str:
+    """Deterministic attendance id: one record per user per local day."""
+    return f"att-{user_id}-{local_date:%Y%m%d}"
+
+
+class DailyMarkIndex:
+    """
+    In-memory userId -> attendance record for the current local day.
+    - Loaded once per day (cold start or date rollover) through `loader(day)`,
+      which yields that day's records from Cosmos; the earliest record per user wins.
+    - Kept current by add() as new check-ins are written.
+    Only one day is held at a time, so memory is bounded by one day's roster.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._day = None
+        self._records = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self, day):
+        if self._day == day:
+            return
+        with self._load_lock:
+            if self._day == day:
+                return
+            records = {}
+            for row in self._loader(day):
+                records.setdefault(row.get("userId"), row)
+            with self._lock:
+                self._records, self._day = records, day
+            logging.info(f"Daily mark index loaded {len(records)} users for {day}")
+
+    def get(self, user_id: str, day):
+        """The user's record for `day` if already marked, else None."""
+        self._ensure_loaded(day)
+        with self._lock:
+            return self._records.get(user_id) if self._day == day else None
+
+    def claim(self, record: dict, day):
+        """
+        Atomically take the user's slot for `day`: None if `record` is now the
+        user's mark, else the record that got there first.
+        """
+        self._ensure_loaded(day)
+        with self._lock:
+            if self._day != day:
+                return None
+            existing = self._records.setdefault(record.get("userId"), record)
+            return None if existing is record else existing
+
+    def add(self, record: dict, day):
+        self._ensure_loaded(day)
+        with self._lock:
+            if self._day == day:
+                self._records.setdefault(record.get("userId"), record)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
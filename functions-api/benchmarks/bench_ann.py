@@ -0,0 +1,112 @@
+"""
+Recall vs latency of the IVF index against exact (brute-force) search.
+
+Builds a synthetic gallery shaped like enrollment data (students x images per
+student, unit-norm embeddings clustered per student), then for each nprobe
+reports recall@1 / recall@k against exact search and per-query latency.
+
+    python benchmarks/bench_ann.py --students 10000 --images 4 --nprobe 1 2 4 8 16 32
+    python benchmarks/bench_ann.py --out ann.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex  # noqa: E402
+from recognizer import EMBED_DIM  # noqa: E402
+
+
+def synthetic_gallery(students: int, images: int, dim: int, spread: float, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(students, dim)).astype(np.float32)
+    vectors = np.repeat(centers, images, axis=0) + spread * rng.normal(size=(students * images, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    labels = np.repeat(np.arange(students), images)
+    return vectors, labels, centers, rng
+
+
+def percentile_ms(samples, p):
+    return round(float(np.percentile(samples, p)) * 1000, 3)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--students", type=int, default=10000)
+    ap.add_argument("--images", type=int, default=4, help="enrolled images per student")
+    ap.add_argument("--dim", type=int, default=EMBED_DIM)
+    ap.add_argument("--spread", type=float, default=0.6, help="within-student noise")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nlist", type=int, default=0, help="0 = 4*sqrt(N)")
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write results as JSON to this path")
+    args = ap.parse_args()
+
+    vectors, labels, centers, rng = synthetic_gallery(args.students, args.images, args.dim, args.spread, args.seed)
+    n = len(vectors)
+    nlist = args.nlist or max(1, int(4 * np.sqrt(n)))
+
+    # Queries: fresh captures of enrolled students (center + new noise)
+    who = rng.integers(0, args.students, size=args.queries)
+    queries = centers[who] + args.spread * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    t0 = time.perf_counter()
+    index = IVFIndex(args.dim, nlist=nlist)
+    index.train(vectors, np.arange(n))
+    build_s = time.perf_counter() - t0
+
+    exact_ids, exact_lat = [], []
+    for q in queries:
+        t = time.perf_counter()
+        sims = vectors @ q
+        top = np.argpartition(-sims, args.k - 1)[:args.k]
+        top = top[np.argsort(-sims[top])]
+        exact_lat.append(time.perf_counter() - t)
+        exact_ids.append(top)
+
+    results = {
+        "config": {**vars(args), "gallery": n, "nlist": nlist, "buildSeconds": round(build_s, 3)},
+        "exact": {"p50Ms": percentile_ms(exact_lat, 50), "p95Ms": percentile_ms(exact_lat, 95),
+                  "labelAccuracy": float(np.mean([labels[e[0]] == w for e, w in zip(exact_ids, who)]))},
+        "ivf": [],
+    }
+
+    print(f"gallery={n} dim={args.dim} nlist={nlist} build={build_s:.2f}s")
+    print(f"exact      p50={results['exact']['p50Ms']:.3f}ms p95={results['exact']['p95Ms']:.3f}ms")
+    print(f"{'nprobe':>6} {'recall@1':>9} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+    for nprobe in args.nprobe:
+        hit1, hitk, lat = 0, 0.0, []
+        for q, exact in zip(queries, exact_ids):
+            t = time.perf_counter()
+            ids, _ = index.search(q, k=args.k, nprobe=nprobe)
+            lat.append(time.perf_counter() - t)
+            hit1 += int(len(ids) > 0 and ids[0] == exact[0])
+            hitk += len(np.intersect1d(ids, exact)) / args.k
+        row = {
+            "nprobe": nprobe,
+            "recallAt1": round(hit1 / args.queries, 4),
+            "recallAtK": round(hitk / args.queries, 4),
+            "p50Ms": percentile_ms(lat, 50),
+            "p95Ms": percentile_ms(lat, 95),
+        }
+        row["speedupP50"] = round(results["exact"]["p50Ms"] / max(row["p50Ms"], 1e-6), 2)
+        results["ivf"].append(row)
+        print(f"{nprobe:>6} {row['recallAt1']:>9.4f} {row['recallAtK']:>9.4f} "
+              f"{row['p50Ms']:>8.3f} {row['p95Ms']:>8.3f} {row['speedupP50']:>7.2f}x")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
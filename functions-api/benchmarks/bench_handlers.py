@@ -0,0 +1,231 @@
+"""
+Throughput and tail latency of the HTTP handlers and their hot helpers, offline.
+
+Blob Storage and Cosmos DB are in-process fakes and Custom Vision is a local
+HTTP stub (benchmarks/standins.py), each with configurable latency and error
+injection, so runs need no Azure resources and are repeatable. function_app
+is imported with the stand-ins installed; handlers are called directly with
+func.HttpRequest objects, as the Functions host would.
+
+Cases:
+  helpers   save_base64_jpeg, prepare_image, predict_image, date_window
+            (getAttendance date parsing + IST day window), json_day
+            (serializing one day's getAttendance payload)
+  handlers  markAttendance, uploadAndEnroll, getAttendance, listUsers,
+            usersSummary, attendanceRecent, exportAttendance
+
+    python benchmarks/bench_handlers.py --iterations 200 --out run.json
+    python benchmarks/bench_handlers.py --cosmos-ms 8 --blob-ms 15 --predict-ms 120 --concurrency 8
+    python benchmarks/bench_handlers.py --out new.json --baseline run.json --fail-on-regression
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standins import install_standins, seed_attendance, seed_roster, synthetic_frame  # noqa: E402
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+HELPER_CASES = ("save_base64_jpeg", "prepare_image", "predict_image", "date_window", "json_day")
+HANDLER_CASES = ("markAttendance", "uploadAndEnroll", "getAttendance", "listUsers",
+                 "usersSummary", "attendanceRecent", "exportAttendance")
+
+
+def percentile(sorted_samples: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_samples) + 0.5)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def measure(fn, iterations: int, warmup: int, concurrency: int) -> dict:
+    """
+    Run fn(i) `warmup` times untimed, then `iterations` times (closed loop,
+    `concurrency` callers); fn returns True on success.
+    """
+    for i in range(warmup):
+        fn(i)
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            ok = bool(fn(i))
+        except Exception:
+            ok = False
+        return time.perf_counter() - t0, ok
+
+    start = time.perf_counter()
+    indices = range(warmup, warmup + iterations)
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, indices))
+    else:
+        results = [one(i) for i in indices]
+    wall = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        "iterations": iterations,
+        "errors": sum(1 for r in results if not r[1]),
+        "opsPerSec": round(iterations / wall, 2) if wall else 0.0,
+        "meanMs": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50Ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95Ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99Ms": round(percentile(latencies, 99) * 1000, 3),
+        "maxMs": round(latencies[-1] * 1000, 3),
+    }
+
+
+def build_cases(app, func, frames: list, day: str) -> dict:
+    """name -> fn(i) for every case; `app` is the imported function_app module."""
+    def handler(name):
+        return getattr(app, name).build().get_user_function()
+
+    mark = handler("mark_attendance")
+    enroll = handler("uploadAndEnroll")
+    get_attendance = handler("getAttendance")
+    list_users = handler("listUsers")
+    users_summary = handler("usersSummary")
+    recent = handler("attendance_recent")
+    export = handler("exportAttendance")
+
+    b64_frames = [base64.b64encode(f).decode() for f in frames]
+    day_payload = {"ok": True, "count": 0, "items": list(app._query_day(day))}
+    day_payload["count"] = len(day_payload["items"])
+
+    def request(method, route, params=None, body=None, headers=None):
+        return func.HttpRequest(method=method, url=f"/api/{route}", params=params or {},
+                                body=json.dumps(body).encode() if body is not None else b"",
+                                headers={"Content-Type": "application/json", **(headers or {})})
+
+    def ok(response):
+        return response.status_code == 200
+
+    def frame(i):
+        return frames[i % len(frames)]
+
+    return {
+        # Unique bytes per call, so each one is a real upload
+        "save_base64_jpeg": lambda i: app.save_base64_jpeg("bench", frame(i) + i.to_bytes(8, "big")),
+        "prepare_image": lambda i: app._prepare_image(frame(i))[1] is not None,
+        "predict_image": lambda i: "predictions" in app.predict_image(frame(i)),
+        "date_window": lambda i: app._day_window_utc(datetime(*app._parse_date_flexible(
+            f"{(i % 28) + 1:02d}-{(i % 12) + 1:02d}-2024"), tzinfo=IST)),
+        "json_day": lambda i: json.dumps(day_payload),
+
+        "markAttendance": lambda i: ok(mark(request(
+            "POST", "markAttendance", body={"base64Image": b64_frames[i % len(b64_frames)]},
+            headers={"X-Device-Id": f"bench-{i % 16}"}))),
+        "uploadAndEnroll": lambda i: ok(enroll(request("POST", "uploadAndEnroll", body={
+            "name": f"Bench {i}", "roll": f"B{i:06d}", "userId": f"bench-{i:06d}",
+            "classLabel": f"bench-{i:06d}", "section": "Z",
+            "base64Image": b64_frames[i % len(b64_frames)]}))),
+        "getAttendance": lambda i: ok(get_attendance(request("GET", "getAttendance", params={"date": day}))),
+        "listUsers": lambda i: ok(list_users(request("GET", "listUsers", params={"limit": "100"}))),
+        "usersSummary": lambda i: ok(users_summary(request("GET", "usersSummary"))),
+        "attendanceRecent": lambda i: ok(recent(request("GET", "attendanceRecent"))),
+        "exportAttendance": lambda i: ok(export(request("GET", "exportAttendance", params={
+            "from": (datetime.fromisoformat(day) - timedelta(days=6)).strftime("%Y-%m-%d"),
+            "to": day, "format": "ndjson"}))),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Cases whose p95 grew or throughput fell by more than `tolerance` (fraction)."""
+    regressions = []
+    print(f"\n{'case':>20}  {'p95 ms':>21}  {'ops/s':>21}")
+    for name, new in results["cases"].items():
+        old = baseline.get("cases", {}).get(name)
+        if not old:
+            continue
+        p95 = (new["p95Ms"] - old["p95Ms"]) / old["p95Ms"] if old["p95Ms"] else 0.0
+        ops = (new["opsPerSec"] - old["opsPerSec"]) / old["opsPerSec"] if old["opsPerSec"] else 0.0
+        flag = p95 > tolerance or ops < -tolerance
+        if flag:
+            regressions.append(name)
+        print(f"{name:>20}  {old['p95Ms']:>8} -> {new['p95Ms']:>8} {p95:+6.1%}  "
+              f"{old['opsPerSec']:>8} -> {new['opsPerSec']:>8} {ops:+6.1%}{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=200)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=1, help="closed-loop callers per case")
+    ap.add_argument("--cases", nargs="+", choices=HELPER_CASES + HANDLER_CASES,
+                    default=list(HELPER_CASES + HANDLER_CASES))
+    ap.add_argument("--users", type=int, default=500, help="seeded roster size")
+    ap.add_argument("--frames", type=int, default=64, help="distinct synthetic camera frames")
+    ap.add_argument("--blob-ms", type=float, default=0.0)
+    ap.add_argument("--cosmos-ms", type=float, default=0.0)
+    ap.add_argument("--predict-ms", type=float, default=0.0)
+    ap.add_argument("--training-ms", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.25, help="latency jitter as a fraction of the mean")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="injected failure rate per round trip")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write results as JSON to this path")
+    ap.add_argument("--baseline", help="earlier --out file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="allowed p95/throughput change vs baseline")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args()
+
+    os.chdir(HERE)
+    os.environ.setdefault("HANDLER_MODE", "sync")
+    standins = install_standins(os.environ, blob_ms=args.blob_ms, cosmos_ms=args.cosmos_ms,
+                                predict_ms=args.predict_ms, training_ms=args.training_ms,
+                                jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    roster = seed_roster(standins, args.users)
+    day = datetime.now(IST).strftime("%Y-%m-%d")
+    past = (datetime.now(IST) - timedelta(days=1)).strftime("%Y-%m-%d")
+    seed_attendance(standins, roster, past)
+    seed_attendance(standins, roster, day, fraction=0.5)
+    frames = [synthetic_frame(args.seed + i) for i in range(args.frames)]
+
+    import azure.functions as func
+    import function_app
+    from cosmos_ru import charges
+    from timing import metrics
+
+    cases = build_cases(function_app, func, frames, past)
+    results = {
+        "config": {**{k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+                   "python": platform.python_version(), "platform": platform.platform(),
+                   "startedAt": datetime.now(timezone.utc).isoformat()},
+        "cases": {},
+    }
+    try:
+        for name in args.cases:
+            results["cases"][name] = r = measure(cases[name], args.iterations, args.warmup, args.concurrency)
+            print(f"{name:>20}: {r['opsPerSec']:>9} ops/s  p50 {r['p50Ms']:>8} ms  p95 {r['p95Ms']:>8} ms  "
+                  f"p99 {r['p99Ms']:>8} ms  errors {r['errors']}")
+    finally:
+        standins.close()
+
+    results["stages"] = metrics.snapshot()
+    results["cosmos"] = charges.snapshot()
+    results["standins"] = standins.stats()
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions and args.fail_on_regression:
+            sys.exit(f"regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
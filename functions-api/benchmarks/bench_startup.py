@@ -0,0 +1,139 @@
+"""
+Cold-start cost of function_app: import time, first CORS preflight, first read.
+
+Each run starts a fresh interpreter, installs the in-process stand-ins
+(benchmarks/standins.py) with a small seeded roster and day of attendance,
+then imports function_app, answers an OPTIONS preflight and a getAttendance
+GET, timing each step and noting which SDKs were imported by then (a preflight
+should load none; a Cosmos read should not load the blob SDK or requests).
+No Azurite, Cosmos emulator or network is needed.
+
+The stand-ins import azure.cosmos and azure.core themselves, so their import
+cost is not part of importMs (they are listed under "preloaded"). The app's
+own modules are timed separately first (helperImportMs); when azure.functions
+is not installed only that part can be measured and the run says so.
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --runs 10 --out startup.json
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WATCHED_MODULES = ("azure.cosmos", "azure.storage.blob", "requests", "numpy", "PIL")
+
+# function_app's own imports, minus the Functions host SDK
+HELPER_MODULES = ("archive", "attendance_index", "clients", "cosmos_ru", "export", "frame_cache",
+                  "imaging", "quality_gate", "recent_feed", "timing", "user_cache", "user_listing")
+
+TIMED_KEYS = ("helperImportMs", "importMs", "firstOptionsMs", "firstReadMs", "warmReadMs")
+
+
+def _loaded():
+    return [m for m in WATCHED_MODULES if m in sys.modules]
+
+
+def child(date_str: str, users: int):
+    """One cold start; prints a JSON line with the timings."""
+    from standins import install_standins, seed_attendance, seed_roster
+
+    os.chdir(HERE)
+    standins = install_standins(os.environ)
+    seed_attendance(standins, seed_roster(standins, users), date_str)
+    result = {"preloaded": _loaded()}
+
+    t0 = time.perf_counter()
+    for name in HELPER_MODULES:
+        importlib.import_module(name)
+    result["helperImportMs"] = round((time.perf_counter() - t0) * 1000, 1)
+    result["afterHelpers"] = _loaded()
+
+    try:
+        t0 = time.perf_counter()
+        import function_app
+        import azure.functions as func
+        result["importMs"] = round((time.perf_counter() - t0) * 1000, 1)
+    except ModuleNotFoundError as e:
+        result["skipped"] = f"function_app not importable: {str(e)}"
+        print(json.dumps(result))
+        standins.close()
+        return
+    result["afterImport"] = _loaded()
+
+    handler = function_app.getAttendance.build().get_user_function()
+
+    t0 = time.perf_counter()
+    handler(func.HttpRequest(method="OPTIONS", url="/api/getAttendance", body=b"", headers={}))
+    result["firstOptionsMs"] = round((time.perf_counter() - t0) * 1000, 1)
+    result["afterOptions"] = _loaded()
+
+    t0 = time.perf_counter()
+    r = handler(func.HttpRequest(method="GET", url="/api/getAttendance", body=b"", headers={},
+                                 params={"date": date_str}))
+    result["firstReadMs"] = round((time.perf_counter() - t0) * 1000, 1)
+    result["firstReadStatus"] = r.status_code
+    result["afterRead"] = _loaded()
+
+    t0 = time.perf_counter()
+    handler(func.HttpRequest(method="GET", url="/api/getAttendance", body=b"", headers={},
+                             params={"date": date_str}))
+    result["warmReadMs"] = round((time.perf_counter() - t0) * 1000, 1)
+    standins.close()
+    print(json.dumps(result))
+
+
+def summarize(runs: list, key: str) -> dict:
+    values = [r[key] for r in runs if key in r]
+    if not values:
+        return None
+    return {"median": round(statistics.median(values), 1), "min": min(values), "max": max(values)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--date", default=time.strftime("%Y-%m-%d"), help="day read by getAttendance")
+    ap.add_argument("--users", type=int, default=200, help="seeded roster size (all present on --date)")
+    ap.add_argument("--out", help="write results as JSON to this path")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.date, args.users)
+        return
+
+    runs = []
+    for i in range(args.runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--date", args.date,
+                              "--users", str(args.users)],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            sys.exit(f"run {i + 1} failed")
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        print(f"run {i + 1}: {runs[-1]}")
+
+    results = {
+        "runs": runs,
+        "summary": {key: summary for key in TIMED_KEYS if (summary := summarize(runs, key))},
+    }
+    if runs[-1].get("skipped"):
+        print(f"{'':>15}  {runs[-1]['skipped']}")
+    for key, s in results["summary"].items():
+        print(f"{key:>15}: median {s['median']} ms (min {s['min']}, max {s['max']})")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
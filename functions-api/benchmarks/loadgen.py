@@ -0,0 +1,422 @@
+"""
+Closed-loop load test of the local backend (local_backend.py) with an SLO report.
+
+Each step of the ramp runs N virtual clients for a fixed time. Every client
+sends one request, waits for the answer (plus optional think time), then
+sends the next, choosing the endpoint at random by the --mix weights. That
+is how a classroom of kiosks and dashboards behaves. markAttendance posts
+camera-sized JPEGs the way the frontend does (640px wide, quality 0.85,
+raw base64 JSON). --dashboards adds long-polling attendanceStream clients
+that sit outside the mix, like open dashboard tabs.
+
+For every step and endpoint the report gives throughput, error rate,
+client latency percentiles and the server's own total (from Server-Timing).
+Each step is checked against the --slo targets. The knee is the step with
+the most throughput per unit of mean latency (Kleinrock's "power"); past
+it, more clients mostly add queueing. Also reported: the highest throughput
+that still met every SLO.
+
+    python benchmarks/loadgen.py --spawn --users 2000 --ramp 1,2,4,8,16,32 --step-seconds 20 --out load.json
+    python benchmarks/loadgen.py --spawn --predict-ms 120 --cosmos-ms 8 --blob-ms 15 --dashboards 4
+    python benchmarks/loadgen.py --url http://localhost:7071 --mix markAttendance=1 --slo markAttendance:p99=2000
+
+--spawn starts benchmarks/serve_standins.py (no Azure resources needed);
+otherwise point --url at a running backend.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_handlers import percentile  # noqa: E402
+from standins import synthetic_frame  # noqa: E402
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+ENDPOINTS = ("markAttendance", "getAttendance", "attendanceRecent", "usersSummary", "listUsers",
+             "exportAttendance")
+DEFAULT_MIX = "markAttendance=60,attendanceRecent=15,getAttendance=10,usersSummary=10,listUsers=5"
+DEFAULT_SLOS = ("markAttendance:p95=1500", "getAttendance:p95=500", "attendanceRecent:p95=250",
+                "usersSummary:p95=250", "listUsers:p95=500", "exportAttendance:p95=2000")
+PERCENTILES = (50, 90, 95, 99)
+
+_SERVER_TOTAL = re.compile(r"(?:^|,)\s*total;dur=([0-9.]+)")
+
+
+def parse_mix(text: str) -> dict:
+    """'markAttendance=60,getAttendance=10' -> {endpoint: weight}; zero weights are dropped."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint in mix: {name} (expected one of {', '.join(ENDPOINTS)})")
+        if float(weight or 1) > 0:
+            mix[name] = float(weight or 1)
+    if not mix:
+        raise ValueError("mix has no endpoint with a positive weight")
+    return mix
+
+
+def parse_slo(text: str) -> tuple:
+    """'markAttendance:p95=1500' -> ('markAttendance', 95, 1500.0); '*' applies to every request."""
+    m = re.fullmatch(r"([A-Za-z*]+):p(\d+(?:\.\d+)?)=([0-9.]+)", text.strip())
+    if not m or (m.group(1) != "*" and m.group(1) not in ENDPOINTS):
+        raise ValueError(f"bad SLO {text!r}; expected <endpoint|*>:p<percentile>=<ms>")
+    return m.group(1), float(m.group(2)), float(m.group(3))
+
+
+def parse_ramp(text: str) -> list:
+    steps = [int(s) for s in text.split(",") if s.strip()]
+    if not steps or min(steps) < 1:
+        raise ValueError("ramp needs one or more positive client counts")
+    return steps
+
+
+class Workload:
+    """
+    Builds and sends one request per endpoint and classifies the answer.
+    send() returns (status, server seconds or None, outcome); status 0 means
+    the request never got an HTTP answer (refused, reset, timed out).
+    """
+
+    def __init__(self, base_url: str, frames: list, day: str, devices: int, timeout: float):
+        self.api = base_url.rstrip("/") + "/api"
+        self.frames = [base64.b64encode(f).decode() for f in frames]
+        self.day = day
+        self.devices = max(1, devices)
+        self.timeout = timeout
+
+    def _request(self, session, endpoint, rng):
+        # Lowercase routes, as the frontend calls them
+        if endpoint == "markAttendance":
+            return session.post(f"{self.api}/markattendance", timeout=self.timeout,
+                                json={"base64Image": rng.choice(self.frames)},
+                                headers={"X-Device-Id": f"kiosk-{rng.randrange(self.devices)}"})
+        if endpoint == "getAttendance":
+            return session.get(f"{self.api}/getattendance", params={"date": self.day}, timeout=self.timeout)
+        if endpoint == "listUsers":
+            return session.get(f"{self.api}/listusers", params={"limit": "100", "fields": "name,roll"},
+                               timeout=self.timeout)
+        if endpoint == "exportAttendance":
+            start = (datetime.fromisoformat(self.day) - timedelta(days=6)).strftime("%Y-%m-%d")
+            return session.get(f"{self.api}/exportattendance", timeout=self.timeout,
+                               params={"from": start, "to": self.day, "format": "ndjson"})
+        return session.get(f"{self.api}/{endpoint.lower()}", timeout=self.timeout)
+
+    def send(self, session, endpoint: str, rng) -> tuple:
+        try:
+            r = self._request(session, endpoint, rng)
+            body = r.content
+        except requests.RequestException as e:
+            return 0, None, type(e).__name__
+
+        m = _SERVER_TOTAL.search(r.headers.get("Server-Timing", ""))
+        server = float(m.group(1)) / 1000 if m else None
+        outcome = None
+        if endpoint == "markAttendance" and r.status_code == 200:
+            try:
+                payload = json.loads(body)
+                outcome = ("alreadyMarked" if payload.get("alreadyMarked") else
+                           "marked" if payload.get("ok") else payload.get("reason") or "failed")
+            except ValueError:
+                outcome = "bad-json"
+        return r.status_code, server, outcome
+
+
+def run_step(workload: Workload, mix: dict, clients: int, warmup: float, duration: float,
+             think: float, seed: int) -> tuple:
+    """
+    Run `clients` closed-loop clients for warmup + duration seconds.
+    Returns (samples, window seconds); a sample is (endpoint, seconds,
+    status, server seconds, outcome) for each request that completed inside
+    the measured window.
+    """
+    names, weights = list(mix), list(mix.values())
+    stop = threading.Event()
+    samples = []
+    lock = threading.Lock()
+    window = {}
+
+    def client(index):
+        rng = random.Random(seed * 100003 + clients * 1009 + index)
+        with requests.Session() as session:
+            while not stop.is_set():
+                endpoint = rng.choices(names, weights)[0]
+                t0 = time.perf_counter()
+                status, server, outcome = workload.send(session, endpoint, rng)
+                t1 = time.perf_counter()
+                if window and window["start"] <= t0 and t1 <= window.get("end", float("inf")):
+                    with lock:
+                        samples.append((endpoint, t1 - t0, status, server, outcome))
+                if think:
+                    stop.wait(rng.expovariate(1 / think))
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(warmup)
+    window["start"] = time.perf_counter()
+    time.sleep(duration)
+    window["end"] = time.perf_counter()
+    stop.set()
+    for t in threads:
+        t.join(workload.timeout + 5)
+    return samples, window["end"] - window["start"]
+
+
+def summarize(samples: list, seconds: float) -> dict:
+    """Throughput, errors and latency for one group of samples."""
+    latencies = sorted(s[1] for s in samples)
+    server = sorted(s[3] for s in samples if s[3] is not None)
+    errors = sum(1 for s in samples if not 200 <= s[2] < 300)
+    out = {
+        "requests": len(samples),
+        "errors": errors,
+        "errorRate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput": round((len(samples) - errors) / seconds, 2) if seconds else 0.0,
+        "meanMs": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        **{f"p{p}Ms": round(percentile(latencies, p) * 1000, 2) for p in PERCENTILES},
+        "maxMs": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "serverP50Ms": round(percentile(server, 50) * 1000, 2),
+        "serverP95Ms": round(percentile(server, 95) * 1000, 2),
+        "statuses": dict(Counter(str(s[2]) for s in samples)),
+    }
+    outcomes = Counter(s[4] for s in samples if s[4] is not None)
+    if outcomes:
+        out["outcomes"] = dict(outcomes)
+    return out
+
+
+def _observed(result: dict, p: float, samples: list) -> float:
+    key = f"p{p:g}Ms"
+    if key in result:
+        return result[key]
+    return round(percentile(sorted(s[1] for s in samples), p) * 1000, 2)
+
+
+def check_slos(samples: list, results: dict, slos: list, max_error_rate: float) -> list:
+    """One row per SLO the step had traffic for, plus the error-rate target."""
+    rows = []
+    for endpoint, p, limit in slos:
+        group = samples if endpoint == "*" else [s for s in samples if s[0] == endpoint]
+        if not group:
+            continue
+        result = results["all"] if endpoint == "*" else results["endpoints"][endpoint]
+        value = _observed(result, p, group)
+        rows.append({"slo": f"{endpoint}:p{p:g}<={limit:g}ms", "observed": value, "ok": value <= limit})
+    rate = results["all"]["errorRate"]
+    rows.append({"slo": f"errorRate<={max_error_rate:g}", "observed": rate, "ok": rate <= max_error_rate})
+    return rows
+
+
+def find_knee(steps: list) -> dict:
+    """
+    The step with the highest power (throughput / mean latency) and the
+    highest-throughput step that met every SLO.
+    """
+    def power(step):
+        a = step["all"]
+        return a["throughput"] / (a["meanMs"] / 1000) if a["meanMs"] else 0.0
+
+    for step in steps:
+        step["power"] = round(power(step), 2)
+    knee = max(steps, key=power)
+    passing = [s for s in steps if s["sloOk"]]
+    best = max(passing, key=lambda s: s["all"]["throughput"]) if passing else None
+    return {
+        "kneeClients": knee["clients"],
+        "kneeThroughput": knee["all"]["throughput"],
+        "kneeP95Ms": knee["all"]["p95Ms"],
+        "maxSloClients": best["clients"] if best else None,
+        "maxSloThroughput": best["all"]["throughput"] if best else 0.0,
+        "firstSloBreachClients": next((s["clients"] for s in steps if not s["sloOk"]), None),
+    }
+
+
+class Dashboards:
+    """Long-polling attendanceStream clients, outside the closed-loop mix."""
+
+    def __init__(self, base_url: str, count: int, wait: float):
+        self.url = base_url.rstrip("/") + "/api/attendancestream"
+        self.count = count
+        self.wait = wait
+        self.polls = 0
+        self.items = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _run(self):
+        cursor = None
+        with requests.Session() as session:
+            while not self._stop.is_set():
+                try:
+                    r = session.get(self.url, params={"cursor": cursor or "", "wait": self.wait},
+                                    timeout=self.wait + 30)
+                    r.raise_for_status()
+                    result = r.json()
+                    cursor = result.get("cursor", cursor)
+                    self.polls += 1
+                    self.items += len(result.get("items") or [])
+                except (requests.RequestException, ValueError):
+                    self.errors += 1
+                    self._stop.wait(1.0)
+
+    def start(self):
+        for _ in range(self.count):
+            t = threading.Thread(target=self._run, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> dict:
+        self._stop.set()
+        return {"clients": self.count, "polls": self.polls, "items": self.items, "errors": self.errors}
+
+
+def spawn_backend(args) -> subprocess.Popen:
+    """Start benchmarks/serve_standins.py and wait until it answers."""
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve_standins.py"),
+           "--port", str(args.port), "--users", str(args.users), "--present", str(args.present),
+           "--blob-ms", str(args.blob_ms), "--cosmos-ms", str(args.cosmos_ms),
+           "--predict-ms", str(args.predict_ms), "--jitter", str(args.jitter),
+           "--error-rate", str(args.error_rate), "--seed", str(args.seed)]
+    proc = subprocess.Popen(cmd)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"stand-in backend exited with {proc.returncode}")
+        try:
+            if requests.get(f"{args.url}/api/usersSummary", timeout=2).ok:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    sys.exit("stand-in backend did not come up within 120s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="backend base URL (default http://127.0.0.1:<port>)")
+    ap.add_argument("--spawn", action="store_true", help="start serve_standins.py for the run")
+    ap.add_argument("--port", type=int, default=7071)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight,... (closed-loop request mix)")
+    ap.add_argument("--ramp", default="1,2,4,8,16,32", help="clients per step, comma-separated")
+    ap.add_argument("--step-seconds", type=float, default=20.0, help="measured time per step")
+    ap.add_argument("--warmup-seconds", type=float, default=3.0, help="unmeasured time at the start of each step")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="mean (exponential) pause between a client's requests")
+    ap.add_argument("--timeout", type=float, default=30.0, help="per-request timeout, seconds")
+    ap.add_argument("--devices", type=int, default=8, help="distinct X-Device-Id kiosks")
+    ap.add_argument("--frames", type=int, default=64, help="distinct synthetic faces")
+    ap.add_argument("--frame-size", default="640x480")
+    ap.add_argument("--frame-quality", type=int, default=85)
+    ap.add_argument("--dashboards", type=int, default=0, help="long-polling attendanceStream clients")
+    ap.add_argument("--poll-wait", type=float, default=25.0)
+    ap.add_argument("--slo", action="append", default=None,
+                    help=f"<endpoint|*>:p<pct>=<ms>, repeatable (default: {' '.join(DEFAULT_SLOS)})")
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--stop-after-breaches", type=int, default=2,
+                    help="end the ramp after this many consecutive steps that miss an SLO (0: never)")
+    # --spawn only
+    ap.add_argument("--users", type=int, default=500, help="seeded roster size")
+    ap.add_argument("--present", type=float, default=0.0, help="fraction of the roster already marked today")
+    ap.add_argument("--blob-ms", type=float, default=0.0)
+    ap.add_argument("--cosmos-ms", type=float, default=0.0)
+    ap.add_argument("--predict-ms", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.25, help="latency jitter as a fraction of the mean")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="injected failure rate per round trip")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the report as JSON to this path")
+    args = ap.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+        ramp = parse_ramp(args.ramp)
+        slos = [parse_slo(s) for s in (args.slo or DEFAULT_SLOS)]
+        width, height = (int(v) for v in args.frame_size.lower().split("x"))
+    except ValueError as e:
+        ap.error(str(e))
+    args.url = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+
+    frames = [synthetic_frame(args.seed + i, size=(width, height), quality=args.frame_quality)
+              for i in range(args.frames)]
+    day = datetime.now(IST).strftime("%Y-%m-%d")
+    workload = Workload(args.url, frames, day, args.devices, args.timeout)
+
+    backend = spawn_backend(args) if args.spawn else None
+    dashboards = Dashboards(args.url, args.dashboards, args.poll_wait)
+    report = {
+        "config": {**{k: v for k, v in vars(args).items() if k != "out"},
+                   "mix": mix, "ramp": ramp, "slo": [f"{e}:p{p:g}={ms:g}" for e, p, ms in slos],
+                   "frameBytes": round(sum(map(len, frames)) / len(frames)),
+                   "python": platform.python_version(), "platform": platform.platform(),
+                   "startedAt": datetime.now(timezone.utc).isoformat()},
+        "steps": [],
+    }
+    print(f"{'clients':>7} {'req/s':>9} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'srv p95':>8}  SLO")
+    breaches = 0
+    try:
+        dashboards.start()
+        for clients in ramp:
+            samples, seconds = run_step(workload, mix, clients, args.warmup_seconds, args.step_seconds,
+                                        args.think_ms / 1000, args.seed)
+            step = {
+                "clients": clients,
+                "seconds": round(seconds, 3),
+                "all": summarize(samples, seconds),
+                "endpoints": {name: summarize([s for s in samples if s[0] == name], seconds)
+                              for name in mix},
+            }
+            step["slo"] = check_slos(samples, step, slos, args.max_error_rate)
+            step["sloOk"] = all(row["ok"] for row in step["slo"])
+            report["steps"].append(step)
+
+            a = step["all"]
+            missed = ", ".join(row["slo"] for row in step["slo"] if not row["ok"])
+            print(f"{clients:>7} {a['throughput']:>9} {a['errorRate'] * 100:>5.1f}% {a['p50Ms']:>8} "
+                  f"{a['p95Ms']:>8} {a['p99Ms']:>8} {a['serverP95Ms']:>8}  "
+                  f"{'ok' if step['sloOk'] else 'MISS ' + missed}", flush=True)
+            breaches = 0 if step["sloOk"] else breaches + 1
+            if args.stop_after_breaches and breaches >= args.stop_after_breaches:
+                break
+    finally:
+        report["dashboards"] = dashboards.stop()
+        if backend is not None:
+            backend.terminate()
+            backend.wait(30)
+
+    if report["steps"]:
+        report["summary"] = summary = find_knee(report["steps"])
+        print(f"\nknee: {summary['kneeClients']} clients, {summary['kneeThroughput']} req/s, "
+              f"p95 {summary['kneeP95Ms']} ms")
+        if summary["maxSloClients"] is not None:
+            print(f"max throughput within SLO: {summary['maxSloThroughput']} req/s "
+                  f"at {summary['maxSloClients']} clients")
+        else:
+            print("no step met every SLO")
+        for name in mix:
+            e = report["steps"][-1]["endpoints"][name]
+            print(f"  {name:>18} (last step): {e['throughput']:>8} req/s  p95 {e['p95Ms']:>8} ms  "
+                  f"errors {e['errors']}{'  ' + json.dumps(e['outcomes']) if 'outcomes' in e else ''}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Run local_backend.py against the offline stand-ins (benchmarks/standins.py).
+
+Blob Storage and Cosmos DB are in-process fakes and Custom Vision is a local
+HTTP stub, seeded with a roster and some attendance, so the Flask server can
+be load tested (benchmarks/loadgen.py) without Azure resources.
+local.settings.json is not read. The server runs threaded, without the
+debugger or reloader, and logs warnings only unless told otherwise.
+
+    python benchmarks/serve_standins.py --port 7071 --users 2000
+    python benchmarks/serve_standins.py --cosmos-ms 8 --blob-ms 15 --predict-ms 120 --error-rate 0.005
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standins import install_standins, seed_attendance, seed_roster  # noqa: E402
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=7071)
+    ap.add_argument("--users", type=int, default=500, help="seeded roster size")
+    ap.add_argument("--present", type=float, default=0.0,
+                    help="fraction of the roster already marked present today")
+    ap.add_argument("--history-days", type=int, default=7, help="past days of full attendance to seed")
+    ap.add_argument("--blob-ms", type=float, default=0.0)
+    ap.add_argument("--cosmos-ms", type=float, default=0.0)
+    ap.add_argument("--predict-ms", type=float, default=0.0)
+    ap.add_argument("--training-ms", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.25, help="latency jitter as a fraction of the mean")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="injected failure rate per round trip")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--log-level", default="WARNING")
+    ap.add_argument("--stats-out", help="write the stand-ins' call counts as JSON here on exit")
+    args = ap.parse_args()
+    if args.stats_out:
+        args.stats_out = os.path.abspath(args.stats_out)
+
+    os.chdir(HERE)
+    os.environ["LOCAL_SETTINGS_FILE"] = ""
+    standins = install_standins(os.environ, blob_ms=args.blob_ms, cosmos_ms=args.cosmos_ms,
+                                predict_ms=args.predict_ms, training_ms=args.training_ms,
+                                jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    roster = seed_roster(standins, args.users)
+    today = datetime.now(IST)
+    for days in range(1, args.history_days + 1):
+        seed_attendance(standins, roster, (today - timedelta(days=days)).strftime("%Y-%m-%d"))
+    seed_attendance(standins, roster, today.strftime("%Y-%m-%d"), fraction=args.present)
+
+    import local_backend
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    logging.getLogger("werkzeug").setLevel(args.log_level.upper())
+    # SIGTERM (e.g. from loadgen.py --spawn) unwinds like Ctrl-C, so stats still get written
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    print(f"Stand-in backend: http://{args.host}:{args.port}/api/  "
+          f"({args.users} users, Custom Vision stub at {standins.cv.endpoint})", flush=True)
+    try:
+        local_backend.app.run(host=args.host, port=args.port, threaded=True, debug=False, use_reloader=False)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standins.close()
+        if args.stats_out:
+            with open(args.stats_out, "w") as f:
+                json.dump(standins.stats(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
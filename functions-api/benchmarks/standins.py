@@ -0,0 +1,686 @@
+"""
+Offline stand-ins for Blob Storage, Cosmos DB and Custom Vision.
+
+- FakeBlobContainer and FakeCosmosDatabase run in process and are installed
+  into clients.py (install_standins), so the handlers' lazy clients resolve
+  to them instead of Azure.
+- CustomVisionStub is a local HTTP server speaking the prediction/training
+  REST routes cv_client.py calls, so the real client (pooling, retries,
+  circuit breaker) is exercised.
+- Every round trip goes through a Latency: fixed delay plus jitter, and an
+  injected failure rate (Cosmos 503, blob ServiceResponseError, HTTP 503/429).
+
+The Cosmos fake understands the query subset this app issues:
+SELECT [TOP n] (* | VALUE COUNT(1) | VALUE c.f | c.a, c.b, ...) FROM c
+[WHERE term (AND|OR term)...] [ORDER BY c.f [ASC|DESC]], where a term is
+c.f = @p or STARTSWITH(c.f, @p[, true]). It charges made-up but
+proportional RUs through response_hook, like the real SDK.
+"""
+import base64
+import copy
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError, ServiceResponseError
+from azure.cosmos import exceptions
+
+
+class Latency:
+    """Delay (ms, uniform +/- jitter) and failure injection for one fake service."""
+
+    def __init__(self, ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = None):
+        self.ms = float(ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.ms + jitter) / 1000
+
+    def fails(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            self.failures += failed
+        return failed
+
+    def round_trip(self, error_factory=None):
+        """Sleep for one call; raise error_factory() when a failure is injected."""
+        time.sleep(self.delay())
+        if error_factory is not None and self.fails():
+            raise error_factory()
+
+    def stats(self) -> dict:
+        return {"ms": self.ms, "jitterMs": self.jitter_ms, "errorRate": self.error_rate,
+                "calls": self.calls, "failures": self.failures}
+
+
+# ---- Blob Storage ----
+
+class _FakeBlob:
+    def __init__(self, container, name: str):
+        self._container = container
+        self.name = name
+
+    def exists(self) -> bool:
+        self._container.latency.round_trip(self._container._error)
+        with self._container._lock:
+            return self.name in self._container.blobs
+
+    def download_blob(self):
+        self._container.latency.round_trip(self._container._error)
+        with self._container._lock:
+            data = self._container.blobs.get(self.name)
+        if data is None:
+            raise ResourceNotFoundError(f"blob {self.name} not found")
+        return _Download(data)
+
+
+class _Download:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def readall(self) -> bytes:
+        return self._data
+
+
+class FakeBlobContainer:
+    """In-memory azure.storage.blob ContainerClient (upload, exists, download)."""
+
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self.blobs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _error():
+        return ServiceResponseError("injected blob failure")
+
+    def upload_blob(self, name: str, data, overwrite: bool = False, **kwargs):
+        self.latency.round_trip(self._error)
+        # Like the SDK: bytes-like data is stored as is, anything else is read as a stream
+        payload = bytes(data) if isinstance(data, (bytes, bytearray, memoryview)) else data.read()
+        with self._lock:
+            if not overwrite and name in self.blobs:
+                raise ResourceExistsError(f"blob {name} already exists")
+            self.blobs[name] = payload
+        return _FakeBlob(self, name)
+
+    def get_blob_client(self, name: str) -> _FakeBlob:
+        return _FakeBlob(self, name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"blobs": len(self.blobs), "bytes": sum(len(b) for b in self.blobs.values()),
+                    **self.latency.stats()}
+
+
+# ---- Cosmos DB ----
+
+_QUERY = re.compile(
+    r"^SELECT\s+(?:TOP\s+(?P<top>\d+)\s+)?(?P<select>.+?)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+ORDER\s+BY\s+c\.(?P<order>\w+)(?:\s+(?P<dir>ASC|DESC))?)?$",
+    re.IGNORECASE | re.DOTALL,
+)
+_EQUALS = re.compile(r"^c\.(\w+)\s*=\s*(@\w+)$")
+_STARTSWITH = re.compile(r"^STARTSWITH\(\s*c\.(\w+)\s*,\s*(@\w+)\s*(?:,\s*(true|false)\s*)?\)$", re.IGNORECASE)
+
+
+def _term(text: str, params: dict):
+    m = _EQUALS.match(text)
+    if m:
+        field, value = m.group(1), params[m.group(2)]
+        return lambda doc: doc.get(field) == value
+    m = _STARTSWITH.match(text)
+    if m:
+        field, value = m.group(1), str(params[m.group(2)])
+        if (m.group(3) or "").lower() == "true":
+            value = value.lower()
+            return lambda doc: isinstance(doc.get(field), str) and doc[field].lower().startswith(value)
+        return lambda doc: isinstance(doc.get(field), str) and doc[field].startswith(value)
+    raise NotImplementedError(f"fake Cosmos can't evaluate: {text}")
+
+
+def compile_query(query: str, parameters=None):
+    """(filter, select, order, top) for the supported query subset."""
+    m = _QUERY.match(" ".join(query.split()))
+    if not m:
+        raise NotImplementedError(f"fake Cosmos can't parse: {query}")
+    params = {p["name"]: p["value"] for p in parameters or []}
+
+    predicate = lambda doc: True
+    if m.group("where"):
+        # OR of ANDs, which is all the app writes
+        alternatives = [[_term(t.strip(), params) for t in re.split(r"\s+AND\s+", alt, flags=re.IGNORECASE)]
+                        for alt in re.split(r"\s+OR\s+", m.group("where"), flags=re.IGNORECASE)]
+        predicate = lambda doc: any(all(t(doc) for t in terms) for terms in alternatives)
+
+    select = m.group("select").strip()
+    order = (m.group("order"), (m.group("dir") or "ASC").upper() == "DESC") if m.group("order") else None
+    top = int(m.group("top")) if m.group("top") else None
+    return predicate, select, order, top
+
+
+def _project(docs: list, select: str) -> list:
+    if select == "*":
+        return docs
+    if re.fullmatch(r"VALUE\s+COUNT\(1\)", select, re.IGNORECASE):
+        return [len(docs)]
+    m = re.fullmatch(r"VALUE\s+c\.(\w+)", select, re.IGNORECASE)
+    if m:
+        # Undefined values are left out, as in Cosmos
+        return [d[m.group(1)] for d in docs if m.group(1) in d]
+    fields = [f.strip()[2:] for f in select.split(",")]
+    return [{f: d[f] for f in fields if f in d} for d in docs]
+
+
+class _PageIterator:
+    def __init__(self, pager, continuation):
+        self._pager = pager
+        self._offset = int(continuation) if continuation else 0
+        self._done = False
+        self.continuation_token = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        page, next_offset = self._pager._page(self._offset)
+        self._offset = next_offset
+        self.continuation_token = str(next_offset) if next_offset is not None else None
+        self._done = next_offset is None
+        return iter(page)
+
+
+class _ItemPaged:
+    """Enough of azure.core.paging.ItemPaged: iteration and by_page(continuation)."""
+
+    def __init__(self, container, results: list, scanned: int, page_size: int, hook):
+        self._container = container
+        self._results = results
+        self._scanned = scanned
+        self._page_size = page_size or 100
+        self._hook = hook
+
+    def _page(self, offset: int):
+        self._container.latency.round_trip(self._container._error)
+        page = [copy.deepcopy(r) for r in self._results[offset:offset + self._page_size]]
+        next_offset = offset + self._page_size if offset + self._page_size < len(self._results) else None
+        if self._hook is not None:
+            # The whole scan is billed on the first page, the rest per returned item
+            scanned = self._scanned if offset == 0 else 0
+            ru = 2.3 + 0.05 * scanned + 0.02 * len(page)
+            self._hook(self._container._headers(ru), {"Documents": page, "_count": len(page)})
+        return page, next_offset
+
+    def by_page(self, continuation_token=None):
+        return _PageIterator(self, continuation_token)
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+
+class FakeCosmosContainer:
+    """
+    In-memory azure.cosmos ContainerProxy.
+    Documents are keyed by (partition key value, id); writes stamp _ts and _etag.
+    """
+
+    def __init__(self, name: str, partition_key: str = "/id", latency: Latency = None):
+        self.id = name
+        self.partition_key = partition_key.lstrip("/")
+        self.latency = latency or Latency()
+        self._docs = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _error():
+        return exceptions.CosmosHttpResponseError(status_code=503, message="injected Cosmos failure")
+
+    @staticmethod
+    def _headers(ru: float) -> dict:
+        return {"x-ms-request-charge": f"{ru:.2f}", "x-ms-activity-id": str(uuid.uuid4())}
+
+    def _write_ru(self, body: dict) -> float:
+        return 5.7 + len(json.dumps(body)) / 1024
+
+    def _stamp(self, body: dict) -> dict:
+        self._seq += 1
+        doc = dict(body)
+        doc["_ts"] = int(time.time())
+        doc["_etag"] = f'"{self._seq:08x}"'
+        doc["_seq"] = self._seq
+        return doc
+
+    @staticmethod
+    def _public(doc: dict) -> dict:
+        return {k: v for k, v in doc.items() if k != "_seq"}
+
+    def _key(self, body: dict):
+        return (body.get(self.partition_key), body["id"])
+
+    def _done(self, response_hook, ru: float, result):
+        if response_hook is not None:
+            response_hook(self._headers(ru), result)
+        return result
+
+    def seed(self, docs):
+        """Load documents without latency, charges or failures."""
+        with self._lock:
+            for body in docs:
+                self._docs[self._key(body)] = self._stamp(body)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def create_item(self, body: dict, response_hook=None, **kwargs):
+        self.latency.round_trip(self._error)
+        with self._lock:
+            if self._key(body) in self._docs:
+                raise exceptions.CosmosResourceExistsError(status_code=409, message="Entity with the specified id already exists")
+            doc = self._docs[self._key(body)] = self._stamp(body)
+        return self._done(response_hook, self._write_ru(body), self._public(doc))
+
+    def upsert_item(self, body: dict, response_hook=None, **kwargs):
+        self.latency.round_trip(self._error)
+        with self._lock:
+            doc = self._docs[self._key(body)] = self._stamp(body)
+        return self._done(response_hook, self._write_ru(body), self._public(doc))
+
+    def read_item(self, item, partition_key, response_hook=None, **kwargs):
+        self.latency.round_trip(self._error)
+        with self._lock:
+            doc = self._docs.get((partition_key, item))
+        if doc is None:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Entity with the specified id does not exist")
+        return self._done(response_hook, 1.0, self._public(copy.deepcopy(doc)))
+
+    def replace_item(self, item, body: dict, etag: str = None, match_condition=None, response_hook=None, **kwargs):
+        self.latency.round_trip(self._error)
+        with self._lock:
+            key = (body.get(self.partition_key), item)
+            current = self._docs.get(key)
+            if current is None:
+                raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Entity with the specified id does not exist")
+            if etag is not None and match_condition is not None and current["_etag"] != etag:
+                raise exceptions.CosmosAccessConditionFailedError(status_code=412, message="etag mismatch")
+            doc = self._docs[key] = self._stamp(body)
+        return self._done(response_hook, self._write_ru(body), self._public(doc))
+
+    def patch_item(self, item, partition_key, patch_operations, response_hook=None, **kwargs):
+        self.latency.round_trip(self._error)
+        with self._lock:
+            current = self._docs.get((partition_key, item))
+            if current is None:
+                raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Entity with the specified id does not exist")
+            doc = copy.deepcopy(current)
+            for op in patch_operations:
+                *parents, leaf = [p.replace("~1", "/").replace("~0", "~") for p in op["path"].strip("/").split("/")]
+                target = doc
+                for p in parents:
+                    target = target.setdefault(p, {})
+                if op["op"] == "incr":
+                    target[leaf] = target.get(leaf, 0) + op["value"]
+                elif op["op"] == "remove":
+                    target.pop(leaf, None)
+                else:
+                    target[leaf] = op["value"]
+            doc = self._docs[(partition_key, item)] = self._stamp(doc)
+        return self._done(response_hook, 10.0, self._public(doc))
+
+    def delete_item(self, item, partition_key, response_hook=None, **kwargs):
+        self.latency.round_trip(self._error)
+        with self._lock:
+            if self._docs.pop((partition_key, item), None) is None:
+                raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Entity with the specified id does not exist")
+        self._done(response_hook, 5.0, None)
+
+    def execute_item_batch(self, batch_operations, partition_key, response_hook=None, **kwargs):
+        """Transactional batch of ("create", (body,)) operations: all or nothing."""
+        self.latency.round_trip(self._error)
+        with self._lock:
+            bodies = [args[0] for op, args in batch_operations]
+            for i, (op, _) in enumerate(batch_operations):
+                if op != "create":
+                    raise NotImplementedError(f"fake batch supports create only, not {op}")
+                if self._key(bodies[i]) in self._docs:
+                    raise exceptions.CosmosBatchOperationError(
+                        error_index=i, headers={}, status_code=409,
+                        message="batch operation conflicted", operation_responses=[])
+            results = []
+            for body in bodies:
+                doc = self._docs[self._key(body)] = self._stamp(body)
+                results.append({"statusCode": 201, "resourceBody": self._public(doc)})
+        return self._done(response_hook, sum(self._write_ru(b) for b in bodies), results)
+
+    def query_items(self, query, parameters=None, partition_key=None, max_item_count=None,
+                    enable_cross_partition_query=None, response_hook=None, **kwargs):
+        predicate, select, order, top = compile_query(query, parameters)
+        with self._lock:
+            scope = [d for (pk, _), d in self._docs.items() if partition_key is None or pk == partition_key]
+        matched = [d for d in scope if predicate(d)]
+        if order is not None:
+            field, descending = order
+            matched.sort(key=lambda d: (d.get(field) is not None, d.get(field, 0), d["_seq"]), reverse=descending)
+        if top is not None:
+            matched = matched[:top]
+        results = _project([self._public(d) for d in matched], select)
+        return _ItemPaged(self, results, len(scope), max_item_count, response_hook)
+
+    def query_items_change_feed(self, partition_key=None, is_start_from_beginning=False, continuation=None,
+                                start_time=None, response_hook=None, **kwargs):
+        """Latest version of each document changed after `continuation` (a write sequence) or `start_time`."""
+        self.latency.round_trip(self._error)
+        with self._lock:
+            since = int(continuation.strip('"')) if continuation else None
+            since_ts = start_time.timestamp() if start_time is not None and not is_start_from_beginning else None
+            changed = sorted((d for (pk, _), d in self._docs.items()
+                              if (partition_key is None or pk == partition_key)
+                              and (since is None or d["_seq"] > since)
+                              and (since is not None or since_ts is None or d["_ts"] >= int(since_ts))),
+                             key=lambda d: d["_seq"])
+            etag = f'"{self._seq}"'
+        results = [self._public(copy.deepcopy(d)) for d in changed]
+        if response_hook is not None:
+            response_hook({**self._headers(2.0 + 0.02 * len(results)), "etag": etag},
+                          {"Documents": results, "_count": len(results)})
+        return results
+
+    def read_all_items(self, max_item_count=None, response_hook=None, **kwargs):
+        return self.query_items("SELECT * FROM c", max_item_count=max_item_count, response_hook=response_hook)
+
+
+class FakeCosmosDatabase:
+    """DatabaseProxy handing out one FakeCosmosContainer per name."""
+
+    def __init__(self, partition_keys: dict = None, latency: Latency = None):
+        self.partition_keys = partition_keys or {}
+        self.latency = latency or Latency()
+        self.containers = {}
+        self._lock = threading.Lock()
+
+    def get_container_client(self, name: str) -> FakeCosmosContainer:
+        with self._lock:
+            if name not in self.containers:
+                self.containers[name] = FakeCosmosContainer(
+                    name, self.partition_keys.get(name, "/id"), self.latency)
+            return self.containers[name]
+
+    def stats(self) -> dict:
+        return {"documents": {name: len(c) for name, c in self.containers.items()}, **self.latency.stats()}
+
+
+# ---- Custom Vision ----
+
+class CustomVisionStub:
+    """
+    Local HTTP server for the Custom Vision routes cv_client.py uses.
+    - POST .../classify/iterations/<name>/image: one prediction whose tag is
+      picked from the known tags by a hash of the image bytes (so distinct
+      frames map to different students), with `probability`.
+    - GET/POST .../tags, POST .../images/image, .../images, .../images/files.
+    Prediction and training calls have separate Latency settings; an injected
+    failure answers 429 (Retry-After: 0) or 503 at random.
+    """
+
+    def __init__(self, predict_latency: Latency = None, training_latency: Latency = None,
+                 probability: float = 0.97, host: str = "127.0.0.1", port: int = 0):
+        self.predict_latency = predict_latency or Latency()
+        self.training_latency = training_latency or Latency()
+        self.probability = float(probability)
+        self.tags = {}
+        self.images = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_tags(self, names):
+        with self._lock:
+            for name in names:
+                self.tags.setdefault(name, str(uuid.uuid4()))
+
+    def predict(self, data: bytes) -> dict:
+        with self._lock:
+            names = sorted(self.tags)
+        if not names:
+            return {"predictions": []}
+        name = names[int.from_bytes(hashlib.sha256(data).digest()[:8], "big") % len(names)]
+        return {"id": str(uuid.uuid4()), "predictions": [
+            {"tagId": self.tags[name], "tagName": name, "probability": self.probability}]}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes on a keep-alive socket;
+            # with Nagle on, the body waits for the client's delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body=None, headers=None):
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _injected(self, latency: Latency) -> bool:
+                time.sleep(latency.delay())
+                if latency.fails():
+                    if random.random() < 0.5:
+                        self._reply(429, {"error": "injected throttle"}, {"Retry-After": "0"})
+                    else:
+                        self._reply(503, {"error": "injected failure"})
+                    return True
+                return False
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path.endswith("/tags"):
+                    if self._injected(stub.training_latency):
+                        return
+                    with stub._lock:
+                        tags = [{"id": i, "name": n} for n, i in stub.tags.items()]
+                    return self._reply(200, tags)
+                self._reply(404, {"error": "unknown route"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                path, query = url.path, parse_qs(url.query)
+                body = self._body()
+                if "/classify/" in path:
+                    if self._injected(stub.predict_latency):
+                        return
+                    return self._reply(200, stub.predict(body))
+                if self._injected(stub.training_latency):
+                    return
+                if path.endswith("/tags"):
+                    name = (query.get("name") or [""])[0]
+                    with stub._lock:
+                        if name in stub.tags:
+                            return self._reply(400, {"code": "BadRequestTagNameNotUnique"})
+                        stub.tags[name] = str(uuid.uuid4())
+                        return self._reply(200, {"id": stub.tags[name], "name": name})
+                if path.endswith("/images/files"):
+                    count = len(json.loads(body or b"{}").get("images", []))
+                elif path.endswith("/images") or path.endswith("/images/image"):
+                    count = 1
+                else:
+                    return self._reply(404, {"error": "unknown route"})
+                with stub._lock:
+                    stub.images += count
+                return self._reply(200, {"isBatchSuccessful": True,
+                                         "images": [{"status": "OK"} for _ in range(count)]})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="cv-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        return {"tags": len(self.tags), "images": self.images,
+                "predict": self.predict_latency.stats(), "training": self.training_latency.stats()}
+
+
+# ---- Payloads ----
+
+def synthetic_frame(seed: int, size=(1280, 720), quality: int = 90) -> bytes:
+    """
+    Camera-sized JPEG that passes the quality gate: lit background gradient,
+    an oval "face" with features, and sensor noise; distinct pixels per seed.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = np.linspace(70, 170, w, dtype=np.float32)[None, :, None] + rng.uniform(-20, 20, 3)[None, None, :]
+    pixels = np.broadcast_to(base, (h, w, 3)).copy()
+    pixels += rng.normal(0, 6, pixels.shape)
+    img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    draw = ImageDraw.Draw(img)
+    cx, cy = w // 2 + int(rng.integers(-w // 10, w // 10)), h // 2 + int(rng.integers(-h // 10, h // 10))
+    fw, fh = int(h * rng.uniform(0.22, 0.3)), int(h * rng.uniform(0.3, 0.38))
+    skin = tuple(int(v) for v in rng.integers(120, 230, 3))
+    draw.ellipse((cx - fw, cy - fh, cx + fw, cy + fh), fill=skin, outline=(40, 30, 30), width=4)
+    for dx in (-fw // 2, fw // 2):
+        draw.ellipse((cx + dx - 18, cy - fh // 4 - 10, cx + dx + 18, cy - fh // 4 + 10), fill=(30, 30, 40))
+    draw.line((cx, cy - 10, cx, cy + fh // 5), fill=(90, 60, 60), width=5)
+    draw.arc((cx - fw // 2, cy + fh // 5, cx + fw // 2, cy + fh // 2), 20, 160, fill=(120, 40, 40), width=6)
+
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+# ---- Wiring ----
+
+STANDIN_SETTINGS = {
+    "BLOB_CONN_STRING": "UseDevelopmentStorage=true",
+    "BLOB_CONTAINER": "images",
+    "COSMOS_URI": "https://localhost:8081/",
+    "COSMOS_KEY": base64.b64encode(b"stand-in").decode(),
+    "COSMOS_DB": "attendance",
+    "COSMOS_USERS_CONTAINER": "users",
+    "COSMOS_ATTENDANCE_CONTAINER": "attendance",
+    "CV_PREDICTION_KEY": "stand-in",
+    "CV_TRAINING_KEY": "stand-in",
+    "CV_PROJECT_ID": "00000000-0000-0000-0000-000000000000",
+    "CV_PUBLISHED_NAME": "stand-in",
+}
+
+
+class StandIns:
+    """The three fakes, wired together; see install_standins()."""
+
+    def __init__(self, blob_ms=0.0, cosmos_ms=0.0, predict_ms=0.0, training_ms=0.0,
+                 jitter=0.25, error_rate=0.0, seed=None):
+        def latency(ms):
+            return Latency(ms, ms * jitter, error_rate, seed)
+        self.blob = FakeBlobContainer(latency(blob_ms))
+        self.cosmos = FakeCosmosDatabase({"attendance": "/localDate"}, latency(cosmos_ms))
+        self.cv = CustomVisionStub(latency(predict_ms), latency(training_ms))
+
+    def stats(self) -> dict:
+        return {"blob": self.blob.stats(), "cosmos": self.cosmos.stats(), "customVision": self.cv.stats()}
+
+    def close(self):
+        self.cv.stop()
+
+
+def install_standins(environ, **options) -> StandIns:
+    """
+    Start the stand-ins, point the app settings at them and install them into
+    clients.py; call before the handler module builds any client.
+    `environ` is the mapping to fill in (os.environ); existing values win.
+    """
+    import clients
+
+    standins = StandIns(**options)
+    standins.cv.start()
+    for key, value in {**STANDIN_SETTINGS,
+                       "CV_PREDICTION_ENDPOINT": standins.cv.endpoint,
+                       "CV_TRAINING_ENDPOINT": standins.cv.endpoint}.items():
+        environ.setdefault(key, value)
+    clients.blob_container.install(standins.blob)
+    clients.cosmos_database.install(standins.cosmos)
+    return standins
+
+
+def seed_roster(standins: StandIns, users: int, sections=("A", "B", "C", "D")) -> list:
+    """Enroll `users` students in the users container and as Custom Vision tags."""
+    roster = []
+    for i in range(users):
+        roster.append({
+            "id": f"u{i:05d}",
+            "userId": f"u{i:05d}",
+            "name": f"Student {i:05d}",
+            "roll": f"R{i:05d}",
+            "classLabel": f"student-{i:05d}",
+            "section": sections[i % len(sections)],
+            "createdAt": "2024-01-01T00:00:00Z",
+        })
+    standins.cosmos.get_container_client("users").seed(roster)
+    standins.cv.add_tags(u["classLabel"] for u in roster)
+    return roster
+
+
+def seed_attendance(standins: StandIns, roster: list, local_date: str, fraction: float = 1.0) -> int:
+    """Mark the first `fraction` of the roster present on `local_date` (YYYY-MM-DD)."""
+    rows = []
+    for user in roster[:int(len(roster) * fraction)]:
+        rows.append({
+            "id": f"att-{user['userId']}-{local_date.replace('-', '')}",
+            "userId": user["userId"],
+            "name": user["name"],
+            "timestamp": f"{local_date}T03:30:00Z",
+            "confidence": 0.97,
+            "imageBlobPath": f"mark/{user['userId']}.jpg",
+            "device": "seed",
+            "status": "present",
+            "localDate": local_date,
+            "section": user["section"],
+        })
+    standins.cosmos.get_container_client("attendance").seed(rows)
+    return len(rows)
@@ -0,0 +1,114 @@
+import os
+import threading
+
+
+class LazyClient:
+    """
+    Process-wide client built on first use.
+    - `factory()` runs once, under a lock, the first time an attribute is read;
+      every later access goes straight to the built object.
+    - Module-level names (_users, _container, ...) keep working unchanged while
+      the SDK import and connection setup wait until a request needs them, so
+      cold starts and CORS preflights don't pay for clients they never touch.
+    """
+
+    def __init__(self, factory, name: str = "client"):
+        self._factory = factory
+        self._name = name
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._client is not None
+
+    def resolve(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+                client = self._client
+        return client
+
+    def install(self, client):
+        """Use `client` instead of building one (stand-ins for benchmarks and load tests)."""
+        with self._lock:
+            self._client = client
+
+    def __getattr__(self, attr):
+        # Only called for attributes LazyClient itself doesn't define
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"<LazyClient {self._name} ({'built' if self.built else 'not built'})>"
+
+
+def _blob_container():
+    from azure.storage.blob import BlobServiceClient
+
+    service = BlobServiceClient.from_connection_string(os.environ["BLOB_CONN_STRING"])
+    return service.get_container_client(os.environ["BLOB_CONTAINER"])
+
+
+def _cosmos_database():
+    from azure.cosmos import CosmosClient
+
+    client = CosmosClient(os.environ["COSMOS_URI"], os.environ["COSMOS_KEY"])
+    return client.get_database_client(os.environ["COSMOS_DB"])
+
+
+def _custom_vision():
+    from cv_client import CustomVisionClient
+
+    return CustomVisionClient.from_env()
+
+
+blob_container = LazyClient(_blob_container, "blob container")
+cosmos_database = LazyClient(_cosmos_database, "cosmos database")
+custom_vision = LazyClient(_custom_vision, "custom vision")
+
+
+def _charged(container, name: str):
+    """Attach RU accounting (cosmos_ru.py) to a container client."""
+    from cosmos_ru import ChargedContainer, charges
+
+    return ChargedContainer(container, charges, name)
+
+
+def cosmos_container(setting: str) -> LazyClient:
+    """Lazy container client for the container named by the `setting` env var."""
+    return LazyClient(lambda: _charged(cosmos_database.get_container_client(os.environ[setting]),
+                                       os.environ[setting]), setting)
+
+
+# asyncio clients for the async handlers (HANDLER_MODE=async); built inside the event loop
+def _blob_container_aio():
+    from azure.storage.blob.aio import BlobServiceClient
+
+    service = BlobServiceClient.from_connection_string(os.environ["BLOB_CONN_STRING"])
+    return service.get_container_client(os.environ["BLOB_CONTAINER"])
+
+
+def _cosmos_database_aio():
+    from azure.cosmos.aio import CosmosClient
+
+    client = CosmosClient(os.environ["COSMOS_URI"], os.environ["COSMOS_KEY"])
+    return client.get_database_client(os.environ["COSMOS_DB"])
+
+
+def _custom_vision_aio():
+    from cv_client_aio import AsyncCustomVisionClient
+
+    return AsyncCustomVisionClient(custom_vision.resolve(), pool_size=int(os.getenv("CV_AIO_POOL_SIZE", "64")))
+
+
+blob_container_aio = LazyClient(_blob_container_aio, "async blob container")
+cosmos_database_aio = LazyClient(_cosmos_database_aio, "async cosmos database")
+custom_vision_aio = LazyClient(_custom_vision_aio, "async custom vision")
+
+
+def cosmos_container_aio(setting: str) -> LazyClient:
+    """Async counterpart of cosmos_container()."""
+    return LazyClient(lambda: _charged(cosmos_database_aio.get_container_client(os.environ[setting]),
+                                       os.environ[setting]), setting)
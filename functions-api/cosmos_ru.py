@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+
+from timing import current_request, label
+
+# Container client methods that talk to Cosmos and accept response_hook
+CHARGED_OPERATIONS = frozenset({
+    "create_item", "read_item", "upsert_item", "replace_item", "patch_item", "delete_item",
+    "execute_item_batch", "query_items", "read_all_items", "query_items_change_feed",
+})
+
+BACKGROUND = "background"
+
+
+def query_shape(query) -> str:
+    """Whitespace-normalized query text; parameter values never appear in it."""
+    if isinstance(query, dict):
+        query = query.get("query", "")
+    return " ".join(str(query).split())
+
+
+class _CallCharge:
+    """response_hook for one Cosmos call; sees every page of a query."""
+
+    __slots__ = ("charges", "key", "ru", "pages", "flagged", "chained")
+
+    def __init__(self, charges, key, chained=None):
+        self.charges = charges
+        self.key = key
+        self.ru = 0.0
+        self.pages = 0
+        self.flagged = False
+        self.chained = chained
+
+    def __call__(self, headers, result):
+        if self.chained is not None:
+            self.chained(headers, result)
+        # query_items() also calls the hook with its pager and the connection's
+        # previous headers (another call's charge); query plans are free
+        if result is not None and not isinstance(result, (dict, list)):
+            return
+        if isinstance(result, dict) and "queryInfo" in result:
+            return
+        try:
+            ru = float((headers or {}).get("x-ms-request-charge") or 0.0)
+        except ValueError:
+            ru = 0.0
+        self.charges.record(self, ru)
+
+
+class CosmosCharges:
+    """
+    RU accounting for every Cosmos call made through ChargedContainer.
+    - Aggregated per (endpoint, container, operation, query shape): calls,
+      pages (responses), total RU and the most expensive single call.
+    - The endpoint is that of the request being timed (timing.py), or
+      "background" for flushers, warmers and timers; the request's running
+      total is also added to its cosmos_ru counter (Server-Timing).
+    - A call whose RU passes `warn_ru` is logged once and counted as expensive.
+    """
+
+    def __init__(self, warn_ru: float = 50.0):
+        self.warn_ru = float(warn_ru)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(warn_ru=float(os.getenv("COSMOS_RU_WARN", "50")))
+
+    def hook(self, container: str, operation: str, shape: str = "", chained=None) -> _CallCharge:
+        request = current_request()
+        key = (request.endpoint if request is not None else BACKGROUND, container, operation, shape)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {"calls": 0, "pages": 0, "ru": 0.0, "maxRu": 0.0, "expensive": 0}
+            stats["calls"] += 1
+        return _CallCharge(self, key, chained)
+
+    def record(self, call: _CallCharge, ru: float):
+        call.ru += ru
+        call.pages += 1
+        flag = False
+        with self._lock:
+            stats = self._stats[call.key]
+            stats["pages"] += 1
+            stats["ru"] += ru
+            if call.ru > stats["maxRu"]:
+                stats["maxRu"] = call.ru
+            if self.warn_ru and call.ru > self.warn_ru and not call.flagged:
+                call.flagged = flag = True
+                stats["expensive"] += 1
+        request = current_request()
+        if request is not None:
+            request.count("cosmos_ru", ru)
+        if flag:
+            endpoint, container, operation, shape = call.key
+            logging.warning(f"[Cosmos] {endpoint}: {operation} on {container} passed {self.warn_ru:g} RU "
+                            f"({call.ru:.1f} RU over {call.pages} pages) {shape}")
+
+    def snapshot(self) -> list:
+        """One dict per (endpoint, container, operation, shape), most RU first."""
+        with self._lock:
+            items = [(key, dict(stats)) for key, stats in self._stats.items()]
+        rows = [{"endpoint": e, "container": c, "operation": o, "query": q, **stats}
+                for (e, c, o, q), stats in items]
+        return sorted(rows, key=lambda r: r["ru"], reverse=True)
+
+    def exposition(self, prefix: str) -> list:
+        """Prometheus lines for Metrics.add_exposition."""
+        rows = self.snapshot()
+        series = (
+            ("cosmos_ru_total", "counter", "ru", "Request units charged"),
+            ("cosmos_calls_total", "counter", "calls", "Cosmos calls"),
+            ("cosmos_pages_total", "counter", "pages", "Cosmos responses (query pages)"),
+            ("cosmos_call_ru_max", "gauge", "maxRu", "Most RU charged to a single call"),
+            ("cosmos_expensive_calls_total", "counter", "expensive", "Calls above COSMOS_RU_WARN"),
+        )
+        lines = []
+        for name, kind, field, help_text in series:
+            metric = f"{prefix}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for r in rows:
+                labels = (f'endpoint="{label(r["endpoint"])}",container="{label(r["container"])}",'
+                          f'operation="{r["operation"]}",query="{label(r["query"])}"')
+                lines.append(f"{metric}{{{labels}}} {r[field]:g}")
+        return lines
+
+
+class ChargedContainer:
+    """
+    Cosmos container client (sync or aio) that attaches a CosmosCharges hook
+    to each call; everything else passes straight through.
+    """
+
+    def __init__(self, container, charges: CosmosCharges, name: str):
+        self._container = container
+        self._charges = charges
+        self._name = name
+
+    def __getattr__(self, attr):
+        target = getattr(self._container, attr)
+        if attr not in CHARGED_OPERATIONS:
+            return target
+
+        def charged(*args, **kwargs):
+            shape = ""
+            if attr == "query_items":
+                shape = query_shape(kwargs.get("query", args[0] if args else ""))
+            kwargs["response_hook"] = self._charges.hook(self._name, attr, shape, kwargs.get("response_hook"))
+            return target(*args, **kwargs)
+        return charged
+
+    def __repr__(self):
+        return f"<ChargedContainer {self._name}>"
+
+
+# Process-wide accounting shared by the handlers
+charges = CosmosCharges.from_env()
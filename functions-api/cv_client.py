@@ -0,0 +1,366 @@
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth retrying: throttling and transient server-side failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Custom Vision limit for one CreateImagesFromFiles call
+MAX_BATCH_IMAGES = 64
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Custom Vision while the breaker is open."""
+
+
+class TagCreateError(Exception):
+    """Creating a Custom Vision tag did not yield a usable tag id."""
+
+
+def _normalize_training_endpoint(ep: str) -> str:
+    """
+    Ensure endpoint is just the resource root (scheme+host), e.g.
+    https://<resource>.cognitiveservices.azure.com
+    (Strips any accidental /customvision/... suffix.)
+    """
+    ep = (ep or "").strip()
+    if not ep:
+        return ep
+    u = urlparse(ep)
+    if u.scheme and u.netloc:
+        return f"{u.scheme}://{u.netloc}"
+    return ep.split("/customvision", 1)[0].rstrip("/")
+
+
+def _retry_after_seconds(response):
+    """Parse a Retry-After header (delta-seconds or HTTP date); None if absent/invalid."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+    - closed: calls flow; `failure_threshold` failures in a row open it.
+    - open: calls fail fast until `reset_timeout` seconds have passed.
+    - half-open: one trial call is let through; success closes, failure re-opens.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state_locked()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Give back a half-open trial that ended without an outcome (e.g. the caller was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class CustomVisionClient:
+    """
+    Long-lived Custom Vision client shared by prediction and training calls.
+    - One keep-alive requests.Session (connection pool) per process.
+    - URLs and auth headers are built once from configuration.
+    - Bounded retries with full-jitter exponential backoff; 429 Retry-After is honored.
+    - A circuit breaker fails fast while the service keeps erroring.
+    Endpoints are plain URLs, so a local stub HTTP server can stand in for Azure.
+    """
+
+    def __init__(self, prediction_endpoint: str, training_endpoint: str, project_id: str,
+                 published_name: str, prediction_key: str, training_key: str,
+                 predict_timeout: float = 10.0, training_timeout: float = 60.0,
+                 tags_timeout: float = 15.0, connect_timeout: float = 3.05,
+                 max_retries: int = 3, backoff_base: float = 0.25, backoff_max: float = 4.0,
+                 max_retry_after: float = 30.0, pool_size: int = 16,
+                 breaker: CircuitBreaker = None, session: requests.Session = None):
+        self.prediction_endpoint = (prediction_endpoint or "").rstrip("/")
+        self.training_endpoint_raw = training_endpoint or ""
+        self.training_endpoint = _normalize_training_endpoint(training_endpoint)
+        self.project_id = project_id or ""
+        self.published_name = published_name or ""
+
+        self.predict_timeout = float(predict_timeout)
+        self.training_timeout = float(training_timeout)
+        self.tags_timeout = float(tags_timeout)
+        self.connect_timeout = float(connect_timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.max_retry_after = float(max_retry_after)
+        self.breaker = breaker or CircuitBreaker()
+
+        # Precomputed URLs
+        self.predict_url = (f"{self.prediction_endpoint}/customvision/v3.0/Prediction/"
+                            f"{self.project_id}/classify/iterations/{self.published_name}/image")
+        training_root = f"{self.training_endpoint}/customvision/v3.3/training/projects/{self.project_id}"
+        self.tags_url = f"{training_root}/tags"
+        self.image_single_url = f"{training_root}/images/image"
+        self.images_url = f"{training_root}/images"
+        self.images_files_url = f"{training_root}/images/files"
+
+        # Precomputed headers
+        self.predict_headers = {"Prediction-Key": prediction_key or "",
+                                "Content-Type": "application/octet-stream"}
+        self.training_headers_json = {"Training-Key": training_key or "", "Content-Type": "application/json"}
+        self.training_headers_octet = {"Training-Key": training_key or "",
+                                       "Content-Type": "application/octet-stream"}
+        self.training_headers_plain = {"Training-Key": training_key or ""}
+
+        if session is None:
+            session = requests.Session()
+            # Retries are handled here (with Retry-After support), not by urllib3
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+        # Process-wide tag name -> tagId map, loaded lazily from /tags
+        self._tag_ids = {}
+        self._tags_loaded = False
+        self._tags_lock = threading.Lock()
+        self._tags_load_lock = threading.Lock()
+        self._tag_create_locks = {}
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Build a client from the same app settings the handlers already use."""
+        kwargs = dict(
+            prediction_endpoint=os.environ.get("CV_PREDICTION_ENDPOINT", ""),
+            training_endpoint=os.environ.get("CV_TRAINING_ENDPOINT", ""),
+            project_id=os.environ.get("CV_PROJECT_ID", ""),
+            published_name=os.environ.get("CV_PUBLISHED_NAME", ""),
+            prediction_key=os.environ.get("CV_PREDICTION_KEY", ""),
+            training_key=os.environ.get("CV_TRAINING_KEY", ""),
+            predict_timeout=float(os.getenv("CV_PREDICT_TIMEOUT", "10")),
+            training_timeout=float(os.getenv("CV_TRAINING_TIMEOUT", "60")),
+            tags_timeout=float(os.getenv("CV_TAGS_TIMEOUT", "15")),
+            connect_timeout=float(os.getenv("CV_CONNECT_TIMEOUT", "3.05")),
+            max_retries=int(os.getenv("CV_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("CV_BACKOFF_BASE", "0.25")),
+            backoff_max=float(os.getenv("CV_BACKOFF_MAX", "4")),
+            max_retry_after=float(os.getenv("CV_MAX_RETRY_AFTER", "30")),
+            pool_size=int(os.getenv("CV_POOL_SIZE", "16")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("CV_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("CV_BREAKER_RESET_SECONDS", "30"))
+            ),
+        )
+        kwargs.update(overrides)
+        return cls(**kwargs)
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        """Delay before retry number `attempt` (0-based); None means do not retry."""
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, timeout: float, **kwargs) -> requests.Response:
+        """
+        Send a request with retries and the circuit breaker applied.
+        Returns the final response (callers decide how to treat non-2xx);
+        raises CircuitOpenError when failing fast, or the last connection error.
+        Every call settles the breaker (success or failure) or, if interrupted,
+        releases its half-open trial, so the breaker can't stay shut for good.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Custom Vision circuit open; not calling {url}")
+
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                response, error = None, None
+                try:
+                    response = self.session.request(method, url, timeout=(self.connect_timeout, timeout),
+                                                    **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+                except Exception:
+                    # Broken responses (truncated body, decoding, SSL) are service failures too
+                    settled = True
+                    self.breaker.record_failure()
+                    raise
+
+                if error is None and response.status_code not in RETRY_STATUSES:
+                    settled = True
+                    self.breaker.record_success()
+                    return response
+
+                delay = self._backoff(attempt, response) if attempt < self.max_retries else None
+                if delay is None:
+                    settled = True
+                    self.breaker.record_failure()
+                    if error is not None:
+                        raise error
+                    return response
+
+                logging.warning(f"[CV] {method} {url} -> "
+                                f"{error or response.status_code}; retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            if not settled:
+                self.breaker.release_trial()
+
+    # ---- Prediction ----
+
+    def predict(self, data: bytes) -> dict:
+        r = self.request("POST", self.predict_url, self.predict_timeout,
+                         headers=self.predict_headers, data=data)
+        r.raise_for_status()
+        return r.json()
+
+    # ---- Training ----
+
+    def list_tags(self) -> list:
+        r = self.request("GET", self.tags_url, self.tags_timeout, headers=self.training_headers_json)
+        r.raise_for_status()
+        return r.json()
+
+    def create_tag(self, name: str) -> requests.Response:
+        return self.request("POST", self.tags_url, self.tags_timeout,
+                            headers=self.training_headers_plain, params={"name": name})
+
+    def refresh_tags(self) -> dict:
+        """Reload the whole name -> tagId map with one GET /tags."""
+        tags = self.list_tags()
+        with self._tags_lock:
+            self._tag_ids = {t.get("name"): t.get("id") for t in tags if t.get("name") and t.get("id")}
+            self._tags_loaded = True
+            return dict(self._tag_ids)
+
+    def cached_tag_id(self, name: str):
+        with self._tags_lock:
+            return self._tag_ids.get(name)
+
+    def forget_tag(self, name: str):
+        """Drop a cached tagId the service no longer recognizes."""
+        with self._tags_lock:
+            self._tag_ids.pop(name, None)
+
+    def resolve_tag_id(self, name: str):
+        """
+        Return (tag_id, created) for a tag name, creating the tag if needed.
+        - The tag list is fetched once per process, then kept current as tags are created.
+        - Concurrent callers for the same new name share a single create.
+        - If the create is refused because the tag already exists (e.g. made by another
+          instance), the map is refreshed once and the existing id is returned.
+        """
+        with self._tags_lock:
+            loaded = self._tags_loaded
+            tag_id = self._tag_ids.get(name)
+        if tag_id:
+            return tag_id, False
+        if not loaded:
+            with self._tags_load_lock:
+                # Only the first caller lists the tags; the rest reuse its result
+                if not self._tags_loaded:
+                    self.refresh_tags()
+            tag_id = self.cached_tag_id(name)
+            if tag_id:
+                return tag_id, False
+
+        with self._tags_lock:
+            create_lock = self._tag_create_locks.setdefault(name, threading.Lock())
+        with create_lock:
+            # Another thread may have created it while we waited
+            tag_id = self.cached_tag_id(name)
+            if tag_id:
+                return tag_id, False
+
+            r = self.create_tag(name)
+            if r.ok:
+                tag_id = r.json().get("id")
+                if not tag_id:
+                    raise TagCreateError(f"Create tag succeeded but no 'id' in response: {r.text}")
+                with self._tags_lock:
+                    self._tag_ids[name] = tag_id
+                return tag_id, True
+
+            if 400 <= r.status_code < 500:
+                # Stale miss: the tag exists remotely but not in our map
+                tag_id = self.refresh_tags().get(name)
+                if tag_id:
+                    return tag_id, False
+            r.raise_for_status()
+            raise TagCreateError(f"Create tag failed: {r.status_code} {r.text}")
+
+    def upload_image(self, data: bytes, tag_id: str) -> requests.Response:
+        """Single-image bytes endpoint (/images/image, octet-stream)."""
+        return self.request("POST", self.image_single_url, self.training_timeout,
+                            headers=self.training_headers_octet, params={"tagIds": tag_id}, data=data)
+
+    def upload_image_multipart(self, data: bytes, tag_id: str) -> requests.Response:
+        """Multipart fallback to /images; requests sets the boundary header."""
+        files = {"imageData": ("upload.jpg", data, "application/octet-stream")}
+        return self.request("POST", self.images_url, self.training_timeout,
+                            headers=self.training_headers_plain, params={"tagIds": tag_id}, files=files)
+
+    def upload_images_batch(self, images: list) -> requests.Response:
+        """
+        Batch upload via /images/files (at most MAX_BATCH_IMAGES per call).
+        Each entry is {"name": str, "contents": <base64 str>, "tagIds": [tagId]}.
+        """
+        if len(images) > MAX_BATCH_IMAGES:
+            raise ValueError(f"At most {MAX_BATCH_IMAGES} images per batch, got {len(images)}")
+        return self.request("POST", self.images_files_url, self.training_timeout,
+                            headers=self.training_headers_json, json={"images": images})
+
+    def close(self):
+        self.session.close()
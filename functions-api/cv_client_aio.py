@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+from cv_client import RETRY_STATUSES, CircuitOpenError
+
+
+class AsyncResponse:
+    """The parts of a Custom Vision response the handlers read, already fully received."""
+
+    def __init__(self, status_code: int, headers, body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = body
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncCustomVisionClient:
+    """
+    asyncio counterpart of CustomVisionClient for the async handlers.
+    - Shares the sync client's URLs, headers, timeouts, retry policy, circuit
+      breaker and tag map, so both paths see the same service state.
+    - One pooled aiohttp session (keep-alive, `pool_size` connections), created
+      on first use inside the running event loop.
+    Tag listing/creation is rare and cached, so it stays on the sync client.
+    """
+
+    def __init__(self, base, pool_size: int = 64):
+        self.base = base
+        self.pool_size = int(pool_size)
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            )
+        return self._session
+
+    async def request(self, method: str, url: str, timeout: float, **kwargs) -> AsyncResponse:
+        """
+        Same contract as CustomVisionClient.request, without blocking a thread.
+        A cancelled call (the client went away) releases its half-open trial
+        instead of leaving the breaker shut.
+        """
+        base = self.base
+        if not base.breaker.allow():
+            raise CircuitOpenError(f"Custom Vision circuit open; not calling {url}")
+
+        client_timeout = aiohttp.ClientTimeout(total=timeout + base.connect_timeout,
+                                               sock_connect=base.connect_timeout)
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                response, error = None, None
+                try:
+                    async with self._get_session().request(method, url, timeout=client_timeout, **kwargs) as r:
+                        response = AsyncResponse(r.status, r.headers, await r.read())
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = e
+                except Exception:
+                    # Broken responses (e.g. ClientPayloadError) are service failures too
+                    settled = True
+                    base.breaker.record_failure()
+                    raise
+
+                if error is None and response.status_code not in RETRY_STATUSES:
+                    settled = True
+                    base.breaker.record_success()
+                    return response
+
+                delay = base._backoff(attempt, response) if attempt < base.max_retries else None
+                if delay is None:
+                    settled = True
+                    base.breaker.record_failure()
+                    if error is not None:
+                        raise error
+                    return response
+
+                logging.warning(f"[CV] {method} {url} -> "
+                                f"{error or response.status_code}; retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+        finally:
+            if not settled:
+                base.breaker.release_trial()
+
+    async def predict(self, data: bytes) -> dict:
+        r = await self.request("POST", self.base.predict_url, self.base.predict_timeout,
+                               headers=self.base.predict_headers, data=data)
+        if not r.ok:
+            raise Exception(f"Custom Vision API Error: {r.status_code} - {r.text}")
+        return r.json()
+
+    async def upload_image(self, data: bytes, tag_id: str) -> AsyncResponse:
+        """Single image as raw bytes to /images/image."""
+        return await self.request("POST", self.base.image_single_url, self.base.training_timeout,
+                                  headers=self.base.training_headers_octet,
+                                  params={"tagIds": tag_id}, data=data)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
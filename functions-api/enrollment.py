@@ -0,0 +1,211 @@
+import base64
+import binascii
+import logging
+from datetime import datetime
+
+from cv_client import MAX_BATCH_IMAGES
+from imaging import image_bytes
+
+# Upper bound on images in one uploadAndEnrollBatch request
+MAX_BATCH_REQUEST_IMAGES = 1024
+
+
+def parse_batch(body) -> tuple:
+    """
+    Validate an uploadAndEnrollBatch body.
+    Accepts {"students": [{name, roll, userId, classLabel, section?, images: [b64, ...]}]};
+    a single "base64Image" is accepted in place of "images".
+    Images are base64-decoded here, so a malformed one rejects only its
+    student, before any tag is resolved or created.
+    Returns (students, errors) where errors are per-item result dicts.
+    """
+    students = (body or {}).get("students")
+    if not isinstance(students, list) or not students:
+        raise ValueError("students must be a non-empty list")
+
+    valid, errors, total_images = [], [], 0
+    for index, s in enumerate(students):
+        s = s if isinstance(s, dict) else {}
+        images = s.get("images") or ([s["base64Image"]] if s.get("base64Image") else [])
+        images = [i for i in images if isinstance(i, str) and i]
+        if not all([s.get("name"), s.get("roll"), s.get("userId"), s.get("classLabel"), images]):
+            errors.append({
+                "index": index,
+                "userId": s.get("userId"),
+                "ok": False,
+                "error": "name, roll, userId, classLabel and at least one image required"
+            })
+            continue
+        try:
+            images = [image_bytes(i) for i in images]
+        except (binascii.Error, ValueError) as e:
+            errors.append({
+                "index": index,
+                "userId": s.get("userId"),
+                "ok": False,
+                "error": f"image is not valid base64: {str(e)}"
+            })
+            continue
+        total_images += len(images)
+        valid.append({"index": index, **{k: s[k] for k in ("name", "roll", "userId", "classLabel")},
+                      "section": s.get("section"), "images": images})
+
+    if total_images > MAX_BATCH_REQUEST_IMAGES:
+        raise ValueError(f"At most {MAX_BATCH_REQUEST_IMAGES} images per request, got {total_images}")
+    return valid, errors
+
+
+def enroll_batch(students: list, save_image, upsert_user, cv, pool, recognizer=None, prepare=None) -> list:
+    """
+    Enroll many students in one pass.
+    - Blob writes fan out on `pool` (its size bounds the concurrency); give it
+      a pool of its own so a large batch doesn't queue ahead of live requests.
+    - Training images go to Custom Vision in batches of up to MAX_BATCH_IMAGES,
+      running alongside the blob writes.
+    - User documents are upserted concurrently once their images are stored.
+    `save_image(prefix, image, original)` and `upsert_user(doc)` are the handler module's helpers.
+    `prepare(image)` -> (jpeg, decoded, original) normalizes each image first, on the pool.
+    With a local `recognizer`, images are enrolled there instead of in Custom Vision.
+    Returns one result dict per student, in input order.
+    """
+    results = {s["index"]: {"index": s["index"], "userId": s["userId"], "ok": True,
+                            "blobPaths": [], "customVision": {"uploaded": 0, "failed": []}}
+               for s in students}
+
+    # 1) Normalize once; blob, training and the local recognizer share the result.
+    # An image that fails here is reported on its student and dropped; the rest go on
+    originals = {}
+    # Input position of each image still in play, so reported names match the request
+    positions = {s["index"]: list(range(len(s["images"]))) for s in students}
+    if prepare is not None:
+        def prepare_one(image):
+            try:
+                return prepare(image), None
+            except Exception as e:
+                return None, e
+
+        flat = [(s, i) for s in students for i in range(len(s["images"]))]
+        kept = {s["index"]: [] for s in students}
+        positions = {s["index"]: [] for s in students}
+        for (s, i), (out, error) in zip(flat, pool.map(lambda si: prepare_one(si[0]["images"][si[1]]), flat)):
+            if error is not None:
+                logging.error(f"Enroll image {s['index']}-{i} for {s['userId']} could not be prepared: {str(error)}")
+                results[s["index"]].setdefault("imageErrors", []).append({"image": f"{s['index']}-{i}",
+                                                                          "error": str(error)})
+                continue
+            data, _, original = out
+            if original is not None:
+                originals[(s["index"], len(kept[s["index"]]))] = original
+            kept[s["index"]].append(data)
+            positions[s["index"]].append(i)
+        for s in students:
+            s["images"] = kept[s["index"]]
+        for s in [s for s in students if not s["images"]]:
+            results[s["index"]].update(ok=False, error="no image could be prepared")
+        students = [s for s in students if s["images"]]
+
+    # 2) Resolve each distinct tag once (cached; new labels are created)
+    tag_ids = {}
+    for label in ({s["classLabel"] for s in students} if recognizer is None else ()):
+        try:
+            tag_ids[label], _ = cv.resolve_tag_id(label)
+        except Exception as e:
+            logging.error(f"[CV] Could not resolve tag {label}: {str(e)}")
+            tag_ids[label] = None
+            for s in students:
+                if s["classLabel"] == label:
+                    results[s["index"]]["customVision"]["error"] = f"tag: {str(e)}"
+
+    # 3) Blob writes, one task per image
+    blob_futures = [(s, pool.submit(save_image, f"enroll/{s['userId']}", img, originals.get((s["index"], i))))
+                    for s in students for i, img in enumerate(s["images"])]
+
+    # 4) Custom Vision batch uploads, chunked; each chunk's results come back in submission order
+    entries, owners = [], {}
+    for s in students:
+        tag_id = tag_ids.get(s["classLabel"])
+        if not tag_id:
+            continue
+        for i, b64 in enumerate(s["images"]):
+            name = f"{s['index']}-{positions[s['index']][i]}"
+            owners[name] = s["index"]
+            contents = b64 if isinstance(b64, str) else base64.b64encode(b64).decode()
+            entries.append({"name": name, "contents": contents, "tagIds": [tag_id]})
+    chunks = [entries[i:i + MAX_BATCH_IMAGES] for i in range(0, len(entries), MAX_BATCH_IMAGES)]
+    cv_futures = [(chunk, pool.submit(cv.upload_images_batch, chunk)) for chunk in chunks]
+
+    if recognizer is not None:
+        # One call for the whole batch, so the gallery is written once
+        flat = [(s, i) for s in students for i in range(len(s["images"]))]
+        enrolled = recognizer.enroll_many([(image_bytes(s["images"][i]), s["classLabel"]) for s, i in flat])
+        for s in students:
+            results[s["index"]]["customVision"]["engine"] = recognizer.name
+        for (s, i), r in zip(flat, enrolled):
+            cv_result = results[s["index"]]["customVision"]
+            if r.get("ok"):
+                cv_result["uploaded"] += 1
+            else:
+                cv_result["failed"].append({"image": f"{s['index']}-{positions[s['index']][i]}",
+                                            "status": r.get("error")})
+
+    for s, future in blob_futures:
+        try:
+            results[s["index"]]["blobPaths"].append(future.result())
+        except Exception as e:
+            logging.error(f"Enroll blob upload failed for {s['userId']}: {str(e)}")
+            results[s["index"]].setdefault("blobErrors", []).append(str(e))
+
+    for chunk, future in cv_futures:
+        try:
+            r = future.result()
+            images = ((r.json() or {}).get("images") or []) if r.ok else []
+            for position, entry in enumerate(chunk):
+                cv_result = results[owners[entry["name"]]]["customVision"]
+                if not r.ok:
+                    status = f"HTTP {r.status_code}"
+                elif position < len(images):
+                    status = images[position].get("status")
+                else:
+                    status = "missing from response"
+                if status in ("OK", "OKDuplicate"):
+                    cv_result["uploaded"] += 1
+                else:
+                    cv_result["failed"].append({"image": entry["name"], "status": status})
+        except Exception as e:
+            logging.error(f"[CV] Batch upload failed: {str(e)}")
+            for entry in chunk:
+                results[owners[entry["name"]]]["customVision"]["failed"].append(
+                    {"image": entry["name"], "status": str(e)})
+
+    # 5) Upsert users that have at least one stored image
+    created_at = datetime.utcnow().isoformat() + "Z"
+    upserts = []
+    for s in students:
+        result = results[s["index"]]
+        if not result["blobPaths"]:
+            result["ok"] = False
+            result["error"] = "no image could be stored"
+            continue
+        user_doc = {
+            "id": s["userId"],
+            "userId": s["userId"],
+            "name": s["name"],
+            "roll": s["roll"],
+            "classLabel": s["classLabel"],
+            "createdAt": created_at,
+            "lastEnrollBlob": result["blobPaths"][-1]
+        }
+        if s.get("section"):
+            user_doc["section"] = s["section"]
+        result["user"] = user_doc
+        upserts.append((result, pool.submit(upsert_user, user_doc)))
+
+    for result, future in upserts:
+        try:
+            future.result()
+        except Exception as e:
+            logging.error(f"Enroll upsert failed for {result['userId']}: {str(e)}")
+            result["ok"] = False
+            result["error"] = str(e)
+
+    return sorted(results.values(), key=lambda r: r["index"])
@@ -0,0 +1,89 @@
+import base64
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+# Columns written by exportAttendance, in order
+EXPORT_FIELDS = ("id", "userId", "name", "localDate", "timestamp", "confidence",
+                 "status", "device", "section", "imageBlobPath")
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Longest range one export request may cover
+EXPORT_MAX_DAYS = 400
+
+
+def parse_range(from_str: str, to_str: str, parse_date) -> tuple:
+    """(start, end) dates from the from/to params; `parse_date` returns (y, m, d)."""
+    if not from_str:
+        raise ValueError("from is required (YYYY-MM-DD or DD-MM-YYYY)")
+    start = date(*parse_date(from_str))
+    end = date(*parse_date(to_str)) if to_str else start
+    if end < start:
+        raise ValueError("to must not be before from")
+    if (end - start).days >= EXPORT_MAX_DAYS:
+        raise ValueError(f"range is limited to {EXPORT_MAX_DAYS} days")
+    return start, end
+
+
+def encode_token(day: date, continuation: str = None) -> str:
+    """Opaque resume token: the local day being read plus Cosmos' continuation within it."""
+    raw = json.dumps({"d": day.isoformat(), "c": continuation}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_token(token: str, start: date = None, end: date = None):
+    """(day, continuation) from a resume token; with a range, the day must lie inside it."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        day, continuation = date.fromisoformat(data["d"]), data.get("c")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("invalid continuation token")
+    # A token from another range must not widen this one
+    if (start and day < start) or (end and day > end):
+        raise ValueError("continuation token does not belong to this range")
+    return day, continuation
+
+
+def iter_export(query_day, start: date, end: date, token: str = None, page_size: int = 500):
+    """
+    Yield (rows, resume_token) for each Cosmos page between `start` and `end` (inclusive).
+    `query_day(local_date, newest_first, page_size)` returns the day's ItemPaged query;
+    days are read oldest first, one single-partition query each.
+    `resume_token` continues right after the yielded page (None once the range is done).
+    Only one page is held at a time.
+    """
+    day, continuation = decode_token(token, start, end) if token else (start, None)
+    while day <= end:
+        pages = query_day(f"{day:%Y-%m-%d}", newest_first=False, page_size=page_size).by_page(continuation)
+        for page in pages:
+            rows = list(page)
+            next_continuation = pages.continuation_token
+            if next_continuation:
+                resume = encode_token(day, next_continuation)
+            else:
+                resume = encode_token(day + timedelta(days=1)) if day < end else None
+            yield rows, resume
+        day += timedelta(days=1)
+        continuation = None
+
+
+def format_rows(rows, fmt: str, header: bool = False) -> str:
+    """Render one page as NDJSON lines or CSV rows (with the header row if asked)."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if header:
+            writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow(["" if row.get(f) is None else row.get(f) for f in EXPORT_FIELDS])
+        return buf.getvalue()
+    return "".join(json.dumps({f: row.get(f) for f in EXPORT_FIELDS}) + "\n" for row in rows)
+
+
+def format_checkpoint(token: str, fmt: str) -> str:
+    """Inline resume marker for streamed exports (only when the client asks for them)."""
+    if fmt == "csv":
+        return f"#resume,{token}\r\n"
+    return json.dumps({"_resume": token}) + "\n"
@@ -0,0 +1,109 @@
+import io
+import threading
+import time
+from collections import OrderedDict, deque
+
+from imaging import decode_grayscale
+
+
+# Decisions that may be replayed: outcomes that recorded nothing. A mark (or an
+# unknown-tag miss) names an identity, and two people in front of the same
+# background can hash alike, so those are always recomputed.
+CACHEABLE_REASONS = frozenset({"no-predictions", "low-confidence", "bad-frame"})
+
+
+def _centre_crop(data, fraction: float):
+    """Central `fraction` of a JPEG (or PIL image) in each dimension, as a PIL image."""
+    from PIL import Image
+
+    img = data if isinstance(data, Image.Image) else Image.open(io.BytesIO(data))
+    w, h = img.size
+    dx, dy = int(w * (1 - fraction) / 2), int(h * (1 - fraction) / 2)
+    return img.crop((dx, dy, w - dx, h - dy))
+
+
+def dhash(data, size: int = 8, crop: float = 1.0) -> int:
+    """
+    Difference hash of a JPEG: downscale to (size+1) x size grayscale and set one bit
+    per horizontally adjacent pixel pair (left brighter than right). 64 bits by default.
+    `crop` < 1 hashes only that central fraction of the frame (where the face is),
+    so a shared background counts for less.
+    """
+    if crop < 1.0:
+        data = _centre_crop(data, crop)
+    g = decode_grayscale(data, (size + 1, size))
+    bits = (g[:, :-1] > g[:, 1:]).ravel()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class FrameCache:
+    """
+    Per-device cache of recent markAttendance rejections keyed by frame dHash.
+    - A frame within `max_distance` bits of a recent frame from the same device,
+      seen less than `ttl` seconds ago, gets that frame's decision back.
+    - Only rejections in CACHEABLE_REASONS are stored; a successful mark is never
+      replayed, since the next person at the kiosk may hash within range.
+    - Frames are hashed on their central `crop` fraction.
+    - Each device keeps at most `per_device` recent frames; at most `max_devices`
+      devices are tracked, least recently used evicted first.
+    """
+
+    def __init__(self, ttl: float = 15.0, max_distance: int = 2, per_device: int = 8,
+                 max_devices: int = 1024, crop: float = 0.5):
+        self.ttl = float(ttl)
+        self.max_distance = int(max_distance)
+        self.crop = min(1.0, max(0.1, float(crop)))
+        self.per_device = max(1, int(per_device))
+        self.max_devices = max(1, int(max_devices))
+        self._devices = OrderedDict()  # device -> deque[(expires_at, hash, payload)]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def lookup(self, device: str, frame_hash: int):
+        """Return the cached decision for a near-identical recent frame, else None."""
+        now = time.monotonic()
+        with self._lock:
+            frames = self._devices.get(device)
+            if frames:
+                self._devices.move_to_end(device)
+                while frames and frames[0][0] <= now:
+                    frames.popleft()
+                for expires_at, h, payload in reversed(frames):
+                    if hamming(h, frame_hash) <= self.max_distance:
+                        self.hits += 1
+                        return payload
+            self.misses += 1
+            return None
+
+    def hash(self, data) -> int:
+        return dhash(data, crop=self.crop)
+
+    def store(self, device: str, frame_hash: int, payload: dict) -> bool:
+        """Remember a rejection for this device; returns False (and stores nothing) for anything else."""
+        if payload.get("ok") or payload.get("reason") not in CACHEABLE_REASONS:
+            return False
+        with self._lock:
+            frames = self._devices.get(device)
+            if frames is None:
+                frames = self._devices[device] = deque(maxlen=self.per_device)
+            self._devices.move_to_end(device)
+            frames.append((time.monotonic() + self.ttl, frame_hash, payload))
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"devices": len(self._devices), "hits": self.hits, "misses": self.misses}
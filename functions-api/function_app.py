@@ -1,66 +1,337 @@
 import azure.functions as func
 import logging
+import asyncio
+import atexit
 import json
 import os
-import base64
-import uuid
-from datetime import datetime, timedelta, timezone
-import requests
-from azure.storage.blob import BlobServiceClient
-from azure.cosmos import CosmosClient
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from archive import content_blob_name, upload_if_absent, upload_if_absent_async
+from attendance_index import DailyMarkIndex, attendance_id
+from clients import (blob_container, blob_container_aio, cosmos_container, cosmos_container_aio,
+                     custom_vision, custom_vision_aio)
+from cosmos_ru import charges
+from export import EXPORT_FORMATS, decode_token, format_rows, iter_export, parse_range
+from frame_cache import FrameCache
+from imaging import BINARY_IMAGE_TYPES, MULTIPART_IMAGE_FIELDS, ImageNormalizer, image_bytes, media_type
+from quality_gate import FrameQualityGate
+from recent_feed import ChangeFeedFollower, RecentFeed
+from timing import metrics, stage
+from user_cache import TTLCache
+from user_listing import parse_user_list_params, query_user_page
 
 # Configuration
 CONF_THRESHOLD = float(os.getenv("CONF_THRESHOLD", "0.85"))
 IST = timezone(timedelta(hours=5, minutes=30))
 
+# Shared worker pool for overlapping independent I/O inside a request
+# (e.g. archiving the mark image while Custom Vision runs the prediction)
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "8"))
+_io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="io")
+
+# uploadAndEnrollBatch fans its blob writes, normalization, Custom Vision chunks and
+# upserts out on a pool of its own, so a bulk upload can't stall check-ins on _io_pool
+ENROLL_POOL_WORKERS = int(os.getenv("ENROLL_POOL_WORKERS", "4"))
+_enroll_pool = ThreadPoolExecutor(max_workers=ENROLL_POOL_WORKERS, thread_name_prefix="enroll")
+
+# exportAttendance: Cosmos page size, and rows per response before handing back a token
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "5000"))
+
+# "sync" (default) or "async": markAttendance, uploadAndEnroll and getAttendance on
+# the asyncio SDK clients instead of one worker thread per request
+HANDLER_MODE = os.getenv("HANDLER_MODE", "sync").lower()
+ASYNC_HANDLERS = HANDLER_MODE == "async"
+
 # Azure Functions app
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
+# Per-stage timings go out as a Server-Timing header and into the /api/metrics histograms
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+
+def _timed(endpoint: str):
+    return metrics.timed(endpoint, header=SERVER_TIMING)
+
+def _sync_route(**kwargs):
+    """app.route for a handler with an async variant; registered only in sync mode."""
+    return app.route(**kwargs) if not ASYNC_HANDLERS else (lambda fn: fn)
+
+def _async_route(name: str, **kwargs):
+    """app.route for the async variant, under the sync handler's function name."""
+    if not ASYNC_HANDLERS:
+        return lambda fn: fn
+    return lambda fn: app.function_name(name=name)(app.route(**kwargs)(fn))
+
 # CORS Headers Helper
 def add_cors_headers(response: func.HttpResponse) -> func.HttpResponse:
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Device-Id'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Continuation-Token, Server-Timing'
+    response.headers['Timing-Allow-Origin'] = '*'
     return response
 
+@stage("decode")
+def _read_image_request(req: func.HttpRequest):
+    """
+    Return (fields, image_bytes) from a JSON, raw JPEG or multipart request.
+    - application/json: fields from the body; base64Image is decoded once
+    - application/octet-stream / image/jpeg: fields from the query string; the body is the image
+    - multipart/form-data: fields from the form; the image from the 'image' file part
+    image_bytes is None when the request carries no image.
+    """
+    ctype = media_type(req.headers.get("Content-Type"))
+    if ctype in BINARY_IMAGE_TYPES:
+        return dict(req.params), (req.get_body() or None)
+    if ctype == "multipart/form-data":
+        fields = dict(req.form)
+        part = next((req.files[f] for f in MULTIPART_IMAGE_FIELDS if f in req.files), None)
+        if part is not None:
+            return fields, (part.read() or None)
+        b64 = fields.pop("base64Image", None)
+        return fields, (image_bytes(b64) if b64 else None)
+    body = req.get_json() or {}
+    b64 = body.get("base64Image")
+    return body, (image_bytes(b64) if b64 else None)
+
+# Azure clients are built on first use (clients.py), so cold starts and preflights
+# don't pay for SDK imports and connection setup they never need
 # Blob Storage Client
-_blob = BlobServiceClient.from_connection_string(os.environ["BLOB_CONN_STRING"])
-_container = _blob.get_container_client(os.environ["BLOB_CONTAINER"])
-
-def save_base64_jpeg(prefix: str, b64: str) -> str:
-    """Save base64 encoded image to Azure Blob Storage"""
-    # Strip data URI prefix if present (e.g., "data:image/jpeg;base64,")
-    if isinstance(b64, str) and b64.startswith("data:"):
-        b64 = b64.split(",", 1)[1]
-    data = base64.b64decode(b64)
-    name = f"{prefix}/{datetime.utcnow().date()}/{uuid.uuid4()}.jpg"
-    _container.upload_blob(name, data, overwrite=True, content_type="image/jpeg")
+_container = blob_container
+
+# Optional spooled archival: images land on local disk and upload in the background
+_archiver = None
+if os.getenv("ARCHIVE_MODE", "sync").lower() == "spool":
+    from archive import BlobArchiver
+    _archiver = BlobArchiver.from_env(_container)
+    atexit.register(_archiver.close)
+
+# Keep images of frames that produced no mark (no-predictions, low-confidence, unknown-tag)
+ARCHIVE_REJECTED = os.getenv("ARCHIVE_REJECTED", "true").lower() in ("1", "true", "yes")
+
+@stage("blob")
+def save_base64_jpeg(prefix: str, image, original=None) -> str:
+    """
+    Save a JPEG (raw bytes, or base64 with optional data URI) to Azure Blob Storage.
+    - The blob is named <prefix>/<UTC date>/<content hash>.jpg, so an image
+      resubmitted the same day is stored once.
+    - With ARCHIVE_MODE=spool the bytes are spooled locally and uploaded in the
+      background; the returned name is final either way.
+    `original`, when given, is stored alongside under original/<same name>.
+    """
+    data = image_bytes(image)
+    name = content_blob_name(prefix, data)
+    if _archiver is not None:
+        _archiver.put(name, data)
+        if original is not None:
+            _archiver.put(f"original/{name}", image_bytes(original))
+        return name
+    upload_if_absent(_container, name, data)
+    if original is not None:
+        upload_if_absent(_container, f"original/{name}", image_bytes(original))
     return name
 
+# Incoming frames are oriented, downscaled and re-encoded once before prediction and storage
+_normalizer = ImageNormalizer.from_env()
+
+@stage("normalize")
+def _prepare_image(image):
+    """
+    Normalize an uploaded image.
+    Returns (jpeg, decoded, original): the bytes to predict/store, the decoded
+    image for later pixel stages (None if it couldn't be decoded) and the
+    untouched upload when IMAGE_KEEP_ORIGINAL is set and normalizing changed it.
+    """
+    raw = image_bytes(image)
+    data, decoded = _normalizer.normalize(raw)
+    original = raw if _normalizer.keep_original and data is not raw else None
+    return data, decoded, original
+
+def _archive_outcome(data, original=None):
+    """Archive a mark frame now; return (blob_path, error)."""
+    try:
+        return save_base64_jpeg("mark", data, original), None
+    except Exception as e:
+        logging.error(f"Archiving mark image failed: {str(e)}")
+        return None, str(e)
+
+def _archive_rejected(data, original=None):
+    """Archive a rejected frame on the I/O pool (ARCHIVE_REJECTED); the response doesn't wait for it."""
+    def log_failure(future):
+        if future.exception() is not None:
+            logging.error(f"Archiving rejected frame failed: {str(future.exception())}")
+
+    if ARCHIVE_REJECTED:
+        _io_pool.submit(save_base64_jpeg, "mark", data, original).add_done_callback(log_failure)
+
 # Cosmos DB Clients
-_cosmos = CosmosClient(os.environ["COSMOS_URI"], os.environ["COSMOS_KEY"])
-_db = _cosmos.get_database_client(os.environ["COSMOS_DB"])
-_users = _db.get_container_client(os.environ["COSMOS_USERS_CONTAINER"])
-_att = _db.get_container_client(os.environ["COSMOS_ATTENDANCE_CONTAINER"])
+_users = cosmos_container("COSMOS_USERS_CONTAINER")
+_att = cosmos_container("COSMOS_ATTENDANCE_CONTAINER")
+
+# Optional counter document behind usersSummary (container partitioned by /id)
+_user_summary = None
+if os.getenv("COSMOS_SUMMARY_CONTAINER"):
+    from user_summary import UserSummary
+    _user_summary = UserSummary(cosmos_container("COSMOS_SUMMARY_CONTAINER"), _users)
+
+# classLabel -> user document; the roster rarely changes during a session
+_user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "600"))
+)
 
+@stage("upsert")
 def upsert_user(user):
-    """Insert or update user in Cosmos DB"""
+    """Insert or update user in Cosmos DB, keeping the summary counters current"""
+    previous = None
+    if _user_summary is not None:
+        found = list(_users.query_items(
+            query="SELECT c.id, c.section FROM c WHERE c.id = @id",
+            parameters=[{"name": "@id", "value": user["id"]}],
+            enable_cross_partition_query=True
+        ))
+        previous = found[0] if found else None
     _users.upsert_item(user)
+    # Drop the old label too, in case this enrollment moved the user to a new tag
+    _user_cache.invalidate_if(lambda u: u.get("userId") == user.get("userId"))
+    _user_cache.invalidate(user.get("classLabel"))
+    if _user_summary is not None:
+        try:
+            _user_summary.record_enrollment(
+                user.get("section"),
+                previous.get("section") if previous else None,
+                is_new=previous is None
+            )
+        except Exception as e:
+            # The periodic reconcile corrects a missed update
+            logging.error(f"User summary update failed: {str(e)}")
 
+@stage("user_lookup")
 def get_user_by_tag(tag_name: str):
-    """Get user by Custom Vision tag name"""
+    """Get user by Custom Vision tag name (cached)"""
+    user = _user_cache.get(tag_name)
+    if user is not None:
+        return user
     q = "SELECT * FROM c WHERE c.classLabel = @t"
     items = list(_users.query_items(
         query=q, 
         parameters=[{"name": "@t", "value": tag_name}], 
         enable_cross_partition_query=True
     ))
-    return items[0] if items else None
+    if not items:
+        return None
+    _user_cache.put(tag_name, items[0])
+    return items[0]
+
+def warm_user_cache() -> int:
+    """Preload the classLabel cache with the same query listUsers runs."""
+    count = 0
+    for user in _users.query_items(query="SELECT * FROM c", enable_cross_partition_query=True):
+        if user.get("classLabel"):
+            _user_cache.put(user["classLabel"], user)
+            count += 1
+    logging.info(f"User cache warmed with {count} users")
+    return count
+
+if os.getenv("USER_CACHE_WARM", "").lower() in ("1", "true", "yes"):
+    _io_pool.submit(warm_user_cache)
 
+# Optional write-behind for attendance inserts (ATTENDANCE_WRITE_MODE=write-behind)
+_att_writer = None
+if os.getenv("ATTENDANCE_WRITE_MODE", "sync").lower() == "write-behind":
+    from write_behind import AttendanceWriteBehind
+    _att_writer = AttendanceWriteBehind.from_env(_att)
+    atexit.register(_att_writer.close)
+
+def _spool_attendance(row):
+    """
+    Write-behind path of add_attendance(): the row once spooled, the mark that
+    already holds this user's slot for the day, or None to write synchronously.
+    The slot is claimed in the daily mark index before the row is acknowledged,
+    so two concurrent frames of one student can't both be answered as new marks.
+    """
+    if _att_writer is None:
+        return None
+    existing = _daily_marks.claim(row, date.fromisoformat(row["localDate"]))
+    if existing is not None:
+        return existing
+    if _att_writer.submit(row):
+        # Spooled locally; the background flusher writes it to Cosmos
+        return row
+    return None
+
+@stage("cosmos_write")
 def add_attendance(row):
-    """Add attendance record to Cosmos DB"""
-    _att.create_item(row)
+    """
+    Add attendance record to Cosmos DB.
+    Returns the stored record: `row`, or the existing document when a record
+    with the same (deterministic) id was already written, e.g. by another instance.
+    In write-behind mode the record is spooled and `row` is returned right away.
+    """
+    from azure.cosmos import exceptions
+
+    spooled = _spool_attendance(row)
+    if spooled is not None:
+        return spooled
+    try:
+        _att.create_item(row)
+        return row
+    except exceptions.CosmosResourceExistsError:
+        try:
+            existing = _att.read_item(item=row["id"], partition_key=row["localDate"])
+        except exceptions.CosmosResourceNotFoundError:
+            return row
+        return {k: v for k, v in existing.items() if not k.startswith("_")}
+
+def _day_query(local_date: str, newest_first: bool = True) -> dict:
+    """
+    query_items() arguments for one local day's rows (YYYY-MM-DD), for the sync
+    and aio clients alike. The container is partitioned by /localDate, so this
+    is a single-partition query.
+    Rows are ordered by the check-in `timestamp`, not `_ts`: migrated records
+    carry the migration time in `_ts`.
+    """
+    return {
+        "query": f"""
+            SELECT c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath,
+                   c.device, c.section, c._ts
+            FROM c
+            WHERE c.localDate = @d
+            ORDER BY c.timestamp {"DESC" if newest_first else "ASC"}
+        """,
+        "parameters": [{"name": "@d", "value": local_date}],
+        "partition_key": local_date,
+    }
+
+def _query_day(local_date: str, newest_first: bool = True, page_size: int = None):
+    """Attendance rows for one local day (YYYY-MM-DD)."""
+    return _att.query_items(**_day_query(local_date, newest_first), max_item_count=page_size)
+
+def _load_day_marks(day):
+    """A local day's attendance records, oldest first (feeds the daily mark index)."""
+    return _query_day(f"{day:%Y-%m-%d}", newest_first=False)
+
+# userIds already marked present today (rebuilt from Cosmos on cold start / new day)
+_daily_marks = DailyMarkIndex(_load_day_marks)
+
+def _load_recent():
+    """Latest 50 check-ins across partitions; seeds the recent feed once per instance."""
+    q = """
+    SELECT TOP 50 c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath, c._ts
+    FROM c
+    ORDER BY c.timestamp DESC
+    """
+    return _att.query_items(q, enable_cross_partition_query=True)
+
+# Recent check-ins kept in memory so dashboards don't query Cosmos per refresh;
+# check-ins handled by other instances arrive through the attendance change feed
+_feed_follower = None
+if os.getenv("RECENT_FEED_CHANGE_FEED", "true").lower() in ("1", "true", "yes"):
+    _feed_follower = ChangeFeedFollower(_att, lambda: datetime.now(IST).strftime("%Y-%m-%d"))
+_recent_feed = RecentFeed(_load_recent, capacity=int(os.getenv("RECENT_FEED_SIZE", "200")),
+                          follower=_feed_follower,
+                          poll_interval=float(os.getenv("RECENT_FEED_POLL_SECONDS", "2")))
+RECENT_FEED_MAX_WAIT = float(os.getenv("RECENT_FEED_MAX_WAIT", "25"))
 
 def _parse_date_flexible(date_str: str):
     """Accept 'YYYY-MM-DD' or 'DD-MM-YYYY'."""
@@ -79,137 +350,142 @@ def _parse_date_flexible(date_str: str):
         pass
     raise ValueError("Unrecognized date format")
 
+def _day_window_utc(day_local: datetime):
+    """[start, end) of a local calendar day, as UTC datetimes."""
+    start_local = day_local.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_local = start_local + timedelta(days=1)
+    return start_local.astimezone(timezone.utc), end_local.astimezone(timezone.utc)
+
+def _requested_day(date_str):
+    """
+    (IST midnight, "YYYY-MM-DD") for getAttendance's ?date= (YYYY-MM-DD or
+    DD-MM-YYYY), today when it is empty; ValueError when it can't be parsed.
+    """
+    if date_str:
+        y, m, d = _parse_date_flexible(date_str)
+        day_local = datetime(y, m, d, tzinfo=IST)
+    else:
+        now_local = datetime.now(IST)
+        day_local = datetime(now_local.year, now_local.month, now_local.day, tzinfo=IST)
+    return day_local, f"{day_local:%Y-%m-%d}"
+
+def _attendance_payload(day_local: datetime, date_str: str, items: list) -> dict:
+    """getAttendance response body: the day's rows and its window in UTC."""
+    start_utc, end_utc = _day_window_utc(day_local)
+    return {
+        "ok": True,
+        "range": {
+            "tz": "Asia/Kolkata",
+            "localDate": date_str,
+            "utcFrom": start_utc.isoformat().replace('+00:00', 'Z'),
+            "utcTo": end_utc.isoformat().replace('+00:00', 'Z')
+        },
+        "count": len(items),
+        "items": items
+    }
+
+ENROLL_FIELDS_ERROR = "name, roll, userId, classLabel and an image (base64Image, JPEG body or multipart 'image') required"
+
+def _enroll_complete(fields: dict, data) -> bool:
+    return all([fields.get('name'), fields.get('roll'), fields.get('userId'), fields.get('classLabel'), data])
+
+def _user_doc(fields: dict, blob_path: str) -> dict:
+    """The users document uploadAndEnroll upserts."""
+    user_doc = {
+        "id": fields['userId'],
+        "userId": fields['userId'],
+        "name": fields['name'],
+        "roll": fields['roll'],
+        "classLabel": fields['classLabel'],
+        "createdAt": datetime.utcnow().isoformat() + "Z",
+        "lastEnrollBlob": blob_path
+    }
+    if fields.get('section'):
+        user_doc["section"] = fields.get('section')
+    return user_doc
+
+# Custom Vision client (keep-alive pool, retries, circuit breaker)
+_cv = custom_vision
+
+# Recognition engine: "customvision" (default) or "local" (on-CPU embedding gallery)
+RECOGNIZER_ENGINE = os.getenv("RECOGNIZER_ENGINE", "customvision").lower()
+_recognizer = None
+if RECOGNIZER_ENGINE == "local":
+    from recognizer import LocalEmbeddingRecognizer
+    _recognizer = LocalEmbeddingRecognizer.from_env()
+
 # Custom Vision Prediction
-def predict_image(b64: str):
-    """Call Azure Custom Vision to predict image"""
-    endpoint = os.environ["CV_PREDICTION_ENDPOINT"].rstrip("/")
-    project = os.environ["CV_PROJECT_ID"]
-    published = os.environ["CV_PUBLISHED_NAME"]
-    key = os.environ["CV_PREDICTION_KEY"]
-    
-    # Use the /image endpoint (stores prediction results)
-    url = f"{endpoint}/customvision/v3.0/Prediction/{project}/classify/iterations/{published}/image"
-    headers = {"Prediction-Key": key, "Content-Type": "application/octet-stream"}
-    data = base64.b64decode(b64)
-    
-    logging.info(f"Custom Vision URL: {url}")
+@stage("predict")
+def predict_image(image):
+    """Call Azure Custom Vision to predict image (raw bytes or base64)"""
+    import requests
+
+    data = image_bytes(image)
+    if _recognizer is not None:
+        return _recognizer.predict(data)
     
     try:
-        r = requests.post(url, headers=headers, data=data, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return _cv.predict(data)
     except requests.exceptions.HTTPError as e:
         logging.error(f"HTTP Error {e.response.status_code}: {e.response.text}")
         raise Exception(f"Custom Vision API Error: {e.response.status_code} - {e.response.text}")
 
 
-def _normalize_training_endpoint(ep: str) -> str:
-    """
-    Ensure endpoint is just the resource root (scheme+host), e.g.
-    https://<resource>.cognitiveservices.azure.com
-    (Strips any accidental /customvision/... suffix.)
-    """
-    ep = (ep or "").strip()
-    if not ep:
-        return ep
-    u = urlparse(ep)
-    if u.scheme and u.netloc:
-        return f"{u.scheme}://{u.netloc}"
-    return ep.split("/customvision", 1)[0].rstrip("/")
-
-
-def add_image_to_training(b64: str, tag_name: str):
+@stage("train")
+def add_image_to_training(image, tag_name: str):
     """
     Adds a single image to the Azure Custom Vision Training project under the given tag.
-    - Creates the tag if missing (POST /tags?name=...)
+    - Resolves the tag id from a cached tag map; creates the tag if missing (POST /tags?name=...)
     - Uploads the image; prefers single-image bytes endpoint, falls back to multipart if needed.
+    With RECOGNIZER_ENGINE=local the image is enrolled in the local gallery instead.
     Returns a dict suitable for surfacing in your API response.
     """
-    training_endpoint_raw = os.environ.get("CV_TRAINING_ENDPOINT", "")
-    training_endpoint = _normalize_training_endpoint(training_endpoint_raw)
-    project_id = os.environ.get("CV_PROJECT_ID", "")
-    training_key = os.environ.get("CV_TRAINING_KEY", "")
-
-    # Headers
-    headers_json  = {"Training-Key": training_key, "Content-Type": "application/json"}
-    headers_octet = {"Training-Key": training_key, "Content-Type": "application/octet-stream"}
-    headers_plain = {"Training-Key": training_key}  # no content-type for some POSTs
-
-    # Helper: strip data URI prefix if present
-    def _strip_data_uri(s: str) -> str:
-        if isinstance(s, str) and s.startswith("data:"):
-            parts = s.split(",", 1)
-            return parts[1] if len(parts) == 2 else s
-        return s
+    if _recognizer is not None:
+        return _recognizer.enroll(image_bytes(image), tag_name)
+
+    import requests
+    from cv_client import TagCreateError
 
     # Diagnostics scaffold
     diag = {
-        "endpoint_raw": training_endpoint_raw,
-        "endpoint_normalized": training_endpoint,
-        "project_id": project_id,
+        "endpoint_raw": _cv.training_endpoint_raw,
+        "endpoint_normalized": _cv.training_endpoint,
+        "project_id": _cv.project_id,
         "urls": {}
     }
 
     try:
-        # --- 1) List existing tags (verifies endpoint/key/project) ---
-        url_tags = f"{training_endpoint}/customvision/v3.3/training/projects/{project_id}/tags"
-        diag["urls"]["list_tags"] = url_tags
-        logging.info(f"[CV] GET {url_tags}")
-        r = requests.get(url_tags, headers=headers_json, timeout=15)
-        r.raise_for_status()
-        tags = r.json()
-
-        # Resolve tag; create if absent (query param ?name=)
-        tag_id = next((t.get("id") for t in tags if t.get("name") == tag_name), None)
-        if not tag_id:
-            create_url = url_tags
-            diag["urls"]["create_tag"] = f"{create_url}?name={tag_name}"
-            logging.info(f"[CV] POST {create_url}?name={tag_name}")
-            r = requests.post(create_url, headers=headers_plain, params={"name": tag_name}, timeout=20)
-            r.raise_for_status()
-            tag_id = r.json().get("id")
-            if not tag_id:
-                return {
-                    "ok": False,
-                    "step": "create_tag",
-                    "error": f"Create tag succeeded but no 'id' in response: {r.text}",
-                    **diag
-                }
-
-        # Prepare bytes
-        raw_b64 = _strip_data_uri(b64)
-        data = base64.b64decode(raw_b64)
+        # --- 1) Resolve tag from the process-wide tag map; create if absent ---
+        diag["urls"]["tags"] = _cv.tags_url
+        try:
+            tag_id, created = _cv.resolve_tag_id(tag_name)
+        except TagCreateError as e:
+            return {"ok": False, "step": "create_tag", "error": str(e), **diag}
+        if created:
+            logging.info(f"[CV] Created tag {tag_name} ({tag_id})")
+
+        # Prepare bytes (no-op when the caller already decoded)
+        data = image_bytes(image)
 
         # --- 2) Try single-image bytes endpoint first (/images/image, octet-stream) ---
-        url_image_single = f"{training_endpoint}/customvision/v3.3/training/projects/{project_id}/images/image"
-        diag["urls"]["upload_image_single"] = f"{url_image_single}?tagIds={tag_id}"
-        logging.info(f"[CV] POST {url_image_single}?tagIds={tag_id} (octet-stream single)")
-
-        r = requests.post(
-            url_image_single,
-            headers=headers_octet,
-            params={"tagIds": tag_id},
-            data=data,
-            timeout=60
-        )
+        diag["urls"]["upload_image_single"] = f"{_cv.image_single_url}?tagIds={tag_id}"
+        logging.info(f"[CV] POST {_cv.image_single_url}?tagIds={tag_id} (octet-stream single)")
+        r = _cv.upload_image(data, tag_id)
 
         # If the environment says 404 for this route, fall back to multipart
         if r.status_code == 404:
             # --- 3) Fallback: multipart to /images ---
-            url_image_multipart = f"{training_endpoint}/customvision/v3.3/training/projects/{project_id}/images"
-            diag["urls"]["upload_image_multipart"] = f"{url_image_multipart}?tagIds={tag_id}"
-            logging.info(f"[CV] POST {url_image_multipart}?tagIds={tag_id} (multipart fallback)")
+            diag["urls"]["upload_image_multipart"] = f"{_cv.images_url}?tagIds={tag_id}"
+            logging.info(f"[CV] POST {_cv.images_url}?tagIds={tag_id} (multipart fallback)")
+            r = _cv.upload_image_multipart(data, tag_id)
 
-            files = {
-                "imageData": ("upload.jpg", data, "application/octet-stream")
-            }
-            r = requests.post(
-                url_image_multipart,
-                headers={"Training-Key": training_key},
-                params={"tagIds": tag_id},
-                files=files,
-                timeout=60
-            )
+        # A cached tagId the project no longer knows (tag deleted in the portal):
+        # refresh the tag map once and retry the upload with the current id
+        if r.status_code == 400 and not created and "tag" in r.text.lower():
+            _cv.forget_tag(tag_name)
+            _cv.refresh_tags()
+            tag_id, created = _cv.resolve_tag_id(tag_name)
+            r = _cv.upload_image(data, tag_id)
 
         # Now enforce success
         if not r.ok:
@@ -248,7 +524,8 @@ def add_image_to_training(b64: str, tag_name: str):
 
 # ==================== ENDPOINTS ====================
 
-@app.route(route="uploadAndEnroll", methods=["POST", "OPTIONS"])
+@_sync_route(route="uploadAndEnroll", methods=["POST", "OPTIONS"])
+@_timed("uploadAndEnroll")
 def uploadAndEnroll(req: func.HttpRequest) -> func.HttpResponse:
     """Endpoint to upload and enroll a new user"""
     # Handle CORS preflight
@@ -258,52 +535,31 @@ def uploadAndEnroll(req: func.HttpRequest) -> func.HttpResponse:
     
     logging.info('uploadAndEnroll function triggered')
 
-    # Helper: strip possible data URI prefix
-    def _strip_data_uri(s: str) -> str:
-        if isinstance(s, str) and s.startswith("data:"):
-            parts = s.split(",", 1)
-            return parts[1] if len(parts) == 2 else s
-        return s
-
     try:
-        req_body = req.get_json()
-        name = req_body.get('name')
-        roll = req_body.get('roll')
-        userId = req_body.get('userId')
-        b64 = req_body.get('base64Image')
-        tag = req_body.get('classLabel')
-        
-        if not all([name, roll, userId, b64, tag]):
+        req_body, data = _read_image_request(req)
+        if not _enroll_complete(req_body, data):
             response = func.HttpResponse(
-                json.dumps({"error": "name, roll, userId, classLabel, base64Image required"}),
+                json.dumps({"error": ENROLL_FIELDS_ERROR}),
                 status_code=400,
                 mimetype="application/json"
             )
             return add_cors_headers(response)
+        userId, tag = req_body['userId'], req_body['classLabel']
         
-        # Normalize base64 (handles data URI)
-        raw_b64 = _strip_data_uri(b64)
-        
-        blob_path = save_base64_jpeg(f"enroll/{userId}", raw_b64)
+        # Decoded and normalized once; blob and training share the same bytes
+        data, _, original = _prepare_image(data)
+        blob_path = save_base64_jpeg(f"enroll/{userId}", data, original)
         
         # Add to Custom Vision training set and capture status for the client
         cv_status = None
         try:
-            cv_status = add_image_to_training(raw_b64, tag)
+            cv_status = add_image_to_training(data, tag)
             logging.info(f"Image added to Custom Vision training for tag: {tag}")
         except Exception as cv_error:
             logging.error(f"Failed to add to Custom Vision: {str(cv_error)}")
             cv_status = {"error": str(cv_error)}
         
-        user_doc = {
-            "id": userId,
-            "userId": userId,
-            "name": name,
-            "roll": roll,
-            "classLabel": tag,
-            "createdAt": datetime.utcnow().isoformat() + "Z",
-            "lastEnrollBlob": blob_path
-        }
+        user_doc = _user_doc(req_body, blob_path)
         upsert_user(user_doc)
         
         # Return full context so frontend knows if training upload actually succeeded
@@ -323,80 +579,216 @@ def uploadAndEnroll(req: func.HttpRequest) -> func.HttpResponse:
         return add_cors_headers(response)
 
 
-@app.route(route="markAttendance", methods=["POST", "OPTIONS"])
-def mark_attendance(req: func.HttpRequest) -> func.HttpResponse:
-    """Endpoint to mark attendance using face recognition"""
+@app.route(route="uploadAndEnrollBatch", methods=["POST", "OPTIONS"])
+@_timed("uploadAndEnrollBatch")
+def uploadAndEnrollBatch(req: func.HttpRequest) -> func.HttpResponse:
+    """Endpoint to enroll many users, each with one or more images, in one request"""
     # Handle CORS preflight
     if req.method == "OPTIONS":
         response = func.HttpResponse(status_code=200)
         return add_cors_headers(response)
     
-    logging.info("Running markAttendance function")
+    logging.info('uploadAndEnrollBatch function triggered')
+
+    from enrollment import enroll_batch, parse_batch
 
     try:
-        body = req.get_json()
-        b64 = body.get("base64Image")
-        if not b64:
+        try:
+            students, invalid = parse_batch(req.get_json())
+        except ValueError as e:
             response = func.HttpResponse(
-                json.dumps({"error": "base64Image required"}),
+                json.dumps({"error": str(e)}),
                 status_code=400,
                 mimetype="application/json"
             )
             return add_cors_headers(response)
 
-        blob_path = save_base64_jpeg("mark", b64)
-        result = predict_image(b64)
-        preds = result.get("predictions", [])
-        
-        if not preds:
-            response = func.HttpResponse(
-                json.dumps({"ok": False, "reason": "no-predictions"}),
-                status_code=200,
-                mimetype="application/json"
-            )
-            return add_cors_headers(response)
+        results = enroll_batch(students, save_base64_jpeg, upsert_user, _cv, _enroll_pool,
+                               recognizer=_recognizer, prepare=_prepare_image)
+        results = sorted(results + invalid, key=lambda r: r["index"])
+        enrolled = sum(1 for r in results if r["ok"])
+        logging.info(f"uploadAndEnrollBatch enrolled {enrolled}/{len(results)} students")
 
-        top = max(preds, key=lambda p: p["probability"])
-        thr = CONF_THRESHOLD
-
-        if top["probability"] >= thr:
-            user = get_user_by_tag(top["tagName"])
-            if not user:
-                response = func.HttpResponse(
-                    json.dumps({"ok": False, "reason": "unknown-tag"}),
-                    status_code=200,
-                    mimetype="application/json"
-                )
-                return add_cors_headers(response)
-
-            att = {
-                "id": f"att-{uuid.uuid4()}",
-                "userId": user["userId"],
-                "name": user["name"],
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "confidence": round(top["probability"], 4),
-                "imageBlobPath": blob_path,
-                "device": "web",
-                "status": "present"
-            }
-            add_attendance(att)
-            response = func.HttpResponse(
-                json.dumps({"ok": True, **att}),
-                status_code=200,
-                mimetype="application/json"
-            )
-            return add_cors_headers(response)
-        else:
+        response = func.HttpResponse(
+            json.dumps({
+                "ok": enrolled == len(results),
+                "count": len(results),
+                "enrolled": enrolled,
+                "results": results
+            }),
+            status_code=200,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+    except Exception as e:
+        logging.error(f"Error in uploadAndEnrollBatch: {str(e)}")
+        response = func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+
+
+# Brightness/contrast/blur checks that turn away unusable frames before blob or prediction
+_quality_gate = FrameQualityGate.from_env()
+
+# Recent markAttendance rejections per device, keyed by frame dHash (retry storms at the door)
+_frame_cache = FrameCache(
+    ttl=float(os.getenv("FRAME_CACHE_TTL_SECONDS", "15")),
+    max_distance=int(os.getenv("FRAME_CACHE_MAX_DISTANCE", "2")),
+    per_device=int(os.getenv("FRAME_CACHE_PER_DEVICE", "8")),
+    max_devices=int(os.getenv("FRAME_CACHE_MAX_DEVICES", "1024")),
+    crop=float(os.getenv("FRAME_CACHE_CROP", "0.5"))
+)
+
+def _device_id(fields: dict, headers) -> str:
+    """Kiosk/device identifier: X-Device-Id header, then a deviceId field, else 'web'."""
+    return headers.get("X-Device-Id") or fields.get("deviceId") or "web"
+
+def _mark_request(req: func.HttpRequest):
+    """(image data or None, device id) of a markAttendance request."""
+    fields, data = _read_image_request(req)
+    return data, _device_id(fields, req.headers)
+
+def _frame_hash(frame):
+    """dHash of the frame, or None when the cache is off or the image can't be decoded."""
+    if not _frame_cache.enabled:
+        return None
+    try:
+        return _frame_cache.hash(frame)
+    except Exception as e:
+        logging.warning(f"Frame hash failed: {str(e)}")
+        return None
+
+def _screen_frame(data, device: str):
+    """
+    Pixel stages that run before any I/O: normalize, quality gate, frame cache.
+    Returns (data, original, frame_hash, payload); a payload means the frame is
+    already answered (bad frame, or the rejection of a near-identical recent frame).
+    """
+    data, frame, original = _prepare_image(data)
+
+    # Covered lens, dark room or motion blur: answer without blob or prediction
+    with stage("quality"):
+        quality = _quality_gate.check(frame if frame is not None else data)
+    if quality is not None:
+        logging.info(f"markAttendance bad frame from {device}: {quality}")
+        return data, original, None, {"ok": False, "reason": "bad-frame", "quality": quality}
+
+    # Near-identical retry from the same device: reuse the earlier rejection
+    with stage("frame_cache"):
+        frame_hash = _frame_hash(frame if frame is not None else data)
+        cached = _frame_cache.lookup(device, frame_hash) if frame_hash is not None else None
+    if cached is not None:
+        return data, original, frame_hash, {**cached, "cached": True}
+    return data, original, frame_hash, None
+
+def _remember_outcome(device: str, frame_hash, payload: dict):
+    """Cache a fresh decision for near-identical retries (rejections only; see FrameCache.store)."""
+    if frame_hash is not None:
+        _frame_cache.store(device, frame_hash, payload)
+
+def _top_match(result: dict):
+    """(top prediction, None) when it clears CONF_THRESHOLD, else (None, rejection payload)."""
+    preds = result.get("predictions", [])
+    if not preds:
+        return None, {"ok": False, "reason": "no-predictions"}
+    top = max(preds, key=lambda p: p["probability"])
+    if top["probability"] < CONF_THRESHOLD:
+        return None, {"ok": False, "reason": "low-confidence", "confidence": top["probability"]}
+    return top, None
+
+def _attendance_row(user: dict, top: dict, device: str, local_date, blob_path) -> dict:
+    att = {
+        "id": attendance_id(user["userId"], local_date),
+        "userId": user["userId"],
+        "name": user["name"],
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "confidence": round(top["probability"], 4),
+        "imageBlobPath": blob_path,
+        "device": device,
+        "status": "present",
+        "localDate": f"{local_date:%Y-%m-%d}"
+    }
+    if user.get("section"):
+        att["section"] = user["section"]
+    return att
+
+def _marked_payload(att: dict, stored: dict, local_date, archive_error) -> dict:
+    """Record a written mark in the in-memory views and build the response payload."""
+    _daily_marks.add(stored, local_date)
+    if stored is not att:
+        # Lost a race with a concurrent mark for the same user and day
+        return {"ok": True, **stored, "alreadyMarked": True}
+    _recent_feed.append(att)
+    payload = {"ok": True, **att}
+    if archive_error:
+        # Recognition still counts; surface the archive failure alongside it
+        payload["archiveError"] = archive_error
+    return payload
+
+def _recognize_and_record(data, device: str, original=None) -> dict:
+    """
+    Run the markAttendance decision for one frame and return the response payload.
+    The frame is archived only once the decision is known: repeat taps by a
+    student already marked today return before any blob upload, and
+    rejections are archived in the background (ARCHIVE_REJECTED).
+    """
+    top, rejected = _top_match(predict_image(data))
+    if rejected:
+        _archive_rejected(data, original)
+        return rejected
+
+    user = get_user_by_tag(top["tagName"])
+    if not user:
+        _archive_rejected(data, original)
+        return {"ok": False, "reason": "unknown-tag"}
+
+    # Already marked today: return the original record, no upload and no new write
+    local_date = datetime.now(IST).date()
+    with stage("mark_index"):
+        existing = _daily_marks.get(user["userId"], local_date)
+    if existing:
+        return {"ok": True, **existing, "alreadyMarked": True}
+
+    blob_path, archive_error = _archive_outcome(data, original)
+    att = _attendance_row(user, top, device, local_date, blob_path)
+    return _marked_payload(att, add_attendance(att), local_date, archive_error)
+
+
+@_sync_route(route="markAttendance", methods=["POST", "OPTIONS"])
+@_timed("markAttendance")
+def mark_attendance(req: func.HttpRequest) -> func.HttpResponse:
+    """Endpoint to mark attendance using face recognition"""
+    # Handle CORS preflight
+    if req.method == "OPTIONS":
+        response = func.HttpResponse(status_code=200)
+        return add_cors_headers(response)
+    
+    logging.info("Running markAttendance function")
+
+    try:
+        data, device = _mark_request(req)
+        if not data:
             response = func.HttpResponse(
-                json.dumps({
-                    "ok": False, 
-                    "reason": "low-confidence", 
-                    "confidence": top["probability"]
-                }),
-                status_code=200,
+                json.dumps({"error": "base64Image (or a JPEG body) required"}),
+                status_code=400,
                 mimetype="application/json"
             )
             return add_cors_headers(response)
+
+        data, original, frame_hash, payload = _screen_frame(data, device)
+        if payload is None:
+            payload = _recognize_and_record(data, device, original)
+            _remember_outcome(device, frame_hash, payload)
+
+        response = func.HttpResponse(
+            json.dumps(payload),
+            status_code=200,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
     except Exception as e:
         logging.error(f"Error in markAttendance: {str(e)}")
         response = func.HttpResponse(
@@ -407,7 +799,8 @@ def mark_attendance(req: func.HttpRequest) -> func.HttpResponse:
         return add_cors_headers(response)
 
 
-@app.route(route="getAttendance", methods=["GET", "OPTIONS"])
+@_sync_route(route="getAttendance", methods=["GET", "OPTIONS"])
+@_timed("getAttendance")
 def getAttendance(req: func.HttpRequest) -> func.HttpResponse:
     """Endpoint to get attendance records for a specific date"""
     # Handle CORS preflight
@@ -418,84 +811,93 @@ def getAttendance(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('getAttendance function triggered')
 
     try:
-        date_str = req.params.get('date')
-        if date_str:
-            try:
-                y, m, d = _parse_date_flexible(date_str)
-                day_local = datetime(y, m, d, tzinfo=IST)
-                date_str = f"{y:04d}-{m:02d}-{d:02d}"
-            except ValueError:
-                logging.error(f"getAttendance: bad date '{date_str}'")
-                response = func.HttpResponse(
-                    json.dumps({"error": "Invalid date; use YYYY-MM-DD or DD-MM-YYYY"}),
-                    status_code=400,
-                    mimetype="application/json"
-                )
-                return add_cors_headers(response)
-        else:
-            now_local = datetime.now(IST)
-            day_local = datetime(now_local.year, now_local.month, now_local.day, tzinfo=IST)
-            date_str = f"{day_local.year:04d}-{day_local.month:02d}-{day_local.day:02d}"
+        try:
+            day_local, date_str = _requested_day(req.params.get('date'))
+        except ValueError:
+            logging.error(f"getAttendance: bad date '{req.params.get('date')}'")
+            response = func.HttpResponse(
+                json.dumps({"error": "Invalid date; use YYYY-MM-DD or DD-MM-YYYY"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+            return add_cors_headers(response)
 
-        # Compute the day window in UTC
-        start_local = day_local.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_local = start_local + timedelta(days=1)
-        start_utc = start_local.astimezone(timezone.utc)
-        end_utc = end_local.astimezone(timezone.utc)
+        logging.info(f"getAttendance {date_str} IST -> partition localDate={date_str}")
 
-        # Query by _ts (Cosmos system timestamp)
-        start_epoch = int(start_utc.timestamp())
-        end_epoch = int(end_utc.timestamp())
+        # One single-partition query; every record carries its IST localDate
+        with stage("query"):
+            items = list(_query_day(date_str))
 
-        logging.info(f"getAttendance {date_str} IST -> UTC [{start_utc} .. {end_utc}) -> _ts range [{start_epoch}..{end_epoch})")
+        response = func.HttpResponse(
+            json.dumps(_attendance_payload(day_local, date_str, items)),
+            status_code=200,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+    except Exception as e:
+        logging.error(f"Error in getAttendance: {str(e)}")
+        response = func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
 
-        q_ts = """
-            SELECT c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath, c._ts
-            FROM c
-            WHERE c._ts >= @from AND c._ts < @to
-            ORDER BY c._ts DESC
-        """
-        items = list(_att.query_items(
-            query=q_ts,
-            parameters=[{"name": "@from", "value": start_epoch},
-                        {"name": "@to", "value": end_epoch}],
-            enable_cross_partition_query=True
-        ))
 
-        # Fallback to ISO string if nothing found
-        if not items:
-            start_iso = start_utc.isoformat().replace('+00:00', 'Z')
-            end_iso = end_utc.isoformat().replace('+00:00', 'Z')
-            q_iso = """
-                SELECT * FROM c
-                WHERE c.timestamp >= @from AND c.timestamp < @to
-                ORDER BY c.timestamp DESC
-            """
-            items = list(_att.query_items(
-                query=q_iso,
-                parameters=[{"name": "@from", "value": start_iso},
-                            {"name": "@to", "value": end_iso}],
-                enable_cross_partition_query=True
-            ))
+@app.route(route="exportAttendance", methods=["GET", "OPTIONS"])
+@_timed("exportAttendance")
+def exportAttendance(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Export attendance for a range of IST days as NDJSON or CSV.
+    - from=YYYY-MM-DD[&to=YYYY-MM-DD]&format=ndjson|csv
+    - The Functions worker buffers the whole response body, so each response carries
+      at most EXPORT_MAX_ROWS rows; when more remain, X-Continuation-Token is set and
+      the client repeats the request with &token=<value> (CSV header only on the first).
+    """
+    # Handle CORS preflight
+    if req.method == "OPTIONS":
+        response = func.HttpResponse(status_code=200)
+        return add_cors_headers(response)
+
+    logging.info('exportAttendance function triggered')
 
+    fmt = (req.params.get('format') or 'ndjson').lower()
+    token = req.params.get('token')
+    try:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        start, end = parse_range(req.params.get('from'), req.params.get('to'), _parse_date_flexible)
+        if token:
+            decode_token(token, start, end)
+    except ValueError as e:
         response = func.HttpResponse(
-            json.dumps({
-                "ok": True,
-                "range": {
-                    "tz": "Asia/Kolkata",
-                    "localDate": date_str,
-                    "utcFrom": start_utc.isoformat().replace('+00:00', 'Z'),
-                    "utcTo": end_utc.isoformat().replace('+00:00', 'Z')
-                },
-                "count": len(items),
-                "items": items
-            }),
-            status_code=200,
+            json.dumps({"error": str(e)}),
+            status_code=400,
             mimetype="application/json"
         )
         return add_cors_headers(response)
+
+    try:
+        chunks, count, resume = [], 0, None
+        if fmt == "csv" and not token:
+            chunks.append(format_rows([], fmt, header=True))
+        for rows, resume in iter_export(_query_day, start, end, token, page_size=EXPORT_PAGE_SIZE):
+            chunks.append(format_rows(rows, fmt))
+            count += len(rows)
+            if count >= EXPORT_MAX_ROWS:
+                break
+
+        logging.info(f"exportAttendance {start}..{end} {fmt}: {count} rows, more={bool(resume)}")
+        response = func.HttpResponse(
+            "".join(chunks),
+            status_code=200,
+            mimetype=EXPORT_FORMATS[fmt]
+        )
+        if resume:
+            response.headers['X-Continuation-Token'] = resume
+        return add_cors_headers(response)
     except Exception as e:
-        logging.error(f"Error in getAttendance: {str(e)}")
+        logging.error(f"Error in exportAttendance: {str(e)}")
         response = func.HttpResponse(
             json.dumps({"error": str(e)}),
             status_code=500,
@@ -505,8 +907,13 @@ def getAttendance(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @app.route(route="listUsers", methods=["GET", "OPTIONS"])
+@_timed("listUsers")
 def listUsers(req: func.HttpRequest) -> func.HttpResponse:
-    """Endpoint to list all enrolled users"""
+    """
+    Endpoint to list enrolled users, one page at a time.
+    - ?limit=&fields=name,roll&q=<name or roll prefix>&continuation=<token>
+    - Returns {ok, count, items, continuation}; continuation is null on the last page
+    """
     # Handle CORS preflight
     if req.method == "OPTIONS":
         response = func.HttpResponse(status_code=200)
@@ -515,18 +922,25 @@ def listUsers(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('listUsers function triggered')
 
     try:
-        # Query all users
-        query = "SELECT * FROM c"
-        items = list(_users.query_items(
-            query=query,
-            enable_cross_partition_query=True
-        ))
-        
+        opts = parse_user_list_params(req.params)
+    except ValueError as e:
         response = func.HttpResponse(
-            json.dumps(items),
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+
+    try:
+        with stage("query"):
+            page = query_user_page(_users, opts)
+        response = func.HttpResponse(
+            json.dumps(page),
             status_code=200,
             mimetype="application/json"
         )
+        if page["continuation"]:
+            response.headers['X-Continuation-Token'] = page["continuation"]
         return add_cors_headers(response)
     except Exception as e:
         logging.error(f"Error in listUsers: {str(e)}")
@@ -539,8 +953,9 @@ def listUsers(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @app.route(route="usersSummary", methods=["GET", "OPTIONS"])
+@_timed("usersSummary")
 def usersSummary(req: func.HttpRequest) -> func.HttpResponse:
-    """Return total user count (fast)"""
+    """Return total and per-section user counts (one point read of the summary document)"""
     # Handle CORS preflight
     if req.method == "OPTIONS":
         response = func.HttpResponse(status_code=200)
@@ -549,12 +964,17 @@ def usersSummary(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('usersSummary function triggered')
 
     try:
-        # Cosmos aggregate
-        q = "SELECT VALUE COUNT(1) FROM c"
-        total = list(_users.query_items(q, enable_cross_partition_query=True))[0]
+        if _user_summary is not None:
+            with stage("query"):
+                summary = _user_summary.read()
+        else:
+            # No summary container configured: Cosmos aggregate
+            q = "SELECT VALUE COUNT(1) FROM c"
+            with stage("query"):
+                summary = {"totalUsers": list(_users.query_items(q, enable_cross_partition_query=True))[0]}
         
         response = func.HttpResponse(
-            json.dumps({"totalUsers": total}),
+            json.dumps(summary),
             status_code=200,
             mimetype="application/json"
         )
@@ -569,7 +989,20 @@ def usersSummary(req: func.HttpRequest) -> func.HttpResponse:
         return add_cors_headers(response)
 
 
+if _user_summary is not None:
+    @app.schedule(schedule=os.getenv("USER_SUMMARY_RECONCILE_SCHEDULE", "0 30 2 * * *"),
+                  arg_name="timer", run_on_startup=False)
+    def reconcileUserSummary(timer: func.TimerRequest) -> None:
+        """Recount users nightly to correct any drift in the summary counters"""
+        try:
+            doc = _user_summary.reconcile()
+            logging.info(f"User summary reconciled: {doc['totalUsers']} users")
+        except Exception as e:
+            logging.error(f"Error in reconcileUserSummary: {str(e)}")
+
+
 @app.route(route="attendanceRecent", methods=["GET", "OPTIONS"])
+@_timed("attendanceRecent")
 def attendance_recent(req: func.HttpRequest) -> func.HttpResponse:
     """Return the latest 50 attendance items to debug the dashboard."""
     # Handle CORS preflight
@@ -580,16 +1013,12 @@ def attendance_recent(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('attendanceRecent function triggered')
 
     try:
-        # Order by _ts (system timestamp) descending; LIMIT 50
-        q = """
-        SELECT TOP 50 c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath, c._ts
-        FROM c
-        ORDER BY c._ts DESC
-        """
-        items = list(_att.query_items(q, enable_cross_partition_query=True))
+        # Served from the in-memory feed (seeded from Cosmos once per instance)
+        with stage("feed"):
+            items = _recent_feed.recent(50)
         
         response = func.HttpResponse(
-            json.dumps({"ok": True, "count": len(items), "items": items}),
+            json.dumps({"ok": True, "count": len(items), "items": items, "cursor": _recent_feed.cursor()}),
             status_code=200,
             mimetype="application/json"
         )
@@ -602,3 +1031,348 @@ def attendance_recent(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
         return add_cors_headers(response)
+
+
+@app.route(route="attendanceStream", methods=["GET", "OPTIONS"])
+@_timed("attendanceStream")
+async def attendance_stream(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Long-poll for check-ins newer than a cursor.
+    - ?cursor=<from attendanceRecent or the previous poll>&wait=<seconds>
+    - Returns {ok, cursor, reset, items} as soon as something newer arrives, or
+      with no items after `wait` (capped at RECENT_FEED_MAX_WAIT).
+    - reset=true means the cursor was unknown to this instance; items are then
+      the full buffer and replace the client's list.
+    The Functions worker buffers responses, so this is long-poll rather than SSE.
+    The handler is async in either HANDLER_MODE: a waiting dashboard parks on the
+    event loop instead of holding one of the worker's sync threads.
+    """
+    # Handle CORS preflight
+    if req.method == "OPTIONS":
+        response = func.HttpResponse(status_code=200)
+        return add_cors_headers(response)
+
+    try:
+        try:
+            wait = min(max(float(req.params.get('wait') or RECENT_FEED_MAX_WAIT), 0.0), RECENT_FEED_MAX_WAIT)
+        except ValueError:
+            wait = RECENT_FEED_MAX_WAIT
+        with stage("wait"):
+            result = await _recent_feed.wait_after_async(req.params.get('cursor'), wait)
+        response = func.HttpResponse(
+            json.dumps({"ok": True, **result}),
+            status_code=200,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+    except Exception as e:
+        logging.error(f"Error in attendanceStream: {str(e)}")
+        response = func.HttpResponse(
+            json.dumps({"ok": False, "error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+
+
+# Component counters exported next to the latency histograms, and Cosmos RU per endpoint/query
+metrics.add_exposition(charges.exposition)
+metrics.add_collector("qualityGate", _quality_gate.stats)
+metrics.add_collector("frameCache", _frame_cache.stats)
+metrics.add_collector("userCache", _user_cache.stats)
+if _archiver is not None:
+    metrics.add_collector("archiver", _archiver.stats)
+if _att_writer is not None:
+    metrics.add_collector("writeBehind", _att_writer.stats)
+
+
+@app.route(route="metrics", methods=["GET"])
+def metrics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+    """Prometheus text exposition: per-endpoint/per-stage latency summaries and component gauges"""
+    try:
+        return func.HttpResponse(
+            metrics.render(),
+            status_code=200,
+            mimetype="text/plain; version=0.0.4"
+        )
+    except Exception as e:
+        logging.error(f"Error in metrics: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+
+
+# ==================== ASYNC HANDLERS (HANDLER_MODE=async) ====================
+# markAttendance, uploadAndEnroll and getAttendance await the aio Cosmos/Blob clients
+# and a pooled aiohttp session instead of holding a worker thread for each call.
+# Pixel work (normalize, quality gate, frame hash, local recognizer) and the rare
+# sync-only paths (tag creation, multipart fallback, write-behind spool) run via
+# asyncio.to_thread. Clients are built on first use inside the worker's event loop.
+
+_container_aio = blob_container_aio
+_users_aio = cosmos_container_aio("COSMOS_USERS_CONTAINER")
+_att_aio = cosmos_container_aio("COSMOS_ATTENDANCE_CONTAINER")
+_cv_aio = custom_vision_aio
+
+async def save_base64_jpeg_async(prefix: str, image, original=None) -> str:
+    """save_base64_jpeg() on the async blob client (spooling is a local write either way)."""
+    if _archiver is not None:
+        return await asyncio.to_thread(save_base64_jpeg, prefix, image, original)
+    data = image_bytes(image)
+    name = content_blob_name(prefix, data)
+    uploads = [upload_if_absent_async(_container_aio, name, data)]
+    if original is not None:
+        uploads.append(upload_if_absent_async(_container_aio, f"original/{name}", image_bytes(original)))
+    with stage("blob"):
+        await asyncio.gather(*uploads)
+    return name
+
+async def predict_image_async(image):
+    data = image_bytes(image)
+    with stage("predict"):
+        if _recognizer is not None:
+            return await asyncio.to_thread(_recognizer.predict, data)
+        return await _cv_aio.predict(data)
+
+async def get_user_by_tag_async(tag_name: str):
+    user = _user_cache.get(tag_name)
+    if user is not None:
+        return user
+    # The aio client queries across partitions without enable_cross_partition_query
+    with stage("user_lookup"):
+        items = [u async for u in _users_aio.query_items(
+            query="SELECT * FROM c WHERE c.classLabel = @t",
+            parameters=[{"name": "@t", "value": tag_name}]
+        )]
+    if not items:
+        return None
+    _user_cache.put(tag_name, items[0])
+    return items[0]
+
+async def add_attendance_async(row):
+    """add_attendance() on the async Cosmos client; same return contract."""
+    from azure.cosmos import exceptions
+
+    with stage("cosmos_write"):
+        spooled = await asyncio.to_thread(_spool_attendance, row) if _att_writer is not None else None
+        if spooled is not None:
+            return spooled
+        try:
+            await _att_aio.create_item(row)
+            return row
+        except exceptions.CosmosResourceExistsError:
+            try:
+                existing = await _att_aio.read_item(item=row["id"], partition_key=row["localDate"])
+            except exceptions.CosmosResourceNotFoundError:
+                return row
+            return {k: v for k, v in existing.items() if not k.startswith("_")}
+
+async def add_image_to_training_async(image, tag_name: str):
+    """
+    Single-image upload on the pooled aiohttp session.
+    Needs the tag id already in the shared tag map; a first-seen tag, the
+    multipart fallback and a stale tag id go through add_image_to_training
+    in a thread (as does the local recognizer).
+    """
+    data = image_bytes(image)
+    tag_id = _cv.cached_tag_id(tag_name) if _recognizer is None else None
+    if not tag_id:
+        return await asyncio.to_thread(add_image_to_training, data, tag_name)
+
+    with stage("train"):
+        r = await _cv_aio.upload_image(data, tag_id)
+    if r.status_code == 404 or (r.status_code == 400 and "tag" in r.text.lower()):
+        return await asyncio.to_thread(add_image_to_training, data, tag_name)
+    if not r.ok:
+        return {"ok": False, "step": "upload_image", "status": r.status_code, "body": r.text}
+
+    resp = r.json()
+    return {
+        "ok": True,
+        "isBatchSuccessful": resp.get("isBatchSuccessful", True),
+        "images": resp.get("images", []),
+        "usedTag": {"id": tag_id, "name": tag_name}
+    }
+
+_rejected_archives = set()  # keeps background archive tasks referenced until they finish
+
+def _archive_rejected_async(data, original=None):
+    """_archive_rejected() as a task on the running loop."""
+    def log_failure(task):
+        _rejected_archives.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Archiving rejected frame failed: {str(task.exception())}")
+
+    if ARCHIVE_REJECTED:
+        task = asyncio.ensure_future(save_base64_jpeg_async("mark", data, original))
+        _rejected_archives.add(task)
+        task.add_done_callback(log_failure)
+
+async def _recognize_and_record_async(data, device: str, original=None) -> dict:
+    """_recognize_and_record() on the async clients; the frame is archived only once the decision is known."""
+    top, rejected = _top_match(await predict_image_async(data))
+    if rejected:
+        _archive_rejected_async(data, original)
+        return rejected
+
+    user = await get_user_by_tag_async(top["tagName"])
+    if not user:
+        _archive_rejected_async(data, original)
+        return {"ok": False, "reason": "unknown-tag"}
+
+    # The first lookup of a day loads it from Cosmos on the sync client
+    local_date = datetime.now(IST).date()
+    with stage("mark_index"):
+        existing = await asyncio.to_thread(_daily_marks.get, user["userId"], local_date)
+    if existing:
+        return {"ok": True, **existing, "alreadyMarked": True}
+
+    try:
+        blob_path, archive_error = await save_base64_jpeg_async("mark", data, original), None
+    except Exception as e:
+        logging.error(f"Archiving mark image failed: {str(e)}")
+        blob_path, archive_error = None, str(e)
+    att = _attendance_row(user, top, device, local_date, blob_path)
+    return _marked_payload(att, await add_attendance_async(att), local_date, archive_error)
+
+
+@_async_route("uploadAndEnroll", route="uploadAndEnroll", methods=["POST", "OPTIONS"])
+@_timed("uploadAndEnroll")
+async def uploadAndEnroll_async(req: func.HttpRequest) -> func.HttpResponse:
+    """Async uploadAndEnroll: blob upload and Custom Vision training run concurrently"""
+    # Handle CORS preflight
+    if req.method == "OPTIONS":
+        response = func.HttpResponse(status_code=200)
+        return add_cors_headers(response)
+
+    logging.info('uploadAndEnroll function triggered (async)')
+
+    try:
+        req_body, data = _read_image_request(req)
+        if not _enroll_complete(req_body, data):
+            response = func.HttpResponse(
+                json.dumps({"error": ENROLL_FIELDS_ERROR}),
+                status_code=400,
+                mimetype="application/json"
+            )
+            return add_cors_headers(response)
+        userId, tag = req_body['userId'], req_body['classLabel']
+
+        data, _, original = await asyncio.to_thread(_prepare_image, data)
+
+        async def train():
+            try:
+                status = await add_image_to_training_async(data, tag)
+                logging.info(f"Image added to Custom Vision training for tag: {tag}")
+                return status
+            except Exception as cv_error:
+                logging.error(f"Failed to add to Custom Vision: {str(cv_error)}")
+                return {"error": str(cv_error)}
+
+        blob_path, cv_status = await asyncio.gather(
+            save_base64_jpeg_async(f"enroll/{userId}", data, original), train())
+
+        user_doc = _user_doc(req_body, blob_path)
+        # Existence check, upsert and summary counters stay on the sync path
+        await asyncio.to_thread(upsert_user, user_doc)
+
+        response = func.HttpResponse(
+            json.dumps({"ok": True, "user": user_doc, "customVision": cv_status}),
+            status_code=200,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+    except Exception as e:
+        logging.error(f"Error in uploadAndEnroll: {str(e)}")
+        response = func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+
+
+@_async_route("mark_attendance", route="markAttendance", methods=["POST", "OPTIONS"])
+@_timed("markAttendance")
+async def mark_attendance_async(req: func.HttpRequest) -> func.HttpResponse:
+    """Async markAttendance: same decision, awaiting Blob, Custom Vision and Cosmos"""
+    # Handle CORS preflight
+    if req.method == "OPTIONS":
+        response = func.HttpResponse(status_code=200)
+        return add_cors_headers(response)
+
+    logging.info("Running markAttendance function (async)")
+
+    try:
+        data, device = _mark_request(req)
+        if not data:
+            response = func.HttpResponse(
+                json.dumps({"error": "base64Image (or a JPEG body) required"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+            return add_cors_headers(response)
+
+        data, original, frame_hash, payload = await asyncio.to_thread(_screen_frame, data, device)
+        if payload is None:
+            payload = await _recognize_and_record_async(data, device, original)
+            _remember_outcome(device, frame_hash, payload)
+
+        response = func.HttpResponse(
+            json.dumps(payload),
+            status_code=200,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+    except Exception as e:
+        logging.error(f"Error in markAttendance: {str(e)}")
+        response = func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+
+
+@_async_route("getAttendance", route="getAttendance", methods=["GET", "OPTIONS"])
+@_timed("getAttendance")
+async def getAttendance_async(req: func.HttpRequest) -> func.HttpResponse:
+    """Async getAttendance: the single-partition day query on the aio Cosmos client"""
+    # Handle CORS preflight
+    if req.method == "OPTIONS":
+        response = func.HttpResponse(status_code=200)
+        return add_cors_headers(response)
+
+    logging.info('getAttendance function triggered (async)')
+
+    try:
+        try:
+            day_local, date_str = _requested_day(req.params.get('date'))
+        except ValueError:
+            logging.error(f"getAttendance: bad date '{req.params.get('date')}'")
+            response = func.HttpResponse(
+                json.dumps({"error": "Invalid date; use YYYY-MM-DD or DD-MM-YYYY"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+            return add_cors_headers(response)
+
+        with stage("query"):
+            items = [row async for row in _att_aio.query_items(**_day_query(date_str))]
+
+        response = func.HttpResponse(
+            json.dumps(_attendance_payload(day_local, date_str, items)),
+            status_code=200,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
+    except Exception as e:
+        logging.error(f"Error in getAttendance: {str(e)}")
+        response = func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+        return add_cors_headers(response)
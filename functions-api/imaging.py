@@ -0,0 +1,125 @@
+import base64
+import io
+import logging
+import os
+
+# Content types accepted as a raw JPEG request body
+BINARY_IMAGE_TYPES = frozenset({"application/octet-stream", "image/jpeg", "image/jpg"})
+
+# Multipart field names checked for the image file, in order
+MULTIPART_IMAGE_FIELDS = ("image", "file", "base64Image")
+
+
+def strip_data_uri(s: str) -> str:
+    """Drop a "data:image/jpeg;base64," style prefix if present."""
+    if isinstance(s, str) and s.startswith("data:"):
+        parts = s.split(",", 1)
+        return parts[1] if len(parts) == 2 else s
+    return s
+
+
+def image_bytes(image):
+    """
+    Return the image as bytes, decoding only if needed.
+    Accepts raw bytes / bytearray / memoryview (returned as-is, no copy)
+    or a base64 string with an optional data URI prefix.
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return image
+    return base64.b64decode(strip_data_uri(image))
+
+
+def media_type(content_type: str) -> str:
+    """'multipart/form-data; boundary=x' -> 'multipart/form-data'"""
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def decode_grayscale(data, size=None):
+    """
+    Decode JPEG bytes (or an already decoded PIL image) into a float32
+    grayscale array (H x W, 0..255).
+    `size` is an optional (width, height) to resize to.
+    Needs numpy and Pillow; they are imported here so handlers that never
+    decode pixels do not pay for them.
+    """
+    import numpy as np
+    from PIL import Image
+
+    if isinstance(data, Image.Image):
+        img = data.convert("L")
+        if size:
+            img = img.resize(size, Image.BILINEAR)
+        return np.asarray(img, dtype=np.float32)
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("L")
+        if size:
+            img = img.resize(size, Image.BILINEAR)
+        return np.asarray(img, dtype=np.float32)
+
+
+class ImageNormalizer:
+    """
+    Shared preprocessing for frames before prediction and storage.
+    - Decodes once, applies the EXIF orientation, optionally center-crops to a
+      square covering `crop` of the shorter side (the camera UI centers the face),
+      downscales so the longer side is at most `max_side`, and re-encodes as
+      JPEG at `quality`.
+    - Frames that are already small, upright and uncropped keep their original
+      bytes (no second lossy encode).
+    - `keep_original` tells callers to also store the untouched upload.
+    normalize() returns (jpeg_bytes, decoded_image); the decoded image is reused
+    by later pixel stages (frame hash) so they don't decode again.
+    """
+
+    def __init__(self, max_side: int = 640, quality: int = 85, crop: float = 0.0,
+                 keep_original: bool = False, enabled: bool = True):
+        self.max_side = int(max_side)
+        self.quality = min(max(int(quality), 1), 95)
+        self.crop = float(crop)
+        self.keep_original = bool(keep_original)
+        self.enabled = bool(enabled) and self.max_side > 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_side=int(os.getenv("IMAGE_MAX_SIDE", "640")),
+            quality=int(os.getenv("IMAGE_JPEG_QUALITY", "85")),
+            crop=float(os.getenv("IMAGE_CENTER_CROP", "0")),
+            keep_original=os.getenv("IMAGE_KEEP_ORIGINAL", "").lower() in ("1", "true", "yes"),
+            enabled=os.getenv("IMAGE_NORMALIZE", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def normalize(self, data):
+        """(jpeg_bytes, decoded RGB image) for `data`; (data, None) if it can't be decoded."""
+        data = image_bytes(data)
+        if not self.enabled:
+            return data, None
+        from PIL import Image, ImageOps
+
+        try:
+            with Image.open(io.BytesIO(data)) as src:
+                changed = src.format != "JPEG" or src.getexif().get(0x0112, 1) != 1
+                # Let the JPEG decoder downscale by 1/2..1/8 while decoding when it can
+                full_size = src.size
+                bound = int(self.max_side / (self.crop if 0 < self.crop < 1 else 1.0))
+                src.draft("RGB", (bound, bound))
+                changed = changed or src.size != full_size
+                img = ImageOps.exif_transpose(src).convert("RGB")
+        except Exception as e:
+            logging.warning(f"Image normalize skipped, could not decode: {str(e)}")
+            return data, None
+
+        if 0 < self.crop < 1:
+            side = int(min(img.size) * self.crop)
+            left, top = (img.width - side) // 2, (img.height - side) // 2
+            img = img.crop((left, top, left + side, top + side))
+            changed = True
+        if max(img.size) > self.max_side:
+            img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            changed = True
+        if not changed:
+            return data, img
+
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=self.quality, optimize=True)
+        return out.getvalue(), img
@@ -1,206 +1,424 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context
 from flask_cors import CORS
 import logging
+import atexit
+import functools
 import json
 import os
-import base64
-import uuid
+from concurrent.futures import ThreadPoolExecutor
 # import datetime
-import requests
-from azure.storage.blob import BlobServiceClient
-from azure.cosmos import CosmosClient
 from dotenv import load_dotenv
-from urllib.parse import urlparse
-from datetime import datetime, timedelta, timezone
+from archive import content_blob_name, upload_if_absent
+from attendance_index import DailyMarkIndex, attendance_id
+from clients import blob_container, cosmos_container, custom_vision
+from cosmos_ru import charges
+from export import EXPORT_FORMATS, decode_token, format_checkpoint, format_rows, iter_export, parse_range
+from frame_cache import FrameCache
+from imaging import BINARY_IMAGE_TYPES, MULTIPART_IMAGE_FIELDS, ImageNormalizer, image_bytes, media_type
+from quality_gate import FrameQualityGate
+from recent_feed import ChangeFeedFollower, RecentFeed
+from timing import metrics, stage
+from user_cache import TTLCache
+from user_listing import parse_user_list_params, query_user_page
+from datetime import date, datetime, timedelta, timezone
 
 # Load environment variables from local.settings.json
-with open('local.settings.json', 'r') as f:
-    settings = json.load(f)
-    for key, value in settings['Values'].items():
-        os.environ[key] = value
+# (LOCAL_SETTINGS_FILE picks another file; empty skips it, e.g. for benchmarks/serve_standins.py)
+LOCAL_SETTINGS_FILE = os.getenv("LOCAL_SETTINGS_FILE", "local.settings.json")
+if LOCAL_SETTINGS_FILE:
+    with open(LOCAL_SETTINGS_FILE, 'r') as f:
+        settings = json.load(f)
+        for key, value in settings['Values'].items():
+            os.environ[key] = value
 
 # Configuration
 CONF_THRESHOLD = float(os.getenv("CONF_THRESHOLD", "0.85"))
 
+# Shared worker pool for overlapping independent I/O inside a request
+# (e.g. archiving the mark image while Custom Vision runs the prediction)
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "8"))
+_io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="io")
+
+# uploadAndEnrollBatch fans its blob writes, normalization, Custom Vision chunks and
+# upserts out on a pool of its own, so a bulk upload can't stall check-ins on _io_pool
+ENROLL_POOL_WORKERS = int(os.getenv("ENROLL_POOL_WORKERS", "4"))
+_enroll_pool = ThreadPoolExecutor(max_workers=ENROLL_POOL_WORKERS, thread_name_prefix="enroll")
+
+# exportAttendance: Cosmos page size per query round-trip
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+
 # Flask app
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Continuation-Token", "Server-Timing"])  # Enable CORS for all routes
+
+# Per-stage timings go out as a Server-Timing header and into the /api/metrics histograms
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+
+def _timed(endpoint: str):
+    """Time a Flask handler; stages recorded with stage() land under `endpoint`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def handler(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return fn(*args, **kwargs)
+            timing = metrics.begin(endpoint)
+            try:
+                response = make_response(fn(*args, **kwargs))
+            finally:
+                value = metrics.finish(timing)
+            if SERVER_TIMING:
+                response.headers['Server-Timing'] = value
+                response.headers['Timing-Allow-Origin'] = '*'
+            return response
+        return handler
+    return decorate
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
+@stage("decode")
+def _read_image_request():
+    """
+    Return (fields, image_bytes) from a JSON, raw JPEG or multipart request.
+    - application/json: fields from the body; base64Image is decoded once
+    - application/octet-stream / image/jpeg: fields from the query string; the body is the image
+    - multipart/form-data: fields from the form; the image from the 'image' file part
+    image_bytes is None when the request carries no image.
+    """
+    ctype = media_type(request.content_type)
+    if ctype in BINARY_IMAGE_TYPES:
+        return request.args.to_dict(), (request.get_data() or None)
+    if ctype == "multipart/form-data":
+        fields = request.form.to_dict()
+        part = next((request.files[f] for f in MULTIPART_IMAGE_FIELDS if f in request.files), None)
+        if part is not None:
+            return fields, (part.read() or None)
+        b64 = fields.pop("base64Image", None)
+        return fields, (image_bytes(b64) if b64 else None)
+    body = request.get_json(force=True, silent=False) or {}
+    b64 = body.get("base64Image")
+    return body, (image_bytes(b64) if b64 else None)
+
+# Azure clients are built on first use (clients.py), so cold starts and preflights
+# don't pay for SDK imports and connection setup they never need
 # Blob Storage Client
-_blob = BlobServiceClient.from_connection_string(os.environ["BLOB_CONN_STRING"])
-_container = _blob.get_container_client(os.environ["BLOB_CONTAINER"])
-
-def save_base64_jpeg(prefix: str, b64: str) -> str:
-    if isinstance(b64, str) and b64.startswith("data:"):
-        b64 = b64.split(",", 1)[1]
-    data = base64.b64decode(b64)
-    name = f"{prefix}/{datetime.utcnow().date()}/{uuid.uuid4()}.jpg"
-    _container.upload_blob(name, data, overwrite=True, content_type="image/jpeg")
+_container = blob_container
+
+# Optional spooled archival: images land on local disk and upload in the background
+_archiver = None
+if os.getenv("ARCHIVE_MODE", "sync").lower() == "spool":
+    from archive import BlobArchiver
+    _archiver = BlobArchiver.from_env(_container)
+    atexit.register(_archiver.close)
+
+# Keep images of frames that produced no mark (no-predictions, low-confidence, unknown-tag)
+ARCHIVE_REJECTED = os.getenv("ARCHIVE_REJECTED", "true").lower() in ("1", "true", "yes")
+
+@stage("blob")
+def save_base64_jpeg(prefix: str, image, original=None) -> str:
+    """
+    Save a JPEG (raw bytes, or base64 with optional data URI) to Azure Blob Storage.
+    - The blob is named <prefix>/<UTC date>/<content hash>.jpg, so an image
+      resubmitted the same day is stored once.
+    - With ARCHIVE_MODE=spool the bytes are spooled locally and uploaded in the
+      background; the returned name is final either way.
+    `original`, when given, is stored alongside under original/<same name>.
+    """
+    data = image_bytes(image)
+    name = content_blob_name(prefix, data)
+    if _archiver is not None:
+        _archiver.put(name, data)
+        if original is not None:
+            _archiver.put(f"original/{name}", image_bytes(original))
+        return name
+    upload_if_absent(_container, name, data)
+    if original is not None:
+        upload_if_absent(_container, f"original/{name}", image_bytes(original))
     return name
 
-# Cosmos DB Clients
-_cosmos = CosmosClient(os.environ["COSMOS_URI"], os.environ["COSMOS_KEY"])
-_db = _cosmos.get_database_client(os.environ["COSMOS_DB"])
-_users = _db.get_container_client(os.environ["COSMOS_USERS_CONTAINER"])
-_att = _db.get_container_client(os.environ["COSMOS_ATTENDANCE_CONTAINER"])
+# Incoming frames are oriented, downscaled and re-encoded once before prediction and storage
+_normalizer = ImageNormalizer.from_env()
 
+@stage("normalize")
+def _prepare_image(image):
+    """
+    Normalize an uploaded image.
+    Returns (jpeg, decoded, original): the bytes to predict/store, the decoded
+    image for later pixel stages (None if it couldn't be decoded) and the
+    untouched upload when IMAGE_KEEP_ORIGINAL is set and normalizing changed it.
+    """
+    raw = image_bytes(image)
+    data, decoded = _normalizer.normalize(raw)
+    original = raw if _normalizer.keep_original and data is not raw else None
+    return data, decoded, original
+
+def _archive_outcome(data, original=None):
+    """Archive a mark frame now; return (blob_path, error)."""
+    try:
+        return save_base64_jpeg("mark", data, original), None
+    except Exception as e:
+        logging.error(f"Archiving mark image failed: {str(e)}")
+        return None, str(e)
+
+def _archive_rejected(data, original=None):
+    """Archive a rejected frame on the I/O pool (ARCHIVE_REJECTED); the response doesn't wait for it."""
+    def log_failure(future):
+        if future.exception() is not None:
+            logging.error(f"Archiving rejected frame failed: {str(future.exception())}")
+
+    if ARCHIVE_REJECTED:
+        _io_pool.submit(save_base64_jpeg, "mark", data, original).add_done_callback(log_failure)
+
+# Cosmos DB Clients
+_users = cosmos_container("COSMOS_USERS_CONTAINER")
+_att = cosmos_container("COSMOS_ATTENDANCE_CONTAINER")
+
+# Optional counter document behind usersSummary (container partitioned by /id)
+_user_summary = None
+if os.getenv("COSMOS_SUMMARY_CONTAINER"):
+    from user_summary import UserSummary
+    _user_summary = UserSummary(cosmos_container("COSMOS_SUMMARY_CONTAINER"), _users)
+
+# classLabel -> user document; the roster rarely changes during a session
+_user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "600"))
+)
+
+@stage("upsert")
 def upsert_user(user):
-    """Insert or update user in Cosmos DB"""
+    """Insert or update user in Cosmos DB, keeping the summary counters current"""
+    previous = None
+    if _user_summary is not None:
+        found = list(_users.query_items(
+            query="SELECT c.id, c.section FROM c WHERE c.id = @id",
+            parameters=[{"name": "@id", "value": user["id"]}],
+            enable_cross_partition_query=True
+        ))
+        previous = found[0] if found else None
     _users.upsert_item(user)
+    # Drop the old label too, in case this enrollment moved the user to a new tag
+    _user_cache.invalidate_if(lambda u: u.get("userId") == user.get("userId"))
+    _user_cache.invalidate(user.get("classLabel"))
+    if _user_summary is not None:
+        try:
+            _user_summary.record_enrollment(
+                user.get("section"),
+                previous.get("section") if previous else None,
+                is_new=previous is None
+            )
+        except Exception as e:
+            # The periodic reconcile corrects a missed update
+            logging.error(f"User summary update failed: {str(e)}")
 
+@stage("user_lookup")
 def get_user_by_tag(tag_name: str):
-    """Get user by Custom Vision tag name"""
+    """Get user by Custom Vision tag name (cached)"""
+    user = _user_cache.get(tag_name)
+    if user is not None:
+        return user
     q = "SELECT * FROM c WHERE c.classLabel = @t"
     items = list(_users.query_items(
         query=q, 
         parameters=[{"name": "@t", "value": tag_name}], 
         enable_cross_partition_query=True
     ))
-    return items[0] if items else None
-
+    if not items:
+        return None
+    _user_cache.put(tag_name, items[0])
+    return items[0]
+
+def warm_user_cache() -> int:
+    """Preload the classLabel cache with the same query listUsers runs."""
+    count = 0
+    for user in _users.query_items(query="SELECT * FROM c", enable_cross_partition_query=True):
+        if user.get("classLabel"):
+            _user_cache.put(user["classLabel"], user)
+            count += 1
+    logging.info(f"User cache warmed with {count} users")
+    return count
+
+if os.getenv("USER_CACHE_WARM", "").lower() in ("1", "true", "yes"):
+    _io_pool.submit(warm_user_cache)
+
+# Optional write-behind for attendance inserts (ATTENDANCE_WRITE_MODE=write-behind)
+_att_writer = None
+if os.getenv("ATTENDANCE_WRITE_MODE", "sync").lower() == "write-behind":
+    from write_behind import AttendanceWriteBehind
+    _att_writer = AttendanceWriteBehind.from_env(_att)
+    atexit.register(_att_writer.close)
+
+def _spool_attendance(row):
+    """
+    Write-behind path of add_attendance(): the row once spooled, the mark that
+    already holds this user's slot for the day, or None to write synchronously.
+    The slot is claimed in the daily mark index before the row is acknowledged,
+    so two concurrent frames of one student can't both be answered as new marks.
+    """
+    if _att_writer is None:
+        return None
+    existing = _daily_marks.claim(row, date.fromisoformat(row["localDate"]))
+    if existing is not None:
+        return existing
+    if _att_writer.submit(row):
+        # Spooled locally; the background flusher writes it to Cosmos
+        return row
+    return None
+
+@stage("cosmos_write")
 def add_attendance(row):
-    """Add attendance record to Cosmos DB"""
-    _att.create_item(row)
+    """
+    Add attendance record to Cosmos DB.
+    Returns the stored record: `row`, or the existing document when a record
+    with the same (deterministic) id was already written, e.g. by another instance.
+    In write-behind mode the record is spooled and `row` is returned right away.
+    """
+    from azure.cosmos import exceptions
+
+    spooled = _spool_attendance(row)
+    if spooled is not None:
+        return spooled
+    try:
+        _att.create_item(row)
+        return row
+    except exceptions.CosmosResourceExistsError:
+        try:
+            existing = _att.read_item(item=row["id"], partition_key=row["localDate"])
+        except exceptions.CosmosResourceNotFoundError:
+            return row
+        return {k: v for k, v in existing.items() if not k.startswith("_")}
+
+def _day_query(local_date: str, newest_first: bool = True) -> dict:
+    """
+    query_items() arguments for one local day's rows (YYYY-MM-DD).
+    The container is partitioned by /localDate, so this is a single-partition query.
+    Rows are ordered by the check-in `timestamp`, not `_ts`: migrated records
+    carry the migration time in `_ts`.
+    """
+    return {
+        "query": f"""
+            SELECT c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath,
+                   c.device, c.section, c._ts
+            FROM c
+            WHERE c.localDate = @d
+            ORDER BY c.timestamp {"DESC" if newest_first else "ASC"}
+        """,
+        "parameters": [{"name": "@d", "value": local_date}],
+        "partition_key": local_date,
+    }
+
+def _query_day(local_date: str, newest_first: bool = True, page_size: int = None):
+    """Attendance rows for one local day (YYYY-MM-DD)."""
+    return _att.query_items(**_day_query(local_date, newest_first), max_item_count=page_size)
+
+def _load_day_marks(day):
+    """A local day's attendance records, oldest first (feeds the daily mark index)."""
+    return _query_day(f"{day:%Y-%m-%d}", newest_first=False)
+
+# userIds already marked present today (rebuilt from Cosmos on cold start / new day)
+_daily_marks = DailyMarkIndex(_load_day_marks)
+
+def _load_recent():
+    """Latest 50 check-ins across partitions; seeds the recent feed once per instance."""
+    q = """
+    SELECT TOP 50 c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath, c._ts
+    FROM c
+    ORDER BY c.timestamp DESC
+    """
+    return _att.query_items(q, enable_cross_partition_query=True)
+
+# Recent check-ins kept in memory so dashboards don't query Cosmos per refresh;
+# check-ins written by other processes arrive through the attendance change feed
+_feed_follower = None
+if os.getenv("RECENT_FEED_CHANGE_FEED", "true").lower() in ("1", "true", "yes"):
+    _feed_follower = ChangeFeedFollower(_att, lambda: datetime.now(IST).strftime("%Y-%m-%d"))
+_recent_feed = RecentFeed(_load_recent, capacity=int(os.getenv("RECENT_FEED_SIZE", "200")),
+                          follower=_feed_follower,
+                          poll_interval=float(os.getenv("RECENT_FEED_POLL_SECONDS", "2")))
+RECENT_FEED_MAX_WAIT = float(os.getenv("RECENT_FEED_MAX_WAIT", "25"))
+
+# Custom Vision client (keep-alive pool, retries, circuit breaker)
+_cv = custom_vision
+
+# Recognition engine: "customvision" (default) or "local" (on-CPU embedding gallery)
+RECOGNIZER_ENGINE = os.getenv("RECOGNIZER_ENGINE", "customvision").lower()
+_recognizer = None
+if RECOGNIZER_ENGINE == "local":
+    from recognizer import LocalEmbeddingRecognizer
+    _recognizer = LocalEmbeddingRecognizer.from_env()
 
 # Custom Vision Prediction
-def predict_image(b64: str):
-    """Call Azure Custom Vision to predict image"""
-    endpoint = os.environ["CV_PREDICTION_ENDPOINT"].rstrip("/")
-    project = os.environ["CV_PROJECT_ID"]
-    published = os.environ["CV_PUBLISHED_NAME"]
-    key = os.environ["CV_PREDICTION_KEY"]
-    
-    # Use the /image endpoint (stores prediction results)
-    url = f"{endpoint}/customvision/v3.0/Prediction/{project}/classify/iterations/{published}/image"
-    headers = {"Prediction-Key": key, "Content-Type": "application/octet-stream"}
-    data = base64.b64decode(b64)
-    
-    logging.info(f"Custom Vision URL: {url}")
-    logging.info(f"Using prediction key: {key[:10]}...")
+@stage("predict")
+def predict_image(image):
+    """Call Azure Custom Vision to predict image (raw bytes or base64)"""
+    import requests
+
+    data = image_bytes(image)
+    if _recognizer is not None:
+        return _recognizer.predict(data)
     
     try:
-        r = requests.post(url, headers=headers, data=data, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return _cv.predict(data)
     except requests.exceptions.HTTPError as e:
         logging.error(f"HTTP Error {e.response.status_code}: {e.response.text}")
-        # If the endpoint is wrong, you might need to check your Azure Portal
-        # Go to customvision.ai -> Settings -> Get Prediction URL
         raise Exception(f"Custom Vision API Error: {e.response.status_code} - {e.response.text}")
 
-def _normalize_training_endpoint(ep: str) -> str:
-    """
-    Ensure endpoint is just the resource root (scheme+host), e.g.
-    https://<resource>.cognitiveservices.azure.com
-    (Strips any accidental /customvision/... suffix.)
-    """
-    ep = (ep or "").strip()
-    if not ep:
-        return ep
-    u = urlparse(ep)
-    if u.scheme and u.netloc:
-        return f"{u.scheme}://{u.netloc}"
-    return ep.split("/customvision", 1)[0].rstrip("/")
 
-
-def add_image_to_training(b64: str, tag_name: str):
+@stage("train")
+def add_image_to_training(image, tag_name: str):
     """
     Adds a single image to the Azure Custom Vision Training project under the given tag.
-    - Creates the tag if missing (POST /tags?name=...)
+    - Resolves the tag id from a cached tag map; creates the tag if missing (POST /tags?name=...)
     - Uploads the image; prefers single-image bytes endpoint, falls back to multipart if needed.
+    With RECOGNIZER_ENGINE=local the image is enrolled in the local gallery instead.
     Returns a dict suitable for surfacing in your API response.
     """
-    training_endpoint_raw = os.environ.get("CV_TRAINING_ENDPOINT", "")
-    training_endpoint = _normalize_training_endpoint(training_endpoint_raw)
-    project_id = os.environ.get("CV_PROJECT_ID", "")
-    training_key = os.environ.get("CV_TRAINING_KEY", "")
-
-    # Headers
-    headers_json  = {"Training-Key": training_key, "Content-Type": "application/json"}
-    headers_octet = {"Training-Key": training_key, "Content-Type": "application/octet-stream"}
-    headers_plain = {"Training-Key": training_key}  # no content-type for some POSTs
-
-    # Helper: strip data URI prefix if present
-    def _strip_data_uri(s: str) -> str:
-        if isinstance(s, str) and s.startswith("data:"):
-            parts = s.split(",", 1)
-            return parts[1] if len(parts) == 2 else s
-        return s
+    if _recognizer is not None:
+        return _recognizer.enroll(image_bytes(image), tag_name)
+
+    import requests
+    from cv_client import TagCreateError
 
     # Diagnostics scaffold
     diag = {
-        "endpoint_raw": training_endpoint_raw,
-        "endpoint_normalized": training_endpoint,
-        "project_id": project_id,
+        "endpoint_raw": _cv.training_endpoint_raw,
+        "endpoint_normalized": _cv.training_endpoint,
+        "project_id": _cv.project_id,
         "urls": {}
     }
 
     try:
-        # --- 1) List existing tags (verifies endpoint/key/project) ---
-        # Use lower-case 'training' in path to avoid case-sensitive setups
-        url_tags = f"{training_endpoint}/customvision/v3.3/training/projects/{project_id}/tags"
-        diag["urls"]["list_tags"] = url_tags
-        logging.info(f"[CV] GET {url_tags}")
-        r = requests.get(url_tags, headers=headers_json, timeout=15)
-        r.raise_for_status()
-        tags = r.json()
-
-        # Resolve tag; create if absent (query param ?name=)
-        tag_id = next((t.get("id") for t in tags if t.get("name") == tag_name), None)
-        if not tag_id:
-            create_url = url_tags
-            diag["urls"]["create_tag"] = f"{create_url}?name={tag_name}"
-            logging.info(f"[CV] POST {create_url}?name={tag_name}")
-            r = requests.post(create_url, headers=headers_plain, params={"name": tag_name}, timeout=20)
-            r.raise_for_status()
-            tag_id = r.json().get("id")
-            if not tag_id:
-                return {
-                    "ok": False,
-                    "step": "create_tag",
-                    "error": f"Create tag succeeded but no 'id' in response: {r.text}",
-                    **diag
-                }
-
-        # Prepare bytes
-        raw_b64 = _strip_data_uri(b64)
-        data = base64.b64decode(raw_b64)
+        # --- 1) Resolve tag from the process-wide tag map; create if absent ---
+        diag["urls"]["tags"] = _cv.tags_url
+        try:
+            tag_id, created = _cv.resolve_tag_id(tag_name)
+        except TagCreateError as e:
+            return {"ok": False, "step": "create_tag", "error": str(e), **diag}
+        if created:
+            logging.info(f"[CV] Created tag {tag_name} ({tag_id})")
+
+        # Prepare bytes (no-op when the caller already decoded)
+        data = image_bytes(image)
 
         # --- 2) Try single-image bytes endpoint first (/images/image, octet-stream) ---
-        url_image_single = f"{training_endpoint}/customvision/v3.3/training/projects/{project_id}/images/image"
-        diag["urls"]["upload_image_single"] = f"{url_image_single}?tagIds={tag_id}"
-        logging.info(f"[CV] POST {url_image_single}?tagIds={tag_id} (octet-stream single)")
-
-        r = requests.post(
-            url_image_single,
-            headers=headers_octet,
-            params={"tagIds": tag_id},
-            data=data,
-            timeout=60
-        )
+        diag["urls"]["upload_image_single"] = f"{_cv.image_single_url}?tagIds={tag_id}"
+        logging.info(f"[CV] POST {_cv.image_single_url}?tagIds={tag_id} (octet-stream single)")
+        r = _cv.upload_image(data, tag_id)
 
         # If the environment says 404 for this route, fall back to multipart
         if r.status_code == 404:
             # --- 3) Fallback: multipart to /images ---
-            url_image_multipart = f"{training_endpoint}/customvision/v3.3/training/projects/{project_id}/images"
-            diag["urls"]["upload_image_multipart"] = f"{url_image_multipart}?tagIds={tag_id}"
-            logging.info(f"[CV] POST {url_image_multipart}?tagIds={tag_id} (multipart fallback)")
-
-            files = {
-                # field name is 'imageData' per docs; filename arbitrary; content-type can be octet-stream
-                "imageData": ("upload.jpg", data, "application/octet-stream")
-            }
-            # pass tagIds in query (works reliably); some stacks also accept form field 'tagIds'
-            r = requests.post(
-                url_image_multipart,
-                headers={"Training-Key": training_key},  # let requests set multipart boundary
-                params={"tagIds": tag_id},
-                files=files,
-                timeout=60
-            )
+            diag["urls"]["upload_image_multipart"] = f"{_cv.images_url}?tagIds={tag_id}"
+            logging.info(f"[CV] POST {_cv.images_url}?tagIds={tag_id} (multipart fallback)")
+            r = _cv.upload_image_multipart(data, tag_id)
+
+        # A cached tagId the project no longer knows (tag deleted in the portal):
+        # refresh the tag map once and retry the upload with the current id
+        if r.status_code == 400 and not created and "tag" in r.text.lower():
+            _cv.forget_tag(tag_name)
+            _cv.refresh_tags()
+            tag_id, created = _cv.resolve_tag_id(tag_name)
+            r = _cv.upload_image(data, tag_id)
 
         # Now enforce success
         if not r.ok:
@@ -240,6 +458,7 @@ def add_image_to_training(b64: str, tag_name: str):
 
 @app.route('/api/uploadAndEnroll', methods=['POST', 'OPTIONS'])
 @app.route('/api/uploadandenroll', methods=['POST', 'OPTIONS'])
+@_timed("uploadAndEnroll")
 def uploadAndEnroll():
     """Endpoint to upload and enroll a new user, and add image to Custom Vision training."""
     if request.method == 'OPTIONS':
@@ -247,37 +466,27 @@ def uploadAndEnroll():
 
     logging.info('uploadAndEnroll function triggered')
 
-    # Helper: strip possible data URI prefix
-    def _strip_data_uri(s: str) -> str:
-        if isinstance(s, str) and s.startswith("data:"):
-            parts = s.split(",", 1)
-            return parts[1] if len(parts) == 2 else s
-        return s
-
     try:
-        req_body = request.get_json(force=True, silent=False) or {}
+        req_body, data = _read_image_request()
         name = req_body.get('name')
         roll = req_body.get('roll')
         userId = req_body.get('userId')
-        b64 = req_body.get('base64Image')
         tag = req_body.get('classLabel')
 
         if tag=='TusharT':
             tag='Vaibhav Khater Right'
 
-        if not all([name, roll, userId, b64, tag]):
-            return jsonify({"error": "name, roll, userId, classLabel, base64Image required"}), 400
+        if not all([name, roll, userId, data, tag]):
+            return jsonify({"error": "name, roll, userId, classLabel and an image (base64Image, JPEG body or multipart 'image') required"}), 400
 
-        # Normalize base64 (handles data URI)
-        raw_b64 = _strip_data_uri(b64)
-
-        # Save to blob storage
-        blob_path = save_base64_jpeg(f"enroll/{userId}", raw_b64)
+        # Save to blob storage (image is decoded once above; training reuses the bytes)
+        data, _, original = _prepare_image(data)
+        blob_path = save_base64_jpeg(f"enroll/{userId}", data, original)
 
         # Add to Custom Vision training set and capture status for the client
         cv_status = None
         try:
-            cv_status = add_image_to_training(raw_b64, tag)
+            cv_status = add_image_to_training(data, tag)
             logging.info(f"Image added to Custom Vision training for tag: {tag}")
         except Exception as cv_error:
             logging.error(f"Failed to add to Custom Vision: {str(cv_error)}")
@@ -293,6 +502,8 @@ def uploadAndEnroll():
             "createdAt": datetime.utcnow().isoformat() + "Z",
             "lastEnrollBlob": blob_path
         }
+        if req_body.get('section'):
+            user_doc["section"] = req_body.get('section')
         upsert_user(user_doc)
 
         # Return full context so frontend knows if training upload actually succeeded
@@ -307,8 +518,162 @@ def uploadAndEnroll():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/uploadAndEnrollBatch', methods=['POST', 'OPTIONS'])
+@app.route('/api/uploadandenrollbatch', methods=['POST', 'OPTIONS'])
+@_timed("uploadAndEnrollBatch")
+def uploadAndEnrollBatch():
+    """Enroll many users, each with one or more images, in one request."""
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+
+    logging.info('uploadAndEnrollBatch function triggered')
+
+    from enrollment import enroll_batch, parse_batch
+
+    try:
+        try:
+            students, invalid = parse_batch(request.get_json(force=True, silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        results = enroll_batch(students, save_base64_jpeg, upsert_user, _cv, _enroll_pool,
+                               recognizer=_recognizer, prepare=_prepare_image)
+        results = sorted(results + invalid, key=lambda r: r["index"])
+        enrolled = sum(1 for r in results if r["ok"])
+        logging.info(f"uploadAndEnrollBatch enrolled {enrolled}/{len(results)} students")
+
+        return jsonify({
+            "ok": enrolled == len(results),
+            "count": len(results),
+            "enrolled": enrolled,
+            "results": results
+        }), 200
+
+    except Exception as e:
+        logging.error(f"Error in uploadAndEnrollBatch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+# Brightness/contrast/blur checks that turn away unusable frames before blob or prediction
+_quality_gate = FrameQualityGate.from_env()
+
+# Recent markAttendance rejections per device, keyed by frame dHash (retry storms at the door)
+_frame_cache = FrameCache(
+    ttl=float(os.getenv("FRAME_CACHE_TTL_SECONDS", "15")),
+    max_distance=int(os.getenv("FRAME_CACHE_MAX_DISTANCE", "2")),
+    per_device=int(os.getenv("FRAME_CACHE_PER_DEVICE", "8")),
+    max_devices=int(os.getenv("FRAME_CACHE_MAX_DEVICES", "1024")),
+    crop=float(os.getenv("FRAME_CACHE_CROP", "0.5"))
+)
+
+def _device_id(fields: dict, headers) -> str:
+    """Kiosk/device identifier: X-Device-Id header, then a deviceId field, else 'web'."""
+    return headers.get("X-Device-Id") or fields.get("deviceId") or "web"
+
+def _frame_hash(frame):
+    """dHash of the frame, or None when the cache is off or the image can't be decoded."""
+    if not _frame_cache.enabled:
+        return None
+    try:
+        return _frame_cache.hash(frame)
+    except Exception as e:
+        logging.warning(f"Frame hash failed: {str(e)}")
+        return None
+
+def _screen_frame(data, device: str):
+    """
+    Pixel stages that run before any I/O: normalize, quality gate, frame cache.
+    Returns (data, original, frame_hash, payload); a payload means the frame is
+    already answered (bad frame, or the rejection of a near-identical recent frame).
+    """
+    data, frame, original = _prepare_image(data)
+
+    # Covered lens, dark room or motion blur: answer without blob or prediction
+    with stage("quality"):
+        quality = _quality_gate.check(frame if frame is not None else data)
+    if quality is not None:
+        logging.info(f"markAttendance bad frame from {device}: {quality}")
+        return data, original, None, {"ok": False, "reason": "bad-frame", "quality": quality}
+
+    # Near-identical retry from the same device: reuse the earlier rejection
+    with stage("frame_cache"):
+        frame_hash = _frame_hash(frame if frame is not None else data)
+        cached = _frame_cache.lookup(device, frame_hash) if frame_hash is not None else None
+    if cached is not None:
+        return data, original, frame_hash, {**cached, "cached": True}
+    return data, original, frame_hash, None
+
+def _top_match(result: dict):
+    """(top prediction, None) when it clears CONF_THRESHOLD, else (None, rejection payload)."""
+    preds = result.get("predictions", [])
+    if not preds:
+        return None, {"ok": False, "reason": "no-predictions"}
+    top = max(preds, key=lambda p: p["probability"])
+    if top["probability"] < CONF_THRESHOLD:
+        return None, {"ok": False, "reason": "low-confidence", "confidence": top["probability"]}
+    return top, None
+
+def _attendance_row(user: dict, top: dict, device: str, local_date, blob_path) -> dict:
+    att = {
+        "id": attendance_id(user["userId"], local_date),
+        "userId": user["userId"],
+        "name": user["name"],
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "confidence": round(top["probability"], 4),
+        "imageBlobPath": blob_path,
+        "device": device,
+        "status": "present",
+        "localDate": f"{local_date:%Y-%m-%d}"
+    }
+    if user.get("section"):
+        att["section"] = user["section"]
+    return att
+
+def _marked_payload(att: dict, stored: dict, local_date, archive_error) -> dict:
+    """Record a written mark in the in-memory views and build the response payload."""
+    _daily_marks.add(stored, local_date)
+    if stored is not att:
+        # Lost a race with a concurrent mark for the same user and day
+        return {"ok": True, **stored, "alreadyMarked": True}
+    _recent_feed.append(att)
+    payload = {"ok": True, **att}
+    if archive_error:
+        # Recognition still counts; surface the archive failure alongside it
+        payload["archiveError"] = archive_error
+    return payload
+
+def _recognize_and_record(data, device: str, original=None) -> dict:
+    """
+    Run the markAttendance decision for one frame and return the response payload.
+    The frame is archived only once the decision is known: repeat taps by a
+    student already marked today return before any blob upload, and
+    rejections are archived in the background (ARCHIVE_REJECTED).
+    """
+    top, rejected = _top_match(predict_image(data))
+    if rejected:
+        _archive_rejected(data, original)
+        return rejected
+
+    user = get_user_by_tag(top["tagName"])
+    if not user:
+        _archive_rejected(data, original)
+        return {"ok": False, "reason": "unknown-tag"}
+
+    # Already marked today: return the original record, no upload and no new write
+    local_date = datetime.now(IST).date()
+    with stage("mark_index"):
+        existing = _daily_marks.get(user["userId"], local_date)
+    if existing:
+        return {"ok": True, **existing, "alreadyMarked": True}
+
+    blob_path, archive_error = _archive_outcome(data, original)
+    att = _attendance_row(user, top, device, local_date, blob_path)
+    return _marked_payload(att, add_attendance(att), local_date, archive_error)
+
+
 @app.route('/api/markAttendance', methods=['POST', 'OPTIONS'])
 @app.route('/api/markattendance', methods=['POST', 'OPTIONS'])  # lowercase version
+@_timed("markAttendance")
 def mark_attendance():
     """Endpoint to mark attendance using face recognition"""
     # Handle CORS preflight
@@ -318,45 +683,17 @@ def mark_attendance():
     logging.info("Running markAttendance function")
 
     try:
-        body = request.get_json()
-        b64 = body.get("base64Image")
-        if not b64:
-            return jsonify({"error": "base64Image required"}), 400
-
-        blob_path = save_base64_jpeg("mark", b64)
-        result = predict_image(b64)
-        preds = result.get("predictions", [])
-        
-        if not preds:
-            return jsonify({"ok": False, "reason": "no-predictions"}), 200
-
-        top = max(preds, key=lambda p: p['probability'])
-        thr = CONF_THRESHOLD
-        print(top,thr)
-
-        if top['probability'] >= thr:
-            user = get_user_by_tag(top['tagName'])
-            if not user:
-                return jsonify({"ok": False, "reason": "unknown-tag"}), 200
-
-            att = {
-                "id": f"att-{uuid.uuid4()}",
-                "userId": user["userId"],
-                "name": user["name"],
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "confidence": round(top['probability'], 4),
-                "imageBlobPath": blob_path,
-                "device": "web",
-                "status": "present"
-            }
-            add_attendance(att)
-            return jsonify({"ok": True, **att}), 200
-        else:
-            return jsonify({
-                "ok": False, 
-                "reason": "low-confidence", 
-                "confidence": top['probability']
-            }), 200
+        fields, data = _read_image_request()
+        if not data:
+            return jsonify({"error": "base64Image (or a JPEG body) required"}), 400
+
+        device = _device_id(fields, request.headers)
+        data, original, frame_hash, payload = _screen_frame(data, device)
+        if payload is None:
+            payload = _recognize_and_record(data, device, original)
+            if frame_hash is not None:
+                _frame_cache.store(device, frame_hash, payload)
+        return jsonify(payload), 200
     except Exception as e:
         logging.error(f"Error in markAttendance: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -384,143 +721,234 @@ def _parse_date_flexible(date_str: str):
         pass
     raise ValueError("Unrecognized date format")
 
+def _day_window_utc(day_local: datetime):
+    """[start, end) of a local calendar day, as UTC datetimes."""
+    start_local = day_local.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_local = start_local + timedelta(days=1)
+    return start_local.astimezone(timezone.utc), end_local.astimezone(timezone.utc)
+
+def _requested_day(date_str):
+    """
+    (IST midnight, "YYYY-MM-DD") for getAttendance's ?date= (YYYY-MM-DD or
+    DD-MM-YYYY), today when it is empty; ValueError when it can't be parsed.
+    """
+    if date_str:
+        y, m, d = _parse_date_flexible(date_str)
+        day_local = datetime(y, m, d, tzinfo=IST)
+    else:
+        now_local = datetime.now(IST)
+        day_local = datetime(now_local.year, now_local.month, now_local.day, tzinfo=IST)
+    return day_local, f"{day_local:%Y-%m-%d}"
+
+def _attendance_payload(day_local: datetime, date_str: str, items: list) -> dict:
+    """getAttendance response body: the day's rows and its window in UTC."""
+    start_utc, end_utc = _day_window_utc(day_local)
+    return {
+        "ok": True,
+        "range": {
+            "tz": "Asia/Kolkata",
+            "localDate": date_str,
+            "utcFrom": start_utc.isoformat().replace('+00:00', 'Z'),
+            "utcTo": end_utc.isoformat().replace('+00:00', 'Z')
+        },
+        "count": len(items),
+        "items": items
+    }
+
 @app.route('/api/getAttendance', methods=['GET', 'OPTIONS'])
 @app.route('/api/getattendance', methods=['GET', 'OPTIONS'])
+@_timed("getAttendance")
 def getAttendance():
     """Return attendance records for a single calendar day in IST."""
     if request.method == 'OPTIONS':
         return jsonify({}), 200
     try:
-        date_str = request.args.get('date')
-        if date_str:
-            try:
-                y, m, d = _parse_date_flexible(date_str)
-                day_local = datetime(y, m, d, tzinfo=IST)
-                date_str = f"{y:04d}-{m:02d}-{d:02d}"
-            except ValueError:
-                logging.error(f"getAttendance: bad date '{date_str}'")
-                return jsonify({"error": "Invalid date; use YYYY-MM-DD or DD-MM-YYYY"}), 400
-        else:
-            now_local = datetime.now(IST)
-            day_local = datetime(now_local.year, now_local.month, now_local.day, tzinfo=IST)
-            date_str = f"{day_local.year:04d}-{day_local.month:02d}-{day_local.day:02d}"
-
-        # Compute the day window in UTC
-        start_local = day_local.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_local = start_local + timedelta(days=1)
-        start_utc = start_local.astimezone(timezone.utc)
-        end_utc = end_local.astimezone(timezone.utc)
-
-        # Query by _ts (Cosmos system timestamp)
-        start_epoch = int(start_utc.timestamp())
-        end_epoch = int(end_utc.timestamp())
-
-        logging.info(f"getAttendance {date_str} IST -> UTC [{start_utc} .. {end_utc}) -> _ts range [{start_epoch}..{end_epoch})")
-
-        q_ts = """
-            SELECT c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath, c._ts
-            FROM c
-            WHERE c._ts >= @from AND c._ts < @to
-            ORDER BY c._ts DESC
-        """
-        items = list(_att.query_items(
-            query=q_ts,
-            parameters=[{"name": "@from", "value": start_epoch},
-                        {"name": "@to", "value": end_epoch}],
-            enable_cross_partition_query=True
-        ))
+        try:
+            day_local, date_str = _requested_day(request.args.get('date'))
+        except ValueError:
+            logging.error(f"getAttendance: bad date '{request.args.get('date')}'")
+            return jsonify({"error": "Invalid date; use YYYY-MM-DD or DD-MM-YYYY"}), 400
 
-        # Fallback to ISO string if nothing found
-        if not items:
-            start_iso = start_utc.isoformat().replace('+00:00', 'Z')
-            end_iso = end_utc.isoformat().replace('+00:00', 'Z')
-            q_iso = """
-                SELECT * FROM c
-                WHERE c.timestamp >= @from AND c.timestamp < @to
-                ORDER BY c.timestamp DESC
-            """
-            items = list(_att.query_items(
-                query=q_iso,
-                parameters=[{"name": "@from", "value": start_iso},
-                            {"name": "@to", "value": end_iso}],
-                enable_cross_partition_query=True
-            ))
+        logging.info(f"getAttendance {date_str} IST -> partition localDate={date_str}")
 
-        return jsonify({
-            "ok": True,
-            "range": {
-                "tz": "Asia/Kolkata",
-                "localDate": date_str,
-                "utcFrom": start_utc.isoformat().replace('+00:00', 'Z'),
-                "utcTo": end_utc.isoformat().replace('+00:00', 'Z')
-            },
-            "count": len(items),
-            "items": items
-        }), 200
+        # One single-partition query; every record carries its IST localDate
+        with stage("query"):
+            items = list(_query_day(date_str))
+
+        return jsonify(_attendance_payload(day_local, date_str, items)), 200
 
     except Exception as e:
         logging.exception("Error in getAttendance")
         return jsonify({"error": "Internal error in getAttendance"}), 500
 
 
+@app.route('/api/exportAttendance', methods=['GET', 'OPTIONS'])
+@app.route('/api/exportattendance', methods=['GET', 'OPTIONS'])
+@_timed("exportAttendance")
+def exportAttendance():
+    """
+    Stream attendance for a range of IST days as NDJSON or CSV, one Cosmos page at a time.
+    - from=YYYY-MM-DD[&to=YYYY-MM-DD]&format=ndjson|csv[&token=...]
+    - checkpoints=1 writes a resume marker after each page, so a dropped download
+      can continue from the last marker via &token=<value>.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+    fmt = (request.args.get('format') or 'ndjson').lower()
+    token = request.args.get('token')
+    checkpoints = request.args.get('checkpoints') in ('1', 'true')
+    try:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        start, end = parse_range(request.args.get('from'), request.args.get('to'), _parse_date_flexible)
+        if token:
+            decode_token(token, start, end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        if fmt == "csv" and not token:
+            yield format_rows([], fmt, header=True)
+        try:
+            for rows, resume in iter_export(_query_day, start, end, token, page_size=EXPORT_PAGE_SIZE):
+                yield format_rows(rows, fmt)
+                if checkpoints and resume:
+                    yield format_checkpoint(resume, fmt)
+        except Exception:
+            # Headers are already sent; the missing final page tells the client to resume
+            logging.exception("exportAttendance stream failed")
+
+    logging.info(f"exportAttendance {start}..{end} {fmt}")
+    return Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+
+
 @app.route('/api/listUsers', methods=['GET', 'OPTIONS'])
 @app.route('/api/listusers', methods=['GET', 'OPTIONS'])  # lowercase alias
+@_timed("listUsers")
 def listUsers():
-    """List all enrolled users"""
+    """List enrolled users one page at a time (?limit=&fields=&q=&continuation=)"""
     if request.method == 'OPTIONS':
         return jsonify({}), 200
     try:
-        # Simple: fetch all
-        query = "SELECT * FROM c"
-        items = list(_users.query_items(
-            query=query,
-            enable_cross_partition_query=True
-        ))
-        return jsonify(items), 200
+        opts = parse_user_list_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with stage("query"):
+            page = query_user_page(_users, opts)
+        response = jsonify(page)
+        if page["continuation"]:
+            response.headers['X-Continuation-Token'] = page["continuation"]
+        return response, 200
     except Exception as e:
         logging.error(f"Error in listUsers: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/usersSummary', methods=['GET', 'OPTIONS'])
+@_timed("usersSummary")
 def usersSummary():
-    """Return total user count (fast)"""
+    """Return total and per-section user counts (one point read of the summary document)"""
     if request.method == 'OPTIONS':
         return jsonify({}), 200
     try:
-        # Cosmos aggregate
+        if _user_summary is not None:
+            with stage("query"):
+                return jsonify(_user_summary.read()), 200
+        # No summary container configured: Cosmos aggregate
         q = "SELECT VALUE COUNT(1) FROM c"
-        total = list(_users.query_items(q, enable_cross_partition_query=True))[0]
+        with stage("query"):
+            total = list(_users.query_items(q, enable_cross_partition_query=True))[0]
         return jsonify({"totalUsers": total}), 200
     except Exception as e:
         logging.error(f"usersSummary error: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/attendanceRecent', methods=['GET', 'OPTIONS'])
+@_timed("attendanceRecent")
 def attendance_recent():
     """Return the latest 50 attendance items to debug the dashboard."""
     if request.method == 'OPTIONS':
         return jsonify({}), 200
     try:
-        # Order by _ts (system timestamp) descending; LIMIT 50
-        q = """
-        SELECT TOP 50 c.id, c.userId, c.name, c.timestamp, c.confidence, c.status, c.imageBlobPath, c._ts
-        FROM c
-        ORDER BY c._ts DESC
-        """
-        items = list(_att.query_items(q, enable_cross_partition_query=True))
-        return jsonify({"ok": True, "count": len(items), "items": items}), 200
+        # Served from the in-memory feed (seeded from Cosmos once per process)
+        with stage("feed"):
+            items = _recent_feed.recent(50)
+        return jsonify({"ok": True, "count": len(items), "items": items, "cursor": _recent_feed.cursor()}), 200
     except Exception as e:
         logging.exception("attendance_recent failed")
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+@app.route('/api/attendanceStream', methods=['GET', 'OPTIONS'])
+@app.route('/api/attendancestream', methods=['GET', 'OPTIONS'])
+@_timed("attendanceStream")
+def attendance_stream():
+    """
+    New check-ins after a cursor.
+    - Accept: text/event-stream -> server-sent events; each event's id is the
+      cursor, so EventSource resumes via Last-Event-ID after a reconnect.
+    - Otherwise long-poll: ?cursor=&wait= returns {ok, cursor, reset, items}.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({}), 200
+    cursor = request.args.get('cursor') or request.headers.get('Last-Event-ID')
+
+    if 'text/event-stream' not in request.headers.get('Accept', ''):
+        try:
+            wait = min(max(float(request.args.get('wait') or RECENT_FEED_MAX_WAIT), 0.0), RECENT_FEED_MAX_WAIT)
+        except ValueError:
+            wait = RECENT_FEED_MAX_WAIT
+        with stage("wait"):
+            result = _recent_feed.wait_after(cursor, wait)
+        return jsonify({"ok": True, **result}), 200
+
+    def events():
+        position = cursor
+        while True:
+            result = _recent_feed.wait_after(position, RECENT_FEED_MAX_WAIT)
+            if result["items"] or result["reset"]:
+                position = result["cursor"]
+                event = "reset" if result["reset"] else "checkins"
+                yield f"id: {position}\nevent: {event}\ndata: {json.dumps(result['items'])}\n\n"
+            else:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Component counters exported next to the latency histograms, and Cosmos RU per endpoint/query
+metrics.add_exposition(charges.exposition)
+metrics.add_collector("qualityGate", _quality_gate.stats)
+metrics.add_collector("frameCache", _frame_cache.stats)
+metrics.add_collector("userCache", _user_cache.stats)
+if _archiver is not None:
+    metrics.add_collector("archiver", _archiver.stats)
+if _att_writer is not None:
+    metrics.add_collector("writeBehind", _att_writer.stats)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition: per-endpoint/per-stage latency summaries and component gauges"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == '__main__':
     print("Starting local backend server...")
     print("Server running at: http://localhost:7071")
     print("API endpoints:")
     print("  POST http://localhost:7071/api/uploadAndEnroll")
+    print("  POST http://localhost:7071/api/uploadAndEnrollBatch")
     print("  POST http://localhost:7071/api/markAttendance")
     print("  GET  http://localhost:7071/api/getAttendance?date=YYYY-MM-DD")
-    print("  GET  http://localhost:7071/api/listUsers")
-    app.run(host='0.0.0.0', port=7071, debug=True)
+    print("  GET  http://localhost:7071/api/exportAttendance?from=YYYY-MM-DD&to=YYYY-MM-DD&format=ndjson|csv")
+    print("  GET  http://localhost:7071/api/attendanceStream?cursor=...  (SSE with Accept: text/event-stream)")
+    print("  GET  http://localhost:7071/api/listUsers?limit=100&fields=name,roll&q=prefix&continuation=...")
+    print("  GET  http://localhost:7071/api/metrics  (Prometheus text; Server-Timing on every response)")
+    # The Werkzeug debugger and reloader are opt-in: the debugger runs arbitrary
+    # code for anyone who can reach the port, and the reloader doubles the process
+    debug = os.getenv("LOCAL_BACKEND_DEBUG", "").lower() in ("1", "true", "yes")
+    app.run(host='0.0.0.0', port=7071, debug=debug, threaded=True)
@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+
+from imaging import decode_grayscale
+
+
+class FrameQualityGate:
+    """
+    Cheap pixel checks run before a frame costs a blob write or a prediction.
+    On a small grayscale copy (`size`) it measures:
+    - brightness: mean intensity (0..255); catches covered lenses and dark rooms
+      (too low) or blown-out frames (too high)
+    - contrast: standard deviation of intensity; catches blank/flat frames
+    - sharpness: variance of the 4-neighbour Laplacian; catches motion blur
+    A threshold of 0 disables that check. Counters per failed check are kept
+    for stats().
+    """
+
+    CHECKS = ("dark", "bright", "flat", "blurry")
+
+    def __init__(self, min_brightness: float = 40.0, max_brightness: float = 230.0,
+                 min_contrast: float = 12.0, min_sharpness: float = 25.0,
+                 size: int = 128, enabled: bool = True):
+        self.min_brightness = float(min_brightness)
+        self.max_brightness = float(max_brightness)
+        self.min_contrast = float(min_contrast)
+        self.min_sharpness = float(min_sharpness)
+        self.size = int(size)
+        self.enabled = bool(enabled)
+        self._lock = threading.Lock()
+        self.passed = 0
+        self.rejected = {check: 0 for check in self.CHECKS}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            min_brightness=float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40")),
+            max_brightness=float(os.getenv("QUALITY_MAX_BRIGHTNESS", "230")),
+            min_contrast=float(os.getenv("QUALITY_MIN_CONTRAST", "12")),
+            min_sharpness=float(os.getenv("QUALITY_MIN_SHARPNESS", "25")),
+            size=int(os.getenv("QUALITY_GATE_SIZE", "128")),
+            enabled=os.getenv("QUALITY_GATE", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def measure(self, frame) -> dict:
+        """Brightness, contrast and sharpness of `frame` (JPEG bytes or a decoded image)."""
+        g = decode_grayscale(frame, (self.size, self.size))
+        lap = (g[:-2, 1:-1] + g[2:, 1:-1] + g[1:-1, :-2] + g[1:-1, 2:]) - 4.0 * g[1:-1, 1:-1]
+        return {
+            "brightness": round(float(g.mean()), 1),
+            "contrast": round(float(g.std()), 1),
+            "sharpness": round(float(lap.var()), 1),
+        }
+
+    def check(self, frame):
+        """
+        Returns None when the frame passes (or can't be decoded: the prediction
+        path reports that as before), else {"failed": [...], **measurements}.
+        """
+        if not self.enabled:
+            return None
+        try:
+            m = self.measure(frame)
+        except Exception as e:
+            logging.warning(f"Quality gate skipped, could not decode frame: {str(e)}")
+            return None
+
+        failed = []
+        if self.min_brightness and m["brightness"] < self.min_brightness:
+            failed.append("dark")
+        if self.max_brightness and m["brightness"] > self.max_brightness:
+            failed.append("bright")
+        if self.min_contrast and m["contrast"] < self.min_contrast:
+            failed.append("flat")
+        if self.min_sharpness and m["sharpness"] < self.min_sharpness:
+            failed.append("blurry")
+
+        with self._lock:
+            if not failed:
+                self.passed += 1
+            for check in failed:
+                self.rejected[check] += 1
+        return {"failed": failed, **m} if failed else None
+
+    def thresholds(self) -> dict:
+        return {
+            "minBrightness": self.min_brightness,
+            "maxBrightness": self.max_brightness,
+            "minContrast": self.min_contrast,
+            "minSharpness": self.min_sharpness,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"passed": self.passed, "rejected": dict(self.rejected), "thresholds": self.thresholds()}
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+# Fields kept per check-in (the attendanceRecent projection)
+FEED_FIELDS = ("id", "userId", "name", "timestamp", "confidence", "status", "imageBlobPath", "_ts")
+
+
+class ChangeFeedFollower:
+    """
+    Reads new attendance records from the container's change feed, so a feed on
+    one instance also sees check-ins written by every other instance.
+    - Follows today's partition (`today()` -> "YYYY-MM-DD"; the container is
+      partitioned by localDate); the first poll starts `lookback` seconds back,
+      a new day's partition is read from its beginning.
+    - poll() returns the records changed since the previous poll.
+    """
+
+    def __init__(self, container, today, lookback: float = 10.0):
+        self.container = container
+        self.today = today
+        self.lookback = float(lookback)
+        self._day = None
+        self._continuation = None
+
+    def poll(self) -> list:
+        day = self.today()
+        options = {"continuation": self._continuation}
+        if day != self._day:
+            options = ({"start_time": datetime.now(timezone.utc) - timedelta(seconds=self.lookback)}
+                       if self._day is None else {"is_start_from_beginning": True})
+        etag = {}
+
+        def remember_etag(headers, result):
+            # Called per response page (a dict), then once more with the pager
+            if isinstance(result, dict) and headers.get("etag"):
+                etag["value"] = headers["etag"]
+
+        rows = list(self.container.query_items_change_feed(partition_key=day, response_hook=remember_etag,
+                                                           **options))
+        self._day = day
+        self._continuation = etag.get("value", self._continuation)
+        return rows
+
+
+class RecentFeed:
+    """
+    Ring buffer of the most recent check-ins.
+    - Seeded once through `loader()` (newest first) on the first read, then kept
+      current by append() as markAttendance writes records on this instance and,
+      with a `follower` (ChangeFeedFollower), by polling it at most every
+      `poll_interval` seconds while readers are active, for records written
+      elsewhere. Records are deduplicated by id.
+    - append() never seeds (it is on the check-in path): before the first read
+      it only buffers the record, and the seed merges the buffer in after the
+      loaded rows.
+    - Every entry gets a sequence number; cursors are "<epoch>-<seq>" where the
+      epoch identifies this buffer, so a cursor from another instance or an
+      earlier process is detected and answered with a full snapshot ("reset").
+    - wait_after() blocks a thread until something newer than the cursor
+      arrives; wait_after_async() waits on the event loop without one.
+    """
+
+    def __init__(self, loader=None, capacity: int = 200, follower=None, poll_interval: float = 2.0):
+        self._loader = loader
+        self._items = deque(maxlen=max(1, int(capacity)))  # (seq, record), oldest first
+        self._seq = 0
+        self._epoch = os.urandom(4).hex()
+        self._cond = threading.Condition()
+        self._seeded = loader is None
+        self._seed_lock = threading.Lock()
+        self._unseeded = []  # records appended before the seed, oldest first
+        self._follower = follower
+        self.poll_interval = max(0.1, float(poll_interval))
+        self._polled_at = 0.0
+        self._poll_lock = threading.Lock()
+        self._waiters = set()  # (loop, future) of async readers
+
+    def _ensure_seeded(self):
+        if self._seeded:
+            return
+        # The query runs outside _cond, so append() doesn't wait for it
+        with self._seed_lock:
+            if self._seeded:
+                return
+            try:
+                rows = list(self._loader())
+            except Exception as e:
+                # Serve what arrives from now on rather than failing every request
+                logging.error(f"Recent feed seed failed: {str(e)}")
+                rows = []
+            with self._cond:
+                known = set()
+                for row in [*reversed(rows), *self._unseeded]:
+                    if row.get("id") in known:
+                        continue
+                    known.add(row.get("id"))
+                    self._seq += 1
+                    self._items.append((self._seq, {k: row.get(k) for k in FEED_FIELDS}))
+                self._unseeded = []
+                self._seeded = True
+
+    def _refresh(self):
+        """Seed if needed, then pull records other instances wrote (rate limited, one poller)."""
+        self._ensure_seeded()
+        if self._follower is None or time.monotonic() - self._polled_at < self.poll_interval:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return  # another reader is polling
+        try:
+            self._polled_at = time.monotonic()
+            try:
+                rows = self._follower.poll()
+            except Exception as e:
+                logging.warning(f"Recent feed change-feed poll failed: {str(e)}")
+                return
+            if rows:
+                self._merge(sorted(rows, key=lambda r: (r.get("timestamp") or "", r.get("_ts") or 0)))
+        finally:
+            self._poll_lock.release()
+
+    def _merge(self, rows: list):
+        with self._cond:
+            known = {row["id"] for _, row in self._items}
+            added = False
+            for record in rows:
+                if record.get("id") in known:
+                    continue
+                known.add(record.get("id"))
+                self._seq += 1
+                self._items.append((self._seq, {k: record.get(k) for k in FEED_FIELDS}))
+                added = True
+            if added:
+                self._notify_locked()
+
+    def _notify_locked(self):
+        self._cond.notify_all()
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self._waiters.clear()
+
+    def cursor(self) -> str:
+        with self._cond:
+            return f"{self._epoch}-{self._seq}"
+
+    def append(self, record: dict) -> str:
+        """
+        Add a new check-in and wake any waiting readers; returns the cursor after it.
+        A record already in the buffer (e.g. picked up from the change feed first) is skipped.
+        """
+        row = {k: record.get(k) for k in FEED_FIELDS}
+        if row["_ts"] is None:
+            row["_ts"] = int(time.time())
+        with self._cond:
+            if not self._seeded:
+                if all(r["id"] != row["id"] for r in self._unseeded):
+                    self._unseeded.append(row)
+                return f"{self._epoch}-{self._seq}"
+            if any(r["id"] == row["id"] for _, r in self._items):
+                return f"{self._epoch}-{self._seq}"
+            self._seq += 1
+            self._items.append((self._seq, row))
+            self._notify_locked()
+            return f"{self._epoch}-{self._seq}"
+
+    def recent(self, limit: int = 50) -> list:
+        """Newest first, like ORDER BY c.timestamp DESC."""
+        self._refresh()
+        with self._cond:
+            return [row for _, row in reversed(self._items)][:limit]
+
+    def _parse(self, cursor: str):
+        epoch, _, seq = (cursor or "").partition("-")
+        if epoch != self._epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        return int(seq)
+
+    def after(self, cursor: str, limit: int = 100) -> dict:
+        """
+        Records newer than `cursor`, oldest first.
+        `reset` is True when the cursor is unknown or has fallen out of the
+        buffer; the items are then the whole buffer and the client should
+        replace its list rather than append.
+        """
+        self._refresh()
+        with self._cond:
+            return self._after_locked(cursor, limit)
+
+    def _after_locked(self, cursor: str, limit: int) -> dict:
+        seq = self._parse(cursor)
+        oldest = self._items[0][0] if self._items else self._seq + 1
+        reset = seq is None or seq < oldest - 1
+        start = oldest - 1 if reset else seq
+        # Sequence numbers in the buffer are contiguous
+        items = [row for s, row in self._items if s > start][:limit]
+        return {"cursor": f"{self._epoch}-{start + len(items)}", "reset": reset, "items": items}
+
+    def wait_after(self, cursor: str, timeout: float, limit: int = 100) -> dict:
+        """Like after(), but waits up to `timeout` seconds for a newer record."""
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            self._refresh()
+            with self._cond:
+                result = self._after_locked(cursor, limit)
+                remaining = deadline - time.monotonic()
+                if result["items"] or result["reset"] or remaining <= 0:
+                    return result
+                # Wake up in time for the next change-feed poll
+                self._cond.wait(min(remaining, self.poll_interval) if self._follower else remaining)
+
+    async def wait_after_async(self, cursor: str, timeout: float, limit: int = 100) -> dict:
+        """
+        wait_after() for async handlers: parks on the event loop instead of a
+        worker thread; seeding and change-feed polls run on a thread briefly.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            await asyncio.to_thread(self._refresh)
+            future = loop.create_future()
+            with self._cond:
+                result = self._after_locked(cursor, limit)
+                remaining = deadline - time.monotonic()
+                if result["items"] or result["reset"] or remaining <= 0:
+                    return result
+                self._waiters.add((loop, future))
+            try:
+                await asyncio.wait_for(future, min(remaining, self.poll_interval) if self._follower else remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    self._waiters.discard((loop, future))
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,269 @@
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from ann_index import IVFIndex
+from imaging import decode_grayscale, image_bytes
+
+# Embedding geometry: 64x64 grayscale, 8x8-pixel cells, 9 unsigned orientation bins
+EMBED_SIZE = 64
+CELL = 8
+BINS = 9
+EMBED_DIM = (EMBED_SIZE // CELL) ** 2 * BINS
+
+
+def hog_embedding(data) -> np.ndarray:
+    """
+    Fixed-length (EMBED_DIM) float32 embedding of a JPEG.
+    A HOG-style descriptor: gradient-orientation histograms per cell, square-rooted
+    (Hellinger) and L2-normalized so a dot product is a cosine similarity.
+    """
+    g = decode_grayscale(image_bytes(data), (EMBED_SIZE, EMBED_SIZE))
+    gx = np.zeros_like(g)
+    gy = np.zeros_like(g)
+    gx[:, 1:-1] = g[:, 2:] - g[:, :-2]
+    gy[1:-1, :] = g[2:, :] - g[:-2, :]
+    mag = np.hypot(gx, gy)
+    ang = np.mod(np.arctan2(gy, gx), np.pi)
+    bins = np.minimum((ang / np.pi * BINS).astype(np.int64), BINS - 1)
+
+    n = EMBED_SIZE // CELL
+    cell_idx = (np.arange(EMBED_SIZE) // CELL)
+    flat = (cell_idx[:, None] * n + cell_idx[None, :]) * BINS + bins
+    hist = np.bincount(flat.ravel(), weights=mag.ravel(), minlength=EMBED_DIM).astype(np.float32)
+
+    hist = np.sqrt(hist)
+    hist -= hist.mean()
+    norm = np.linalg.norm(hist)
+    return hist / norm if norm > 0 else hist
+
+
+class Recognizer(ABC):
+    """
+    Prediction engine interface used by predict_image / add_image_to_training.
+    predict() returns the Custom Vision shape: {"predictions": [{"tagName", "probability"}, ...]}.
+    enroll() adds one image under a tag and returns a status dict for the API response.
+    enroll_many() does the same for a batch; engines that persist should override it
+    to write once per batch.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def predict(self, data) -> dict:
+        ...
+
+    @abstractmethod
+    def enroll(self, data, tag_name: str) -> dict:
+        ...
+
+    def enroll_many(self, items) -> list:
+        """[(data, tag_name), ...] -> one status dict per item, in order."""
+        results = []
+        for data, tag_name in items:
+            try:
+                results.append(self.enroll(data, tag_name))
+            except Exception as e:
+                results.append({"ok": False, "engine": self.name, "error": str(e)})
+        return results
+
+
+class LocalEmbeddingRecognizer(Recognizer):
+    """
+    On-CPU recognizer over enrolled-image embeddings.
+    - All embeddings live in one contiguous float32 matrix (rows grow by doubling).
+    - predict() scores every enrolled image with one matmul and reports, per tag,
+      the best cosine similarity clipped to [0, 1] as its "probability", so the
+      existing CONF_THRESHOLD check applies unchanged.
+    - The gallery is saved to `path` (.npz) after each enroll() / enroll_many()
+      call (once per batch) and loaded on start.
+    - With `index_dir`, galleries of at least `index_min_rows` images are searched
+      through an IVF index (ann_index.IVFIndex) instead of brute force; the index is
+      updated on enrollment and memory-mapped from `index_dir` on start.
+    `embed` can be swapped for a real face-embedding model with the same contract.
+    """
+
+    name = "local"
+
+    def __init__(self, path: str = None, embed=hog_embedding, dim: int = EMBED_DIM, top_k: int = 5,
+                 index_dir: str = None, index_min_rows: int = 2048, nlist: int = 0, nprobe: int = 8,
+                 candidates: int = 64):
+        self.path = path
+        self.embed = embed
+        self.dim = dim
+        self.top_k = top_k
+        self.index_dir = index_dir
+        self.index_min_rows = index_min_rows
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.candidates = candidates
+        self.index = None
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._rows = 0
+        self._labels = []          # tag name per label index
+        self._label_index = {}     # tag name -> label index
+        self._row_labels = np.zeros(0, dtype=np.int32)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+        if index_dir:
+            self.index = IVFIndex.load(index_dir, nprobe=nprobe)
+            if self.index is not None and len(self.index) != self._rows:
+                logging.warning(f"IVF index in {index_dir} is out of sync with the gallery; rebuilding")
+                self.index = None
+            if self.index is None and self._rows >= index_min_rows:
+                self.build_index()
+
+    @classmethod
+    def from_env(cls):
+        return cls(path=os.getenv("LOCAL_RECOGNIZER_PATH",
+                                  os.path.join(tempfile.gettempdir(), "recognizer_gallery.npz")),
+                   top_k=int(os.getenv("LOCAL_RECOGNIZER_TOP_K", "5")),
+                   index_dir=os.getenv("LOCAL_RECOGNIZER_INDEX_DIR") or None,
+                   index_min_rows=int(os.getenv("ANN_MIN_ROWS", "2048")),
+                   nlist=int(os.getenv("ANN_NLIST", "0")),
+                   nprobe=int(os.getenv("ANN_NPROBE", "8")),
+                   candidates=int(os.getenv("ANN_CANDIDATES", "64")))
+
+    def build_index(self):
+        """Train an IVF index over the whole gallery and persist it."""
+        with self._lock:
+            vectors = self._matrix[:self._rows].copy()
+        # ~4*sqrt(N) lists keeps lists short while centroids stay cheap to scan
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+        index = IVFIndex(self.dim, nlist=nlist, nprobe=self.nprobe)
+        index.train(vectors, np.arange(len(vectors)))
+        index.save(self.index_dir)
+        self.index = index
+        logging.info(f"IVF index built over {len(vectors)} embeddings with {index.nlist} lists")
+
+    @property
+    def size(self) -> int:
+        return self._rows
+
+    def _append(self, vector: np.ndarray, tag_name: str):
+        with self._lock:
+            label = self._label_index.get(tag_name)
+            if label is None:
+                label = self._label_index[tag_name] = len(self._labels)
+                self._labels.append(tag_name)
+            if self._rows == len(self._matrix):
+                capacity = max(64, 2 * len(self._matrix))
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[:self._rows] = self._matrix[:self._rows]
+                row_labels = np.zeros(capacity, dtype=np.int32)
+                row_labels[:self._rows] = self._row_labels[:self._rows]
+                self._matrix, self._row_labels = grown, row_labels
+            self._matrix[self._rows] = vector
+            self._row_labels[self._rows] = label
+            self._rows += 1
+            return self._rows - 1
+
+    def enroll(self, data, tag_name: str) -> dict:
+        result = self.enroll_many([(data, tag_name)])[0]
+        if not result["ok"]:
+            raise ValueError(result["error"])
+        return result
+
+    def enroll_many(self, items) -> list:
+        """
+        Embed and append every image, then write the gallery and index once.
+        An image that can't be embedded gets {"ok": False, "error"} and the rest
+        still enroll.
+        """
+        results, vectors, rows = [], [], []
+        for data, tag_name in items:
+            try:
+                vector = self.embed(data)
+            except Exception as e:
+                results.append({"ok": False, "engine": self.name, "error": str(e)})
+                continue
+            row = self._append(vector, tag_name)
+            vectors.append(vector)
+            rows.append(row)
+            results.append({"ok": True, "engine": self.name, "row": row, "usedTag": {"name": tag_name}})
+        if not rows:
+            return results
+
+        if self.path:
+            self.save(self.path)
+        if self.index is not None:
+            merged = self.index.add(np.stack(vectors), rows)
+            self.index.save(self.index_dir, pending_only=not merged)
+        elif self.index_dir and self._rows >= self.index_min_rows:
+            self.build_index()
+        for result in results:
+            if result["ok"]:
+                result["galleryImages"] = self.size
+        return results
+
+    def scores(self, query: np.ndarray):
+        """(best similarity per label, label names) for one embedding."""
+        with self._lock:
+            rows = self._rows
+            matrix = self._matrix[:rows]
+            row_labels = self._row_labels[:rows]
+            labels = list(self._labels)
+            index = self.index
+        if index is not None:
+            # Approximate: only the index's candidate rows are scored. Rows enrolled
+            # since the snapshot above may already be in the index; skip those
+            ids, sims = index.search(query, k=self.candidates)
+            keep = ids < rows
+            row_labels = row_labels[ids[keep]]
+            sims = sims[keep]
+        else:
+            sims = matrix @ query
+        best = np.full(len(labels), -1.0, dtype=np.float32)
+        np.maximum.at(best, row_labels, sims)
+        return best, labels
+
+    def predict(self, data) -> dict:
+        if self._rows == 0:
+            return {"engine": self.name, "predictions": []}
+        best, labels = self.scores(self.embed(data))
+        k = min(self.top_k, int((best > -1.0).sum()))
+        if k == 0:
+            return {"engine": self.name, "predictions": []}
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top])]
+        return {
+            "engine": self.name,
+            "predictions": [
+                {"tagName": labels[i], "probability": float(max(0.0, min(1.0, best[i])))}
+                for i in top
+            ]
+        }
+
+    def save(self, path: str):
+        """Atomically write the gallery (embeddings, row labels, tag names)."""
+        with self._lock:
+            matrix = self._matrix[:self._rows].copy()
+            row_labels = self._row_labels[:self._rows].copy()
+            labels = np.array(self._labels, dtype=str)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz")
+        os.close(fd)
+        try:
+            np.savez(tmp, embeddings=matrix, row_labels=row_labels, labels=labels)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def load(self, path: str):
+        with np.load(path, allow_pickle=False) as z:
+            matrix = np.ascontiguousarray(z["embeddings"], dtype=np.float32)
+            row_labels = z["row_labels"].astype(np.int32)
+            labels = [str(x) for x in z["labels"]]
+        with self._lock:
+            self._matrix, self._row_labels = matrix, row_labels
+            self._rows = len(matrix)
+            self._labels = labels
+            self._label_index = {name: i for i, name in enumerate(labels)}
+        logging.info(f"Local recognizer loaded {self._rows} embeddings for {len(labels)} tags from {path}")
@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+import requests
+
+FUNCTIONS_API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Tests import the flat handler-side modules (cv_client, frame_cache, ...) directly,
+# and the stand-ins and load generator from benchmarks/
+sys.path.insert(0, FUNCTIONS_API)
+sys.path.insert(0, os.path.join(FUNCTIONS_API, "benchmarks"))
+
+from standins import FakeCosmosContainer  # noqa: E402
+
+# Shared fakes and helpers below are imported by test modules (from conftest import ...)
+
+
+class Reply:
+    """A requests.Response stand-in: status, JSON body and headers."""
+
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body if body is not None else {}
+        self.text = str(self._body)
+        self.ok = status_code < 400
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code}")
+
+
+def seeded_container(name, docs=(), partition_key="/id"):
+    """A FakeCosmosContainer holding `docs`."""
+    container = FakeCosmosContainer(name, partition_key)
+    container.seed(docs)
+    return container
+
+
+def wait_for(predicate, timeout=5.0):
+    """Poll `predicate` until it holds; False when `timeout` passes first."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
@@ -0,0 +1,71 @@
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+def unit(rows: np.ndarray) -> np.ndarray:
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+def clustered(n=2000, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    return unit(centres[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim)))
+
+
+def exact(vectors, query, k):
+    return set(np.argsort(-(vectors @ query))[:k])
+
+
+def test_recall_against_exact_search():
+    vectors = clustered()
+    index = IVFIndex(dim=32, nlist=32, nprobe=8)
+    index.train(vectors, np.arange(len(vectors)))
+    rng = np.random.default_rng(1)
+    hits = 0
+    for q in rng.choice(len(vectors), 50, replace=False):
+        ids, sims = index.search(vectors[q], k=10)
+        assert ids[0] == q and np.all(np.diff(sims) <= 0)
+        hits += len(exact(vectors, vectors[q], 10) & set(ids))
+    assert hits / 500 >= 0.9
+
+
+def test_probing_every_list_is_exact():
+    vectors = clustered(n=500)
+    index = IVFIndex(dim=32, nlist=16)
+    index.train(vectors, np.arange(500))
+    query = vectors[7]
+    ids, _ = index.search(query, k=10, nprobe=16)
+    assert set(ids) == exact(vectors, query, 10)
+
+
+def test_pending_inserts_are_searchable_and_merge_in_batches():
+    vectors = clustered(n=600)
+    index = IVFIndex(dim=32, nlist=8, merge_fraction=0.1, min_merge=20)
+    index.train(vectors[:500], np.arange(500))
+    merged = [index.add(vectors[i], i) for i in range(500, 519)]
+    assert not any(merged) and len(index) == 519
+    assert index.search(vectors[510], k=1)[0][0] == 510
+    assert index.add(vectors[519:560], np.arange(519, 560))
+    assert len(index.ids) == 560 and index.search(vectors[540], k=1)[0][0] == 540
+
+
+def test_untrained_index_scans_pending_vectors():
+    vectors = clustered(n=10)
+    index = IVFIndex(dim=32)
+    index.add(vectors, np.arange(100, 110))
+    ids, _ = index.search(vectors[3], k=2)
+    assert ids[0] == 103
+
+
+def test_save_and_memory_mapped_load(tmp_path):
+    vectors = clustered(n=300)
+    index = IVFIndex(dim=32, nlist=8, min_merge=1000)
+    index.train(vectors[:290], np.arange(290))
+    index.add(vectors[290:], np.arange(290, 300))
+    index.save(str(tmp_path))
+    loaded = IVFIndex.load(str(tmp_path), nprobe=8)
+    assert len(loaded) == 300 and isinstance(loaded.vectors, np.memmap)
+    for q in (5, 295):
+        assert loaded.search(vectors[q], k=1)[0][0] == q
+    assert IVFIndex.load(str(tmp_path / "missing")) is None
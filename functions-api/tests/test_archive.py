@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import os
+import threading
+from datetime import date, datetime
+
+from azure.core.exceptions import ServiceResponseError
+
+from archive import BlobArchiver, content_blob_name, upload_if_absent, upload_if_absent_async
+
+from conftest import wait_for
+from standins import FakeBlobContainer
+
+
+class FlakyContainer(FakeBlobContainer):
+    """Fails the first `failures` uploads."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def upload_blob(self, name, data, overwrite=False, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ServiceResponseError("connection reset")
+        return super().upload_blob(name, data, overwrite=overwrite, **kwargs)
+
+
+class GatedContainer(FakeBlobContainer):
+    """Holds uploads until `gate` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def upload_blob(self, name, data, overwrite=False, **kwargs):
+        self.gate.wait(5)
+        return super().upload_blob(name, data, overwrite=overwrite, **kwargs)
+
+
+class AsyncContainer:
+    def __init__(self, container):
+        self.container = container
+
+    async def upload_blob(self, name, data, **kwargs):
+        return self.container.upload_blob(name, data, **kwargs)
+
+
+def test_blob_name_is_the_date_folder_and_content_hash():
+    digest = hashlib.sha256(b"jpeg").hexdigest()
+    assert content_blob_name("mark", b"jpeg", date(2024, 6, 1)) == f"mark/2024-06-01/{digest}.jpg"
+    assert content_blob_name("mark", b"jpeg") == f"mark/{datetime.utcnow().date()}/{digest}.jpg"
+    assert content_blob_name("mark", b"jpeg") == content_blob_name("mark", bytearray(b"jpeg"))
+
+
+def test_identical_uploads_are_written_once():
+    container = FakeBlobContainer()
+    assert upload_if_absent(container, "mark/a.jpg", b"1") is True
+    assert upload_if_absent(container, "mark/a.jpg", b"1") is False
+    assert asyncio.run(upload_if_absent_async(AsyncContainer(container), "mark/a.jpg", b"1")) is False
+    assert asyncio.run(upload_if_absent_async(AsyncContainer(container), "mark/b.jpg", b"2")) is True
+
+
+def test_spooled_images_are_uploaded_and_removed(tmp_path):
+    container = FakeBlobContainer()
+    archiver = BlobArchiver(container, str(tmp_path), workers=2)
+    names = [archiver.put(content_blob_name("mark", bytes([i])), bytes([i])) for i in range(10)]
+    archiver.put(names[0], bytes([0]))  # resubmission of the same frame
+    archiver.close()
+    assert sorted(container.blobs) == sorted(names)
+    assert archiver.stats()["uploaded"] == 10
+    assert not any(files for _, _, files in os.walk(tmp_path))
+
+
+def test_failed_uploads_retry_with_backoff(tmp_path):
+    container = FlakyContainer(failures=2)
+    archiver = BlobArchiver(container, str(tmp_path), workers=1, retry_backoff=0.01)
+    archiver.put("mark/a.jpg", b"1")
+    assert wait_for(lambda: "mark/a.jpg" in container.blobs)
+    archiver.close()
+    assert archiver.stats()["failed"] == 0
+
+
+def test_gives_up_after_max_attempts_and_replays_on_the_next_start(tmp_path):
+    archiver = BlobArchiver(FlakyContainer(failures=100), str(tmp_path), workers=1, max_attempts=2,
+                            retry_backoff=0.01)
+    archiver.put("mark/a.jpg", b"1")
+    assert wait_for(lambda: archiver.stats()["failed"] == 1)
+    archiver.close()
+    assert (tmp_path / "mark" / "a.jpg").exists()
+
+    container = FakeBlobContainer()
+    restarted = BlobArchiver(container, str(tmp_path), workers=1)
+    restarted.close()
+    assert container.blobs == {"mark/a.jpg": b"1"}
+
+
+def test_blobs_already_stored_are_skipped(tmp_path):
+    container = FakeBlobContainer()
+    container.upload_blob("mark/a.jpg", b"1")
+    archiver = BlobArchiver(container, str(tmp_path), workers=1)
+    archiver.put("mark/a.jpg", b"1")
+    archiver.close()
+    assert archiver.stats()["skipped"] == 1 and archiver.stats()["uploaded"] == 0
+
+
+def test_put_during_an_upload_is_spooled_again_not_lost(tmp_path):
+    container = GatedContainer()
+    archiver = BlobArchiver(container, str(tmp_path), workers=1)
+    archiver.put("mark/a.jpg", b"1")
+    assert wait_for(lambda: not (tmp_path / "mark" / "a.jpg").exists())  # claimed by the worker
+
+    archiver.put("mark/a.jpg", b"1")
+    assert (tmp_path / "mark" / "a.jpg").exists()
+    container.gate.set()
+    archiver.close()
+    assert container.blobs == {"mark/a.jpg": b"1"}
+    assert archiver.stats() == {"queueDepth": 0, "uploaded": 1, "skipped": 1, "failed": 0}
+    assert not any(files for _, _, files in os.walk(tmp_path))
+
+
+def test_claim_left_by_a_crash_is_replayed(tmp_path):
+    (tmp_path / "mark").mkdir()
+    (tmp_path / "mark" / "a.jpg.1234.claim").write_bytes(b"1")
+    container = FakeBlobContainer()
+    archiver = BlobArchiver(container, str(tmp_path), workers=1)
+    archiver.close()
+    assert container.blobs == {"mark/a.jpg": b"1"}
+    assert not any(files for _, _, files in os.walk(tmp_path))
@@ -0,0 +1,65 @@
+import threading
+from datetime import date
+
+from attendance_index import DailyMarkIndex, attendance_id
+
+MON, TUE = date(2024, 6, 3), date(2024, 6, 4)
+
+
+class Loader:
+    def __init__(self, days):
+        self.days = days
+        self.calls = []
+
+    def __call__(self, day):
+        self.calls.append(day)
+        return list(self.days.get(day, []))
+
+
+def test_attendance_id_is_one_per_user_per_day():
+    assert attendance_id("u1", MON) == "att-u1-20240603"
+    assert attendance_id("u1", MON) != attendance_id("u1", TUE)
+
+
+def test_day_is_loaded_once_and_the_earliest_record_wins():
+    loader = Loader({MON: [{"userId": "u1", "id": "first"}, {"userId": "u1", "id": "later"}]})
+    index = DailyMarkIndex(loader)
+    assert index.get("u1", MON)["id"] == "first"
+    assert index.get("u2", MON) is None
+    assert loader.calls == [MON]
+
+
+def test_new_day_replaces_the_previous_one():
+    loader = Loader({MON: [{"userId": "u1"}]})
+    index = DailyMarkIndex(loader)
+    index.get("u1", MON)
+    assert index.get("u1", TUE) is None
+    assert loader.calls == [MON, TUE] and len(index) == 0
+
+
+def test_add_keeps_the_first_mark():
+    index = DailyMarkIndex(Loader({}))
+    index.add({"userId": "u1", "id": "a"}, MON)
+    index.add({"userId": "u1", "id": "b"}, MON)
+    assert index.get("u1", MON)["id"] == "a"
+
+
+def test_only_one_concurrent_claim_wins():
+    index = DailyMarkIndex(Loader({}))
+    records = [{"userId": "u1", "id": f"r{i}"} for i in range(16)]
+    results = [None] * len(records)
+    barrier = threading.Barrier(len(records))
+
+    def claim(i):
+        barrier.wait()
+        results[i] = index.claim(records[i], MON)
+
+    threads = [threading.Thread(target=claim, args=(i,)) for i in range(len(records))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    winners = [r for r, res in zip(records, results) if res is None]
+    assert len(winners) == 1
+    assert all(res is winners[0] for res in results if res is not None)
+    assert index.get("u1", MON) is winners[0]
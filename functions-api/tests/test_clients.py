@@ -0,0 +1,47 @@
+import threading
+import time
+
+import clients
+from clients import LazyClient
+
+
+class Built:
+    value = 42
+
+
+def test_factory_runs_once_on_first_attribute_access():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.02)
+        return Built()
+
+    client = LazyClient(factory, "test")
+    assert not client.built and calls == []
+    threads = [threading.Thread(target=lambda: client.value) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == [1] and client.built
+    assert "built" in repr(client)
+
+
+def test_installed_client_replaces_the_factory():
+    client = LazyClient(lambda: 1 / 0, "test")
+    stand_in = Built()
+    client.install(stand_in)
+    assert client.resolve() is stand_in and client.value == 42
+
+
+def test_container_clients_are_charged_and_named_by_setting(monkeypatch):
+    class Database:
+        def get_container_client(self, name):
+            return Built()
+
+    monkeypatch.setenv("COSMOS_USERS_CONTAINER", "users")
+    monkeypatch.setattr(clients, "cosmos_database", LazyClient(Database, "db"))
+    users = clients.cosmos_container("COSMOS_USERS_CONTAINER")
+    assert repr(users.resolve()) == "<ChargedContainer users>"
+    assert users.value == 42
@@ -0,0 +1,66 @@
+import logging
+
+from conftest import seeded_container
+from cosmos_ru import BACKGROUND, ChargedContainer, CosmosCharges, query_shape
+from timing import Metrics
+
+
+def attendance(n=250):
+    return seeded_container("attendance", ({"id": f"a{i}", "userId": f"u{i}", "localDate": "2024-06-01"}
+                                           for i in range(n)), "/localDate")
+
+
+def test_query_shape_hides_parameter_values():
+    assert query_shape("SELECT *\n   FROM c WHERE c.localDate = @d") == "SELECT * FROM c WHERE c.localDate = @d"
+    assert query_shape({"query": " SELECT  1 "}) == "SELECT 1"
+
+
+def test_query_pages_are_summed_per_call_and_shape():
+    charges = CosmosCharges(warn_ru=0)
+    att = ChargedContainer(attendance(), charges, "attendance")
+    rows = list(att.query_items(query="SELECT * FROM c WHERE c.localDate = @d",
+                                parameters=[{"name": "@d", "value": "2024-06-01"}],
+                                partition_key="2024-06-01", max_item_count=100))
+    assert len(rows) == 250
+    [row] = charges.snapshot()
+    assert (row["endpoint"], row["operation"], row["calls"], row["pages"]) == (BACKGROUND, "query_items", 1, 3)
+    assert row["query"] == "SELECT * FROM c WHERE c.localDate = @d"
+    assert row["ru"] > 0 and row["maxRu"] == row["ru"]
+
+
+def test_request_charges_land_on_its_endpoint_and_server_timing():
+    charges = CosmosCharges()
+    att = ChargedContainer(attendance(1), charges, "attendance")
+    registry = Metrics()
+    timing = registry.begin("markAttendance")
+    att.read_item("a0", partition_key="2024-06-01")
+    header = registry.finish(timing)
+    assert charges.snapshot()[0]["endpoint"] == "markAttendance"
+    assert 'cosmos_ru;desc="1"' in header
+
+
+def test_callers_own_response_hook_still_runs():
+    seen = []
+    att = ChargedContainer(attendance(1), CosmosCharges(), "attendance")
+    att.read_item("a0", partition_key="2024-06-01", response_hook=lambda h, r: seen.append(r["id"]))
+    assert seen == ["a0"]
+
+
+def test_expensive_calls_are_flagged_once(caplog):
+    charges = CosmosCharges(warn_ru=5)
+    att = ChargedContainer(attendance(250), charges, "attendance")
+    with caplog.at_level(logging.WARNING):
+        list(att.query_items(query="SELECT * FROM c", enable_cross_partition_query=True, max_item_count=50))
+    assert charges.snapshot()[0]["expensive"] == 1
+    assert len([r for r in caplog.records if "passed 5 RU" in r.getMessage()]) == 1
+
+
+def test_uncharged_attributes_pass_through_and_exposition_renders():
+    charges = CosmosCharges()
+    container = attendance(1)
+    att = ChargedContainer(container, charges, "attendance")
+    assert att.id == "attendance" and att.seed == container.seed
+    att.read_item("a0", partition_key="2024-06-01")
+    lines = charges.exposition("att")
+    assert any(line.startswith('att_cosmos_calls_total{endpoint="background",container="attendance",'
+                               'operation="read_item"') and line.endswith(" 1") for line in lines)
@@ -0,0 +1,128 @@
+import pytest
+import requests
+
+import cv_client
+from conftest import Reply
+from cv_client import CircuitBreaker, CircuitOpenError, CustomVisionClient
+
+
+class FakeSession:
+    """Answers requests from a script; an exception in the script is raised."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, kwargs))
+        step = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(step, BaseException):
+            raise step
+        return step
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(cv_client.time, "sleep", slept.append)
+    return slept
+
+
+def client(session, **options):
+    return CustomVisionClient("http://cv", "http://cv/customvision/v3.3/training", "proj", "iter",
+                              "pkey", "tkey", session=session, **options)
+
+
+def test_urls_and_headers_are_built_once():
+    cv = client(FakeSession(Reply()))
+    assert cv.predict_url == "http://cv/customvision/v3.0/Prediction/proj/classify/iterations/iter/image"
+    assert cv.tags_url == "http://cv/customvision/v3.3/training/projects/proj/tags"
+    assert cv.predict_headers["Prediction-Key"] == "pkey"
+
+
+def test_transient_statuses_and_connection_errors_are_retried(sleeps):
+    session = FakeSession(Reply(503), requests.exceptions.ConnectionError("reset"),
+                          Reply(200, {"predictions": []}))
+    assert client(session).predict(b"jpeg") == {"predictions": []}
+    assert len(session.calls) == 3
+    assert len(sleeps) == 2 and all(0 <= s <= 0.5 for s in sleeps)
+
+
+def test_retry_after_is_honoured_and_too_long_a_wait_is_not(sleeps):
+    session = FakeSession(Reply(429, headers={"Retry-After": "2"}), Reply(200))
+    client(session).request("GET", "http://cv/x", 1)
+    assert sleeps == [2.0]
+
+    session = FakeSession(Reply(429, headers={"Retry-After": "120"}))
+    r = client(session, max_retry_after=30).request("GET", "http://cv/x", 1)
+    assert r.status_code == 429 and len(session.calls) == 1
+
+
+def test_client_errors_are_returned_without_retrying(sleeps):
+    session = FakeSession(Reply(400))
+    assert client(session).request("GET", "http://cv/x", 1).status_code == 400
+    assert len(session.calls) == 1 and sleeps == []
+
+
+def test_retries_are_bounded_and_the_last_error_is_raised(sleeps):
+    session = FakeSession(requests.exceptions.Timeout("slow"))
+    with pytest.raises(requests.exceptions.Timeout):
+        client(session, max_retries=2).request("GET", "http://cv/x", 1)
+    assert len(session.calls) == 3
+
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast(sleeps):
+    session = FakeSession(Reply(503))
+    cv = client(session, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    cv.request("GET", "http://cv/x", 1)
+    cv.request("GET", "http://cv/x", 1)
+    assert cv.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        cv.request("GET", "http://cv/x", 1)
+    assert len(session.calls) == 2
+
+
+def test_half_open_breaker_lets_one_trial_through(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cv_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] += 30
+    assert breaker.state == "half-open"
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()  # failed trial re-opens
+    assert breaker.state == "open"
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_half_open_trial_failing_with_a_broken_response_reopens_the_breaker(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cv_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    now[0] += 30
+    session = FakeSession(requests.exceptions.ChunkedEncodingError("truncated"))
+    cv = client(session, breaker=breaker)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        cv.request("GET", "http://cv/x", 1)
+    assert breaker.state == "open"
+    now[0] += 30
+    session.script = [Reply(200)]
+    assert cv.request("GET", "http://cv/x", 1).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_interrupted_half_open_trial_is_released(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cv_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    now[0] += 30
+    cv = client(FakeSession(KeyboardInterrupt()), breaker=breaker)
+    with pytest.raises(KeyboardInterrupt):
+        cv.request("GET", "http://cv/x", 1)
+    assert breaker.state == "half-open" and breaker.allow()
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+import cv_client  # noqa: E402
+from cv_client import CircuitBreaker, CustomVisionClient  # noqa: E402
+from cv_client_aio import AsyncCustomVisionClient  # noqa: E402
+
+
+class Reply:
+    def __init__(self, status=200, body=b"{}", error=None, hang=False):
+        self.status = status
+        self.headers = {}
+        self.body = body
+        self.error = error
+        self.hang = hang
+
+    async def __aenter__(self):
+        if self.hang:
+            await asyncio.sleep(60)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, reply):
+        self.reply = reply
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        return self.reply
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cv_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    now[0] += 30
+    return breaker
+
+
+def client(breaker, reply):
+    base = CustomVisionClient("http://cv", "http://cv", "p", "i", "k", "k", breaker=breaker)
+    cv = AsyncCustomVisionClient(base)
+    cv._session = FakeSession(reply)
+    return cv
+
+
+def test_payload_error_on_the_trial_reopens_the_breaker(half_open):
+    cv = client(half_open, Reply(error=aiohttp.ClientPayloadError("truncated")))
+    with pytest.raises(aiohttp.ClientPayloadError):
+        asyncio.run(cv.request("GET", "http://cv/x", 1))
+    assert half_open.state == "open"
+
+
+def test_cancelled_trial_is_released(half_open):
+    cv = client(half_open, Reply(hang=True))
+
+    async def main():
+        task = asyncio.ensure_future(cv.request("GET", "http://cv/x", 1))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert half_open.state == "half-open" and half_open.allow()
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from conftest import Reply
+from cv_client import CustomVisionClient
+
+
+class TagService:
+    """GET /tags lists the known tags, POST /tags creates one (409 when it exists)."""
+
+    def __init__(self, tags=None, create_delay=0.0):
+        self.calls = []
+        self.tags = dict(tags or {})
+        self.create_delay = create_delay
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if method == "GET":
+            return Reply(200, [{"name": n, "id": i} for n, i in self.tags.items()])
+        name = kwargs["params"]["name"]
+        time.sleep(self.create_delay)
+        if name in self.tags:
+            return Reply(409, {"code": "BadRequestTagNameNotUnique"})
+        self.tags[name] = f"id-{name}"
+        return Reply(200, {"id": self.tags[name], "name": name})
+
+
+def client(session):
+    return CustomVisionClient("http://cv", "http://cv", "proj", "iter", "p", "t", session=session)
+
+
+def posts(session):
+    return sum(1 for method, *_ in session.calls if method == "POST")
+
+
+def gets(session):
+    return sum(1 for method, *_ in session.calls if method == "GET")
+
+
+def test_tags_are_listed_once_per_process():
+    session = TagService({"student-1": "id-1", "student-2": "id-2"})
+    cv = client(session)
+    assert cv.resolve_tag_id("student-1") == ("id-1", False)
+    assert cv.resolve_tag_id("student-2") == ("id-2", False)
+    assert gets(session) == 1 and posts(session) == 0
+
+
+def test_a_new_tag_is_created_once_and_cached():
+    session = TagService()
+    cv = client(session)
+    assert cv.resolve_tag_id("student-9") == ("id-student-9", True)
+    assert cv.resolve_tag_id("student-9") == ("id-student-9", False)
+    assert posts(session) == 1
+
+
+def test_concurrent_enrollments_share_one_create():
+    session = TagService(create_delay=0.05)
+    cv = client(session)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cv.resolve_tag_id("student-9")))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert posts(session) == 1
+    assert {tag_id for tag_id, _ in results} == {"id-student-9"}
+
+
+def test_tag_created_elsewhere_is_picked_up_after_a_conflict():
+    session = TagService()
+    cv = client(session)
+    cv.refresh_tags()
+    session.tags["student-3"] = "id-other-instance"
+    assert cv.resolve_tag_id("student-3") == ("id-other-instance", False)
+    assert gets(session) == 2
+
+
+def test_forgotten_tag_is_resolved_again():
+    session = TagService({"student-1": "id-1"})
+    cv = client(session)
+    cv.resolve_tag_id("student-1")
+    cv.forget_tag("student-1")
+    assert cv.cached_tag_id("student-1") is None
+    assert cv.resolve_tag_id("student-1") == ("id-1", False)
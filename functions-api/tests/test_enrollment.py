@@ -0,0 +1,122 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import Reply
+from cv_client import MAX_BATCH_IMAGES
+from enrollment import MAX_BATCH_REQUEST_IMAGES, enroll_batch, parse_batch
+
+JPEG = base64.b64encode(b"\xff\xd8jpeg\xff\xd9").decode()
+
+
+class FakeCV:
+    """Batch uploads answer positionally, without sourceUrl, like the real service for byte uploads."""
+
+    def __init__(self, fail_names=(), status_code=200):
+        self.fail_names = set(fail_names)
+        self.status_code = status_code
+        self.batches = []
+
+    def resolve_tag_id(self, label):
+        return f"tag-{label}", False
+
+    def upload_images_batch(self, images):
+        self.batches.append(images)
+        statuses = [{"status": "ErrorImageFormat" if i["name"] in self.fail_names else "OK"} for i in images]
+        return Reply(self.status_code, {"isBatchSuccessful": not self.fail_names, "images": statuses})
+
+
+def student(index, images=1):
+    return {"name": f"S{index}", "roll": f"R{index}", "userId": f"u{index}", "classLabel": f"c{index}",
+            "images": [JPEG] * images}
+
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(max_workers=4) as p:
+        yield p
+
+
+def run(students, cv, pool):
+    stored, upserted = [], []
+
+    def save_image(prefix, image, original=None):
+        stored.append(prefix)
+        return f"{prefix}/{len(stored)}.jpg"
+
+    valid, invalid = parse_batch({"students": students})
+    return enroll_batch(valid, save_image, upserted.append, cv, pool), invalid, upserted
+
+
+def test_parse_batch_strips_data_uri_and_reports_invalid_items():
+    body = {"students": [
+        {"name": "A", "roll": "1", "userId": "a", "classLabel": "a", "base64Image": "data:image/jpeg;base64," + JPEG},
+        {"name": "B", "userId": "b"},
+    ]}
+    valid, errors = parse_batch(body)
+    assert [s["images"] for s in valid] == [[base64.b64decode(JPEG)]]
+    assert errors == [{"index": 1, "userId": "b", "ok": False,
+                       "error": "name, roll, userId, classLabel and at least one image required"}]
+
+
+def test_parse_batch_rejects_too_many_images():
+    with pytest.raises(ValueError):
+        parse_batch({"students": [student(0, images=MAX_BATCH_REQUEST_IMAGES + 1)]})
+
+
+def test_results_are_matched_by_position_without_source_url(pool):
+    cv = FakeCV(fail_names={"1-1"})
+    results, invalid, upserted = run([student(0), student(1, images=2), student(2)], cv, pool)
+    assert invalid == []
+    assert [r["customVision"]["uploaded"] for r in results] == [1, 1, 1]
+    assert results[1]["customVision"]["failed"] == [{"image": "1-1", "status": "ErrorImageFormat"}]
+    assert all(r["ok"] for r in results)
+    assert sorted(u["userId"] for u in upserted) == ["u0", "u1", "u2"]
+
+
+def test_large_batches_are_chunked_and_every_chunk_is_accounted(pool):
+    cv = FakeCV()
+    results, _, _ = run([student(i) for i in range(MAX_BATCH_IMAGES + 3)], cv, pool)
+    assert [len(b) for b in cv.batches] == [MAX_BATCH_IMAGES, 3]
+    assert all(r["customVision"] == {"uploaded": 1, "failed": []} for r in results)
+
+
+def test_http_failure_marks_every_image_in_the_chunk(pool):
+    results, _, _ = run([student(0), student(1)], FakeCV(status_code=503), pool)
+    assert [r["customVision"]["failed"] for r in results] == [
+        [{"image": "0-0", "status": "HTTP 503"}], [{"image": "1-0", "status": "HTTP 503"}]]
+    # The users are still stored; only training failed
+    assert all(r["ok"] for r in results)
+
+
+def test_malformed_base64_rejects_only_that_student(pool):
+    students = [student(0), {**student(1), "images": ["abc"]}, student(2)]
+    cv = FakeCV()
+    results, invalid, upserted = run(students, cv, pool)
+    assert [(e["index"], e["userId"]) for e in invalid] == [(1, "u1")]
+    assert "base64" in invalid[0]["error"]
+    assert sorted(u["userId"] for u in upserted) == ["u0", "u2"]
+
+
+def test_image_failing_to_prepare_is_reported_and_the_rest_enrolled(pool):
+    cv = FakeCV()
+    stored = []
+
+    def prepare(image):
+        if image.startswith(b"bad"):
+            raise OSError("cannot identify image file")
+        return image, None, None
+
+    def save_image(prefix, image, original=None):
+        stored.append(image)
+        return f"{prefix}/{len(stored)}.jpg"
+
+    good = base64.b64decode(JPEG)
+    students, _ = parse_batch({"students": [student(0, images=2), student(1)]})
+    students[0]["images"][0] = students[1]["images"][0] = b"bad"
+    results = enroll_batch(students, save_image, lambda doc: None, cv, pool, prepare=prepare)
+    assert results[0]["ok"] and results[0]["imageErrors"][0]["image"] == "0-0"
+    assert [e["name"] for b in cv.batches for e in b] == ["0-1"]
+    assert results[1]["ok"] is False and results[1]["error"] == "no image could be prepared"
+    assert stored == [good]
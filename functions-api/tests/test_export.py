@@ -0,0 +1,118 @@
+import base64
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+
+from export import (EXPORT_MAX_DAYS, decode_token, encode_token, format_checkpoint, format_rows,
+                    iter_export, parse_range)
+
+
+class Pager:
+    """ItemPaged.by_page() stand-in: pages of `size`, continuation = next offset as a string."""
+
+    def __init__(self, rows, size, continuation):
+        self.rows = rows
+        self.size = size
+        self.offset = int(continuation or 0)
+        self.continuation_token = continuation
+
+    def __iter__(self):
+        while True:
+            page = self.rows[self.offset:self.offset + self.size]
+            self.offset += self.size
+            self.continuation_token = str(self.offset) if self.offset < len(self.rows) else None
+            yield page
+            if self.continuation_token is None:
+                return
+
+
+class Days:
+    """query_day() over {YYYY-MM-DD: [rows]}; every day answers with at least one (maybe empty) page."""
+
+    def __init__(self, days):
+        self.days = days
+
+    def __call__(self, local_date, newest_first=True, page_size=None):
+        rows = self.days.get(local_date, [])
+
+        class Query:
+            def by_page(self, continuation=None):
+                return Pager(rows, page_size, continuation)
+        return Query()
+
+
+def rows_for(day, n):
+    return [{"id": f"{day}-{i}", "localDate": day} for i in range(n)]
+
+
+DAYS = Days({"2024-06-01": rows_for("2024-06-01", 5), "2024-06-03": rows_for("2024-06-03", 2)})
+START, END = date(2024, 6, 1), date(2024, 6, 3)
+ALL_IDS = [r["id"] for d in ("2024-06-01", "2024-06-03") for r in DAYS.days[d]]
+
+
+def ymd(s):
+    return tuple(map(int, s.split("-")))
+
+
+def test_full_export_reads_days_in_order_and_ends_without_a_token():
+    pages = list(iter_export(DAYS, START, END, page_size=2))
+    assert [r["id"] for rows, _ in pages for r in rows] == ALL_IDS
+    assert pages[-1][1] is None
+
+
+def test_resuming_from_every_token_neither_skips_nor_repeats_rows():
+    pages = list(iter_export(DAYS, START, END, page_size=2))
+    seen = []
+    for i, (rows, token) in enumerate(pages):
+        seen.extend(r["id"] for r in rows)
+        if token is None:
+            continue
+        rest = [r["id"] for rows, _ in iter_export(DAYS, START, END, token, page_size=2) for r in rows]
+        assert seen + rest == ALL_IDS, f"resume after page {i}"
+
+
+def test_last_page_of_a_day_resumes_at_the_next_day():
+    pages = list(iter_export(DAYS, START, END, page_size=5))
+    assert decode_token(pages[0][1]) == (date(2024, 6, 2), None)
+
+
+def test_empty_day_still_advances():
+    pages = list(iter_export(DAYS, date(2024, 6, 2), date(2024, 6, 2), page_size=5))
+    assert pages == [([], None)]
+
+
+@pytest.mark.parametrize("token", ["not base64!", base64.urlsafe_b64encode(b"[1, 2]").decode(),
+                                   base64.urlsafe_b64encode(b'{"d": "2024-13-01"}').decode(), ""])
+def test_malformed_tokens_are_rejected(token):
+    with pytest.raises(ValueError):
+        decode_token(token)
+
+
+@pytest.mark.parametrize("day", [date(2024, 5, 31), date(2024, 6, 4)])
+def test_token_outside_the_requested_range_is_rejected(day):
+    with pytest.raises(ValueError):
+        list(iter_export(DAYS, START, END, encode_token(day, "2")))
+
+
+def test_parse_range_limits():
+    assert parse_range("2024-06-01", None, ymd) == (START, START)
+    with pytest.raises(ValueError):
+        parse_range("2024-06-03", "2024-06-01", ymd)
+    with pytest.raises(ValueError):
+        parse_range("2023-01-01", f"{2023 + EXPORT_MAX_DAYS // 365 + 1}-01-01", ymd)
+    with pytest.raises(ValueError):
+        parse_range("", "2024-06-01", ymd)
+
+
+def test_csv_and_ndjson_rendering():
+    rows = [{"id": "a", "name": "Ann, B", "confidence": 0.9, "extra": "dropped"}]
+    lines = list(csv.reader(io.StringIO(format_rows(rows, "csv", header=True))))
+    assert lines[0][:3] == ["id", "userId", "name"]
+    assert lines[1][:3] == ["a", "", "Ann, B"]
+    record = json.loads(format_rows(rows, "ndjson"))
+    assert record["name"] == "Ann, B" and "extra" not in record and record["userId"] is None
+    assert format_checkpoint("tok", "csv") == "#resume,tok\r\n"
+    assert json.loads(format_checkpoint("tok", "ndjson")) == {"_resume": "tok"}
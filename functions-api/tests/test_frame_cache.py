@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import frame_cache
+from frame_cache import FrameCache, dhash, hamming
+
+
+def kiosk_frame(person: int, noise: int = 0) -> bytes:
+    """A face in front of the same door and wall every time; `person` changes only the face."""
+    rng = np.random.default_rng(person)
+    w, h = 640, 480
+    img = Image.fromarray((np.linspace(60, 200, w)[None, :, None] * np.ones((h, 1, 3))).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, 120, h), fill=(40, 50, 70))
+    fw, fh = int(rng.integers(80, 110)), int(rng.integers(110, 150))
+    draw.ellipse((w // 2 - fw, h // 2 - fh, w // 2 + fw, h // 2 + fh),
+                 fill=tuple(int(v) for v in rng.integers(90, 230, 3)))
+    draw.chord((w // 2 - fw, h // 2 - fh, w // 2 + fw, h // 2), 180, 360,
+               fill=tuple(int(v) for v in rng.integers(10, 120, 3)))
+    pixels = np.asarray(img).astype(np.float32) + np.random.default_rng(1000 + noise).normal(0, 3, (h, w, 3))
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+MARK = {"ok": True, "userId": "u1", "name": "Student One"}
+LOW = {"ok": False, "reason": "low-confidence", "confidence": 0.4}
+
+
+def colliding_pair():
+    """Two different people whose whole-frame hashes fall within the old default distance (4)."""
+    frames = [kiosk_frame(p) for p in range(12)]
+    for i, a in enumerate(frames):
+        for b in frames[i + 1:]:
+            if hamming(dhash(a), dhash(b)) <= 4:
+                return a, b
+    pytest.skip("no whole-frame collision among the generated people")
+
+
+def test_successful_mark_is_never_replayed_to_the_next_person():
+    first, second = colliding_pair()
+    cache = FrameCache(max_distance=4, crop=1.0)  # the old, collision-prone settings
+    assert cache.store("kiosk-1", cache.hash(first), MARK) is False
+    assert cache.lookup("kiosk-1", cache.hash(second)) is None
+
+
+def test_identity_misses_are_not_cached():
+    cache = FrameCache()
+    assert cache.store("kiosk-1", 1, {"ok": False, "reason": "unknown-tag"}) is False
+    assert cache.lookup("kiosk-1", 1) is None
+
+
+def test_rejection_is_replayed_for_a_retry_of_the_same_frame():
+    cache = FrameCache()
+    frame = kiosk_frame(3)
+    assert cache.store("kiosk-1", cache.hash(frame), LOW) is True
+    assert cache.lookup("kiosk-1", cache.hash(kiosk_frame(3, noise=1))) == LOW
+    # Another kiosk never sees it
+    assert cache.lookup("kiosk-2", cache.hash(frame)) is None
+    assert cache.stats() == {"devices": 1, "hits": 1, "misses": 1}
+
+
+def test_centre_crop_separates_faces_on_a_shared_background():
+    first, second = colliding_pair()
+    cache = FrameCache()
+    assert hamming(cache.hash(first), cache.hash(second)) > cache.max_distance
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(frame_cache.time, "monotonic", lambda: now[0])
+    cache = FrameCache(ttl=15)
+    cache.store("kiosk-1", 0b1010, LOW)
+    now[0] += 14.9
+    assert cache.lookup("kiosk-1", 0b1010) == LOW
+    now[0] += 0.2
+    assert cache.lookup("kiosk-1", 0b1010) is None
+
+
+def test_least_recently_used_device_is_evicted():
+    cache = FrameCache(max_devices=2)
+    for device in ("a", "b"):
+        cache.store(device, 7, LOW)
+    cache.lookup("a", 7)
+    cache.store("c", 7, LOW)
+    assert cache.lookup("b", 7) is None
+    assert cache.lookup("a", 7) == LOW
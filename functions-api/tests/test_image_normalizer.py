@@ -0,0 +1,65 @@
+import io
+
+from PIL import Image
+
+from imaging import ImageNormalizer
+
+
+def encode(img: Image.Image, fmt="JPEG", orientation=None) -> bytes:
+    buf = io.BytesIO()
+    kwargs = {}
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        kwargs["exif"] = exif.tobytes()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def size_of(data: bytes):
+    with Image.open(io.BytesIO(data)) as img:
+        return img.size
+
+
+def test_small_upright_jpeg_keeps_its_bytes():
+    data = encode(Image.new("RGB", (320, 240), (90, 120, 150)))
+    out, img = ImageNormalizer(max_side=640).normalize(data)
+    assert out is data
+    assert img.size == (320, 240)
+
+
+def test_large_frames_are_downscaled_to_max_side():
+    out, img = ImageNormalizer(max_side=640).normalize(encode(Image.new("RGB", (1920, 1080), (10, 200, 30))))
+    assert max(size_of(out)) == 640
+    assert img.size == size_of(out)
+
+
+def test_exif_rotation_is_applied():
+    data = encode(Image.new("RGB", (300, 200), (50, 50, 50)), orientation=6)
+    out, _ = ImageNormalizer(max_side=640).normalize(data)
+    assert out is not data
+    assert size_of(out) == (200, 300)
+
+
+def test_png_is_reencoded_as_jpeg():
+    out, _ = ImageNormalizer().normalize(encode(Image.new("RGB", (100, 100)), fmt="PNG"))
+    with Image.open(io.BytesIO(out)) as img:
+        assert img.format == "JPEG"
+
+
+def test_centre_crop_is_square():
+    out, _ = ImageNormalizer(max_side=640, crop=0.5).normalize(encode(Image.new("RGB", (800, 600))))
+    assert size_of(out) == (300, 300)
+
+
+def test_disabled_or_undecodable_input_is_returned_as_is():
+    assert ImageNormalizer(enabled=False).normalize(b"xyz") == (b"xyz", None)
+    assert ImageNormalizer().normalize(b"not an image") == (b"not an image", None)
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("IMAGE_MAX_SIDE", "320")
+    monkeypatch.setenv("IMAGE_JPEG_QUALITY", "200")
+    monkeypatch.setenv("IMAGE_KEEP_ORIGINAL", "1")
+    normalizer = ImageNormalizer.from_env()
+    assert (normalizer.max_side, normalizer.quality, normalizer.keep_original) == (320, 95, True)
@@ -0,0 +1,48 @@
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+from imaging import decode_grayscale, image_bytes, media_type, strip_data_uri
+
+
+def jpeg(size=(64, 48), color=(200, 100, 50)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_data_uri_prefix_is_stripped():
+    assert strip_data_uri("data:image/jpeg;base64,QUJD") == "QUJD"
+    assert strip_data_uri("QUJD") == "QUJD"
+    assert strip_data_uri(b"data:raw") == b"data:raw"
+
+
+def test_raw_bytes_pass_through_without_a_copy():
+    data = jpeg()
+    assert image_bytes(data) is data
+    view = memoryview(data)
+    assert image_bytes(view) is view
+
+
+def test_base64_with_or_without_prefix_is_decoded():
+    data = jpeg()
+    encoded = base64.b64encode(data).decode()
+    assert image_bytes(encoded) == data
+    assert image_bytes("data:image/jpeg;base64," + encoded) == data
+
+
+def test_media_type_drops_parameters_and_case():
+    assert media_type("Multipart/Form-Data; boundary=xyz") == "multipart/form-data"
+    assert media_type("image/jpeg") == "image/jpeg"
+    assert media_type(None) == ""
+
+
+def test_decode_grayscale_from_bytes_or_image_with_resize():
+    data = jpeg(color=(255, 255, 255))
+    g = decode_grayscale(data, (16, 8))
+    assert g.shape == (8, 16) and g.dtype == np.float32
+    assert g.mean() > 250
+    with Image.open(io.BytesIO(data)) as img:
+        assert decode_grayscale(img).shape == (48, 64)
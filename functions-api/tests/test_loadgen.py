@@ -0,0 +1,49 @@
+import pytest
+
+from loadgen import check_slos, find_knee, parse_mix, parse_ramp, parse_slo, summarize
+
+
+def test_parse_mix_ramp_and_slo():
+    assert parse_mix("markAttendance=3, listUsers, usersSummary=0") == {"markAttendance": 3.0, "listUsers": 1.0}
+    assert parse_ramp("1,2,,4") == [1, 2, 4]
+    assert parse_slo("markAttendance:p99.9=2000") == ("markAttendance", 99.9, 2000.0)
+    assert parse_slo("*:p95=100") == ("*", 95.0, 100.0)
+    for bad in (lambda: parse_mix("nope=1"), lambda: parse_mix("listUsers=0"),
+                lambda: parse_ramp("0"), lambda: parse_slo("listUsers:p95")):
+        with pytest.raises(ValueError):
+            bad()
+
+
+def samples():
+    # (endpoint, seconds, status, server seconds, outcome)
+    ok = [("markAttendance", 0.1 + i / 1000, 200, 0.09, "marked") for i in range(98)]
+    return ok + [("markAttendance", 2.0, 503, None, None), ("listUsers", 0.05, 200, 0.04, None)]
+
+
+def test_summarize_counts_errors_and_percentiles():
+    result = summarize(samples(), seconds=10)
+    assert (result["requests"], result["errors"], result["errorRate"]) == (100, 1, 0.01)
+    assert result["throughput"] == 9.9
+    assert result["p50Ms"] < result["p99Ms"] <= result["maxMs"] == 2000.0
+    assert result["statuses"] == {"200": 99, "503": 1}
+    assert result["outcomes"] == {"marked": 98}
+
+
+def test_slo_rows_use_per_endpoint_results():
+    data = samples()
+    results = {"all": summarize(data, 10),
+               "endpoints": {"markAttendance": summarize(data[:-1], 10), "listUsers": summarize(data[-1:], 10)}}
+    rows = check_slos(data, results, [parse_slo("markAttendance:p95=500"), parse_slo("listUsers:p99.9=10"),
+                                      parse_slo("getAttendance:p95=1")], max_error_rate=0.005)
+    assert [(r["slo"], r["ok"]) for r in rows] == [
+        ("markAttendance:p95<=500ms", True), ("listUsers:p99.9<=10ms", False), ("errorRate<=0.005", False)]
+
+
+def test_knee_is_the_best_power_and_slo_limit_is_reported():
+    def step(clients, throughput, mean, ok):
+        return {"clients": clients, "sloOk": ok, "all": {"throughput": throughput, "meanMs": mean, "p95Ms": mean * 2}}
+
+    knee = find_knee([step(1, 10, 100, True), step(2, 19, 105, True), step(4, 30, 200, True),
+                      step(8, 32, 400, False)])
+    assert knee["kneeClients"] == 2
+    assert (knee["maxSloClients"], knee["firstSloBreachClients"]) == (4, 8)
@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from quality_gate import FrameQualityGate
+
+
+def jpeg(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def scene(brightness: int = 0) -> Image.Image:
+    """A textured, well-lit frame; `brightness` shifts every pixel."""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(60, 190, (240, 320)).astype(np.int16)
+    img = Image.fromarray(pixels.astype(np.uint8)).resize((640, 480), Image.NEAREST).convert("RGB")
+    ImageDraw.Draw(img).ellipse((220, 120, 420, 380), fill=(200, 170, 150), outline=(20, 20, 20), width=6)
+    shifted = np.clip(np.asarray(img).astype(np.int16) + brightness, 0, 255).astype(np.uint8)
+    return Image.fromarray(shifted)
+
+
+def test_good_frame_passes_and_is_counted():
+    gate = FrameQualityGate()
+    assert gate.check(jpeg(scene())) is None
+    assert gate.stats()["passed"] == 1
+
+
+def test_covered_lens_is_dark_and_flat():
+    gate = FrameQualityGate()
+    result = gate.check(jpeg(Image.new("RGB", (640, 480), (5, 5, 5))))
+    assert {"dark", "flat"} <= set(result["failed"])
+    assert result["brightness"] < 40
+    assert gate.stats()["rejected"]["dark"] == 1
+
+
+def test_blown_out_frame_is_bright():
+    result = FrameQualityGate().check(jpeg(scene(brightness=200)))
+    assert "bright" in result["failed"]
+
+
+def test_motion_blur_is_blurry_but_not_flat():
+    gate = FrameQualityGate()
+    sharp = gate.measure(scene())
+    blurred = gate.check(jpeg(scene().filter(ImageFilter.GaussianBlur(12))))
+    assert blurred["failed"] == ["blurry"]
+    assert blurred["sharpness"] < sharp["sharpness"]
+
+
+def test_zero_threshold_disables_that_check():
+    gate = FrameQualityGate(min_sharpness=0)
+    assert gate.check(jpeg(scene().filter(ImageFilter.GaussianBlur(12)))) is None
+
+
+def test_disabled_gate_and_undecodable_frames_pass_through():
+    assert FrameQualityGate(enabled=False).check(b"not a jpeg") is None
+    gate = FrameQualityGate()
+    assert gate.check(b"not a jpeg") is None
+    assert gate.stats()["passed"] == 0
+
+
+def test_decoded_images_are_accepted():
+    assert FrameQualityGate().check(scene()) is None
+
+
+def test_from_env_reads_thresholds(monkeypatch):
+    monkeypatch.setenv("QUALITY_MIN_BRIGHTNESS", "10")
+    monkeypatch.setenv("QUALITY_GATE", "false")
+    gate = FrameQualityGate.from_env()
+    assert gate.thresholds()["minBrightness"] == 10.0
+    assert gate.enabled is False
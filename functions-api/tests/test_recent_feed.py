@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+from recent_feed import ChangeFeedFollower, RecentFeed
+from standins import FakeCosmosContainer
+
+DAY = "2024-06-01"
+
+
+def checkin(i, ts=None):
+    return {"id": f"att-u{i}", "userId": f"u{i}", "name": f"Student {i}", "localDate": DAY,
+            "_ts": ts or 1717200000 + i}
+
+
+def test_seed_is_newest_first_and_cursor_returns_only_newer_items():
+    feed = RecentFeed(lambda: [checkin(2), checkin(1)], capacity=10)
+    assert [r["id"] for r in feed.recent()] == ["att-u2", "att-u1"]
+    cursor = feed.cursor()
+    feed.append(checkin(3))
+    result = feed.after(cursor)
+    assert (result["reset"], [r["id"] for r in result["items"]]) == (False, ["att-u3"])
+    assert feed.after(result["cursor"])["items"] == []
+
+
+def test_cursor_from_another_instance_resets_to_the_full_buffer():
+    feed = RecentFeed(capacity=3)
+    for i in range(5):
+        feed.append(checkin(i))
+    result = feed.after(RecentFeed().cursor())
+    assert result["reset"] is True
+    assert [r["id"] for r in result["items"]] == ["att-u2", "att-u3", "att-u4"]
+
+
+def test_checkins_written_on_another_instance_arrive_through_the_change_feed():
+    container = FakeCosmosContainer("attendance", "/localDate")
+    a = RecentFeed(capacity=50, follower=ChangeFeedFollower(container, lambda: DAY), poll_interval=0.1)
+    b = RecentFeed(capacity=50, follower=ChangeFeedFollower(container, lambda: DAY), poll_interval=0.1)
+    a.recent(), b.recent()  # start following from now
+
+    row = checkin(7, ts=int(time.time()))
+    container.create_item(row)
+    a.append(row)           # instance A handled the check-in
+    time.sleep(0.15)
+
+    assert [r["id"] for r in b.recent()] == ["att-u7"]
+    assert [r["id"] for r in a.recent()] == ["att-u7"]  # not duplicated by its own change feed
+
+
+def test_append_before_the_first_read_does_not_seed_and_is_merged_by_it():
+    seeds = []
+
+    def loader():
+        seeds.append(1)
+        return [checkin(2), checkin(1)]
+
+    feed = RecentFeed(loader, capacity=10)
+    feed.append(checkin(3))
+    feed.append(checkin(3))
+    feed.append(checkin(2))  # also in the seed
+    assert seeds == []
+    assert [r["id"] for r in feed.recent()] == ["att-u3", "att-u2", "att-u1"]
+    assert seeds == [1]
+
+
+def test_append_skips_a_record_the_change_feed_delivered_first():
+    container = FakeCosmosContainer("attendance", "/localDate")
+    feed = RecentFeed(capacity=50, follower=ChangeFeedFollower(container, lambda: DAY), poll_interval=0.1)
+    feed.recent()
+    row = checkin(7, ts=int(time.time()))
+    container.create_item(row)
+    time.sleep(0.15)
+    assert [r["id"] for r in feed.recent()] == ["att-u7"]
+    cursor = feed.cursor()
+    assert feed.append(row) == cursor
+    assert [r["id"] for r in feed.recent()] == ["att-u7"]
+
+
+def test_follower_starts_a_new_day_from_its_beginning():
+    container = FakeCosmosContainer("attendance", "/localDate")
+    today = [DAY]
+    follower = ChangeFeedFollower(container, lambda: today[0])
+    follower.poll()
+    container.create_item({**checkin(1), "localDate": "2024-06-02", "_ts": 1})
+    today[0] = "2024-06-02"
+    assert [r["id"] for r in follower.poll()] == ["att-u1"]
+    assert follower.poll() == []
+
+
+def test_async_waiters_park_on_the_loop_and_wake_on_append():
+    feed = RecentFeed(capacity=10)
+    cursor = feed.cursor()
+
+    async def main():
+        waiters = [asyncio.create_task(feed.wait_after_async(cursor, timeout=5)) for _ in range(100)]
+        await asyncio.sleep(0.1)
+        assert threading.active_count() < 20  # no thread per waiter
+        threading.Thread(target=feed.append, args=(checkin(1),)).start()
+        started = time.monotonic()
+        results = await asyncio.gather(*waiters)
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(main())
+    assert elapsed < 1.0
+    assert all([r["id"] for r in result["items"]] == ["att-u1"] for result in results)
+
+
+def test_async_wait_times_out_empty():
+    feed = RecentFeed(capacity=10)
+    result = asyncio.run(feed.wait_after_async(feed.cursor(), timeout=0.2))
+    assert result["items"] == [] and result["reset"] is False
+
+
+def test_sync_wait_returns_when_another_thread_appends():
+    feed = RecentFeed(capacity=10)
+    cursor = feed.cursor()
+    threading.Timer(0.1, feed.append, args=(checkin(1),)).start()
+    result = feed.wait_after(cursor, timeout=5)
+    assert [r["id"] for r in result["items"]] == ["att-u1"]
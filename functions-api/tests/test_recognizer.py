@@ -0,0 +1,79 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from recognizer import LocalEmbeddingRecognizer, Recognizer
+
+
+def jpeg(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (96, 96, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def test_incomplete_engine_fails_at_construction():
+    class PredictOnly(Recognizer):
+        def predict(self, data):
+            return {"predictions": []}
+
+    with pytest.raises(TypeError):
+        PredictOnly()
+
+
+def test_enroll_many_writes_the_gallery_once(tmp_path, monkeypatch):
+    rec = LocalEmbeddingRecognizer(path=str(tmp_path / "gallery.npz"))
+    saves = []
+    real_save = rec.save
+    monkeypatch.setattr(rec, "save", lambda path: (saves.append(path), real_save(path)))
+
+    results = rec.enroll_many([(jpeg(i), f"tag-{i % 3}") for i in range(9)])
+
+    assert len(saves) == 1
+    assert [r["row"] for r in results] == list(range(9))
+    assert all(r["galleryImages"] == 9 for r in results)
+    reloaded = LocalEmbeddingRecognizer(path=str(tmp_path / "gallery.npz"))
+    assert reloaded.size == 9
+
+
+def test_enroll_many_reports_bad_images_and_keeps_the_rest(tmp_path):
+    rec = LocalEmbeddingRecognizer(path=str(tmp_path / "gallery.npz"))
+    results = rec.enroll_many([(jpeg(1), "a"), (b"not a jpeg", "b"), (jpeg(2), "c")])
+    assert [r["ok"] for r in results] == [True, False, True]
+    assert rec.size == 2
+    with pytest.raises(ValueError):
+        rec.enroll(b"not a jpeg", "b")
+
+
+def test_enrolled_image_predicts_its_own_tag():
+    rec = LocalEmbeddingRecognizer()
+    images = {f"tag-{i}": jpeg(i) for i in range(5)}
+    rec.enroll_many([(data, tag) for tag, data in images.items()])
+    top = rec.predict(images["tag-3"])["predictions"][0]
+    assert top["tagName"] == "tag-3"
+    assert top["probability"] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_index_rows_enrolled_after_the_snapshot_are_skipped():
+    rec = LocalEmbeddingRecognizer()
+    rec.enroll_many([(jpeg(i), f"tag-{i}") for i in range(3)])
+
+    class RacingIndex:
+        """An index that already holds a row enrolled after scores() took its snapshot."""
+
+        def search(self, query, k):
+            return np.array([0, 5], dtype=np.int64), np.array([0.9, 0.95], dtype=np.float32)
+
+    rec.index = RacingIndex()
+    best, labels = rec.scores(rec.embed(jpeg(0)))
+    assert labels[int(np.argmax(best))] == "tag-0"
+    assert float(best.max()) == pytest.approx(0.9)
+
+
+def test_default_gallery_path_is_in_the_temp_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv("LOCAL_RECOGNIZER_PATH", raising=False)
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    assert LocalEmbeddingRecognizer.from_env().path == str(tmp_path / "recognizer_gallery.npz")
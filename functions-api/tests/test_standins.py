@@ -0,0 +1,36 @@
+import io
+import statistics
+import time
+
+from cv_client import CustomVisionClient
+from standins import CustomVisionStub, FakeBlobContainer, synthetic_frame
+
+
+def test_stub_predictions_are_not_held_back_by_delayed_acks():
+    stub = CustomVisionStub()
+    stub.add_tags(["student-1", "student-2"])
+    stub.start()
+    try:
+        cv = CustomVisionClient.from_env(prediction_endpoint=stub.endpoint, prediction_key="k",
+                                         project_id="p", published_name="n")
+        frame = synthetic_frame(1, size=(320, 240))
+        samples = []
+        for _ in range(15):
+            t0 = time.perf_counter()
+            result = cv.predict(frame)
+            samples.append(time.perf_counter() - t0)
+        assert result["predictions"][0]["tagName"] in ("student-1", "student-2")
+        # Nagle + delayed ACK on the keep-alive socket costs ~40 ms per call
+        assert statistics.median(samples[5:]) < 0.02
+    finally:
+        stub.stop()
+
+
+def test_fake_blob_upload_accepts_bytes_like_data_and_streams():
+    container = FakeBlobContainer()
+    container.upload_blob("a", b"1")
+    container.upload_blob("b", bytearray(b"2"))
+    container.upload_blob("c", memoryview(b"3"))
+    container.upload_blob("d", io.BytesIO(b"4"))
+    assert container.blobs == {"a": b"1", "b": b"2", "c": b"3", "d": b"4"}
+    assert all(type(blob) is bytes for blob in container.blobs.values())
@@ -0,0 +1,104 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from timing import LatencyHistogram, Metrics, current_request, stage
+
+
+class Response:
+    def __init__(self):
+        self.headers = {}
+
+
+class Request:
+    def __init__(self, method="GET"):
+        self.method = method
+
+
+def test_histogram_quantiles_stay_within_a_few_percent():
+    rng = random.Random(0)
+    samples = sorted(rng.lognormvariate(-4, 1.2) for _ in range(20000))
+    hist = LatencyHistogram()
+    for s in samples:
+        hist.record(s)
+    for q, value in hist.quantiles().items():
+        exact = samples[int(q * len(samples)) - 1]
+        assert value == pytest.approx(exact, rel=0.04)
+    assert hist.count == len(samples) and hist.max == samples[-1]
+
+
+def test_empty_histogram_reports_zeros():
+    assert LatencyHistogram().quantiles() == {0.5: 0.0, 0.95: 0.0, 0.99: 0.0}
+
+
+def test_stages_nest_once_and_are_no_ops_outside_a_request():
+    registry = Metrics()
+    with stage("query"):
+        pass  # no request: nothing recorded
+    timing = registry.begin("getAttendance")
+    with stage("query"):
+        with stage("query"):
+            time.sleep(0.01)
+    timing.count("ru", 2.5)
+    header = registry.finish(timing)
+    assert len(timing.stages) == 1
+    assert header.startswith("query;dur=") and 'ru;desc="2.5"' in header
+    assert current_request() is None
+    assert set(registry.snapshot()["getAttendance"]) == {"query", "total"}
+
+
+def test_timed_sets_server_timing_and_skips_preflights():
+    registry = Metrics()
+
+    @registry.timed("listUsers")
+    def handler(req):
+        with stage("query"):
+            pass
+        return Response()
+
+    assert "Server-Timing" not in handler(Request("OPTIONS")).headers
+    assert "total;dur=" in handler(Request()).headers["Server-Timing"]
+    assert registry.snapshot()["listUsers"]["total"]["count"] == 1
+
+
+def test_timed_async_handlers_keep_their_own_timing():
+    registry = Metrics()
+
+    @registry.timed("markAttendance")
+    async def handler(req, delay):
+        with stage("predict"):
+            await asyncio.sleep(delay)
+        return Response()
+
+    async def main():
+        return await asyncio.gather(*(handler(Request(), d) for d in (0.01, 0.02, 0.03)))
+
+    asyncio.run(main())
+    assert registry.snapshot()["markAttendance"]["predict"]["count"] == 3
+
+
+def test_failed_requests_are_still_recorded():
+    registry = Metrics()
+
+    @registry.timed("uploadAndEnroll")
+    def handler(req):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        handler(Request())
+    assert registry.snapshot()["uploadAndEnroll"]["total"]["count"] == 1
+
+
+def test_render_includes_histograms_gauges_and_expositions():
+    registry = Metrics(prefix="att")
+    registry.observe('get"Attendance', "query", 0.004)
+    registry.add_collector("userCache", lambda: {"hitRatio": 0.5, "sizes": {"maxSize": 10}, "name": "x"})
+    registry.add_collector("broken", lambda: 1 / 0)
+    registry.add_exposition(lambda prefix: [f"{prefix}_custom 1"])
+    text = registry.render()
+    assert 'att_stage_seconds_count{endpoint="get\\"Attendance",stage="query"} 1' in text
+    assert "att_user_cache_hit_ratio 0.5" in text
+    assert "att_user_cache_sizes_max_size 10" in text
+    assert "att_custom 1" in text
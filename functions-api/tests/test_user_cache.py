@@ -0,0 +1,70 @@
+import threading
+
+import user_cache
+from user_cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_miss_and_ratio():
+    cache = TTLCache(maxsize=4, ttl=60)
+    assert cache.get("student-1") is None
+    cache.put("student-1", {"userId": "u1"})
+    assert cache.get("student-1") == {"userId": "u1"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hitRatio"]) == (1, 1, 0.5)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(user_cache.time, "monotonic", clock)
+    cache = TTLCache(ttl=10)
+    cache.put("student-1", "u1")
+    clock.now += 9.9
+    assert cache.get("student-1") == "u1"
+    clock.now += 0.2
+    assert cache.get("student-1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_by_key_and_by_value():
+    cache = TTLCache()
+    cache.put("student-1", {"userId": "u1"})
+    cache.put("student-1-alt", {"userId": "u1"})
+    cache.put("student-2", {"userId": "u2"})
+    cache.invalidate("student-2")
+    assert cache.get("student-2") is None
+    cache.invalidate_if(lambda user: user["userId"] == "u1")
+    assert cache.stats()["size"] == 0
+
+
+def test_concurrent_puts_stay_within_maxsize():
+    cache = TTLCache(maxsize=50, ttl=60)
+
+    def fill(offset):
+        for i in range(500):
+            cache.put(offset + i, i)
+            cache.get(offset + i // 2)
+
+    threads = [threading.Thread(target=fill, args=(n * 1000,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats()["size"] == 50
@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import seeded_container
+from user_listing import (DEFAULT_USER_FIELDS, USERS_PAGE_MAX, build_user_query, parse_user_list_params,
+                          query_user_page)
+
+
+def roster(n=25):
+    return seeded_container("users", (
+        {"id": f"u{i:03d}", "userId": f"u{i:03d}", "name": ("Asha " if i % 5 == 0 else "Ravi ") + str(i),
+         "roll": f"R{i:03d}", "classLabel": f"student-{i}", "lastEnrollBlob": "enroll/x.jpg"}
+        for i in range(n)))
+
+
+def test_defaults():
+    opts = parse_user_list_params({})
+    assert opts["fields"] == DEFAULT_USER_FIELDS
+    assert opts["prefix"] is None and opts["continuation"] is None
+
+
+@pytest.mark.parametrize("params", [{"limit": "abc"}, {"limit": "0"}, {"limit": str(USERS_PAGE_MAX + 1)},
+                                    {"fields": "name,password"}])
+def test_bad_params_are_rejected(params):
+    with pytest.raises(ValueError):
+        parse_user_list_params(params)
+
+
+def test_projection_always_includes_id_once():
+    opts = parse_user_list_params({"fields": "name, roll,id,name", "q": "  as "})
+    assert opts["fields"] == ("id", "name", "roll")
+    query, parameters = build_user_query(opts["fields"], opts["prefix"])
+    assert query.startswith("SELECT c.id, c.name, c.roll FROM c WHERE STARTSWITH(c.name, @p, true)")
+    assert parameters == [{"name": "@p", "value": "as"}]
+
+
+def test_pages_follow_the_continuation_to_the_end():
+    users = roster(25)
+    opts = parse_user_list_params({"limit": "10", "fields": "name"})
+    seen, pages = [], 0
+    while True:
+        page = query_user_page(users, opts)
+        pages += 1
+        assert all(set(item) == {"id", "name"} for item in page["items"])
+        seen += [item["id"] for item in page["items"]]
+        if not page["continuation"]:
+            break
+        opts["continuation"] = page["continuation"]
+    assert pages == 3 and len(set(seen)) == 25
+
+
+def test_prefix_search_matches_name_case_insensitively():
+    page = query_user_page(roster(25), parse_user_list_params({"q": "asha"}))
+    assert page["count"] == 5
+    assert "lastEnrollBlob" not in page["items"][0]
@@ -0,0 +1,84 @@
+import pytest
+
+from conftest import seeded_container
+from user_summary import NO_SECTION, UserSummary
+
+
+def containers(sections):
+    docs = []
+    for i, section in enumerate(sections):
+        doc = {"id": f"u{i}", "userId": f"u{i}", "name": f"Student {i}"}
+        if section is not None:
+            doc["section"] = section
+        docs.append(doc)
+    return seeded_container("summary"), seeded_container("users", docs)
+
+
+def test_first_read_reconciles_and_counts_users_without_a_section():
+    summary_container, users = containers(["A", "A", "B", None, "a/b"])
+    summary = UserSummary(summary_container, users).read()
+    assert summary["totalUsers"] == 5
+    assert summary["sections"] == {"A": 2, "B": 1, NO_SECTION: 1, "a/b": 1}
+
+
+def test_enrollments_patch_the_counters():
+    summary_container, users = containers(["A"])
+    summary = UserSummary(summary_container, users)
+    summary.reconcile()
+    summary.record_enrollment("B")                            # new user
+    summary.record_enrollment("a/b")                          # section name needing escaping
+    summary.record_enrollment("A", previous="B", is_new=False)  # moved section
+    summary.record_enrollment("A", previous="A", is_new=False)  # re-enrolled, no change
+    doc = summary.read()
+    assert doc["totalUsers"] == 3
+    assert doc["sections"] == {"A": 2, "B": 0, "a/b": 1}
+
+
+def test_enrollment_without_a_summary_recounts():
+    summary_container, users = containers(["A", "B"])
+    UserSummary(summary_container, users).record_enrollment("B")
+    assert summary_container.read_item("users-summary", partition_key="users-summary")["totalUsers"] == 2
+
+
+def test_reconcile_corrects_drift():
+    summary_container, users = containers(["A", "A", "B"])
+    summary = UserSummary(summary_container, users)
+    summary.reconcile()
+    users.delete_item("u0", partition_key="u0")
+    summary.record_enrollment("C")  # counter now says 4, two users exist
+    assert summary.reconcile()["totalUsers"] == 2
+    assert summary.read()["sections"] == {"A": 1, "B": 1}
+
+
+def test_reconcile_retries_when_an_enrollment_lands_mid_count(monkeypatch):
+    summary_container, users = containers(["A"])
+    summary = UserSummary(summary_container, users)
+    summary.reconcile()
+    count_users = summary.count_users
+    calls = []
+
+    def racing_count():
+        calls.append(1)
+        if len(calls) == 1:
+            users.seed([{"id": "late", "userId": "late", "section": "B"}])
+            summary.record_enrollment("B")  # changes the etag under the recount
+        return count_users()
+
+    monkeypatch.setattr(summary, "count_users", racing_count)
+    assert summary.reconcile()["totalUsers"] == 2
+    assert len(calls) == 2
+
+
+def test_reconcile_gives_up_when_the_summary_keeps_changing(monkeypatch):
+    summary_container, users = containers(["A"])
+    summary = UserSummary(summary_container, users)
+    summary.reconcile()
+    count_users = summary.count_users
+
+    def always_racing():
+        summary.record_enrollment("A", previous="B", is_new=False)
+        return count_users()
+
+    monkeypatch.setattr(summary, "count_users", always_racing)
+    with pytest.raises(RuntimeError):
+        summary.reconcile(attempts=2)
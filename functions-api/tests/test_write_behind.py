@@ -0,0 +1,215 @@
+import json
+import threading
+import time
+
+import pytest
+from azure.cosmos import exceptions
+
+from attendance_index import DailyMarkIndex
+from conftest import wait_for
+from write_behind import AttendanceWriteBehind
+
+
+class FakeContainer:
+    """create_item / execute_item_batch with Cosmos' 409 semantics; `gate` holds writes."""
+
+    def __init__(self, existing=()):
+        self.items = {row["id"]: row for row in existing}
+        self.gate = threading.Event()
+        self.gate.set()
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def create_item(self, row):
+        self.gate.wait()
+        with self.lock:
+            if row["id"] in self.items:
+                raise exceptions.CosmosResourceExistsError(status_code=409, message="exists")
+            self.items[row["id"]] = row
+
+    def execute_item_batch(self, batch_operations, partition_key):
+        self.gate.wait()
+        rows = [args[0] for _, args in batch_operations]
+        with self.lock:
+            for i, row in enumerate(rows):
+                if row["id"] in self.items:
+                    raise exceptions.CosmosBatchOperationError(error_index=i, headers={}, status_code=409,
+                                                              message="exists")
+            self.items.update((row["id"], row) for row in rows)
+            self.batches.append(len(rows))
+
+
+def row(i, day="2024-06-01"):
+    return {"id": f"att-u{i}-{day.replace('-', '')}", "userId": f"u{i}", "localDate": day}
+
+
+def spool_files(tmp_path):
+    return sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("spool"))
+
+
+@pytest.fixture
+def make_writer(tmp_path):
+    writers = []
+
+    def make(container, **kwargs):
+        kwargs.setdefault("max_delay", 0.05)
+        writer = AttendanceWriteBehind(container, str(tmp_path / "spool.jsonl"), **kwargs)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.close(timeout=2)
+
+
+def test_rows_are_written_in_batches_and_the_spool_emptied(make_writer, tmp_path):
+    container = FakeContainer()
+    writer = make_writer(container)
+    assert all(writer.submit(row(i)) for i in range(50))
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    assert len(container.items) == 50
+    assert sum(container.batches) >= 49  # one partition, so transactional batches
+    assert writer.stats()["flushed"] == 50
+    assert (tmp_path / "spool.jsonl.000001").stat().st_size == 0
+
+
+def test_replay_after_crash_writes_missing_rows_and_counts_existing_as_duplicates(make_writer, tmp_path):
+    # A previous process spooled five rows (the legacy single file and a segment) and wrote two of them
+    (tmp_path / "spool.jsonl").write_text("".join(json.dumps(row(i)) + "\n" for i in range(3)))
+    (tmp_path / "spool.jsonl.000004").write_text("".join(json.dumps(row(i)) + "\n" for i in range(3, 5)))
+    container = FakeContainer(existing=[row(0), row(3)])
+
+    writer = make_writer(container)
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    stats = writer.stats()
+    assert sorted(container.items) == sorted(row(i)["id"] for i in range(5))
+    assert stats["flushed"] == 3
+    assert stats["duplicates"] == 2
+    # Replayed segments are gone; only the new, empty active segment remains
+    assert spool_files(tmp_path) == ["spool.jsonl.000005"]
+
+
+def test_conflict_is_reported_as_a_duplicate_not_a_write(make_writer):
+    container = FakeContainer(existing=[row(1)])
+    writer = make_writer(container)
+    writer.submit(row(1))
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    assert writer.stats()["flushed"] == 0
+    assert writer.stats()["duplicates"] == 1
+
+
+def test_one_conflict_in_a_batch_still_writes_the_rest(make_writer):
+    container = FakeContainer(existing=[row(2)])
+    container.gate.clear()
+    writer = make_writer(container, max_delay=0.2)
+    for i in range(5):
+        writer.submit(row(i))
+    container.gate.set()
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    assert len(container.items) == 5
+    assert writer.stats()["duplicates"] == 1
+    assert writer.stats()["flushed"] == 4
+
+
+def test_spool_rotates_and_written_segments_are_deleted(make_writer, tmp_path):
+    container = FakeContainer()
+    container.gate.clear()
+    writer = make_writer(container, segment_bytes=200)
+    for i in range(20):
+        assert writer.submit(row(i))
+    assert len(spool_files(tmp_path)) > 3  # backlog spread over several segments
+
+    container.gate.set()
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    assert writer.stats()["spoolSegments"] == 1
+    assert len(spool_files(tmp_path)) == 1
+
+
+def test_blocked_submit_does_not_hold_the_spool_lock(make_writer):
+    container = FakeContainer()
+    container.gate.clear()
+    writer = make_writer(container, max_queue=1, max_delay=0.01, enqueue_timeout=1.0)
+    writer.submit(row(0))                   # taken by the flusher, which blocks on the gate
+    assert wait_for(lambda: writer.depth == 0)
+    time.sleep(0.05)                        # past the flusher's batching window
+    writer.submit(row(1))                   # fills the queue
+    assert writer.depth == 1
+
+    result = {}
+    blocked = threading.Thread(target=lambda: result.setdefault("ok", writer.submit(row(2))))
+    blocked.start()
+    time.sleep(0.1)
+    assert writer._spool_lock.acquire(timeout=0.05)
+    writer._spool_lock.release()
+
+    blocked.join()
+    assert result["ok"] is False
+    assert writer.stats()["rejected"] == 1
+    container.gate.set()
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    assert "att-u2-20240601" not in container.items
+
+
+class FlakyContainer(FakeContainer):
+    """FakeContainer whose writes touching a row `fail(row)` picks raise a 503."""
+
+    def __init__(self, fail, existing=()):
+        super().__init__(existing)
+        self.fail = fail
+
+    def check(self, rows):
+        if any(self.fail(row) for row in rows):
+            raise exceptions.CosmosHttpResponseError(status_code=503, message="unavailable")
+
+    def create_item(self, row):
+        self.check([row])
+        super().create_item(row)
+
+    def execute_item_batch(self, batch_operations, partition_key):
+        self.check([args[0] for _, args in batch_operations])
+        super().execute_item_batch(batch_operations, partition_key)
+
+
+def test_partial_flush_is_retried_without_rewriting_the_written_groups(make_writer):
+    failures = iter([True])
+    container = FlakyContainer(lambda r: r["localDate"] == "2024-06-02" and next(failures, False))
+    container.gate.clear()
+    writer = make_writer(container, max_delay=0.2, retry_backoff=0.01)
+    for i in range(3):
+        writer.submit(row(i, "2024-06-01"))
+        writer.submit(row(i, "2024-06-02"))
+    container.gate.set()
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    stats = writer.stats()
+    assert len(container.items) == 6
+    assert stats["errors"] == 1
+    assert stats["flushed"] == 6
+    assert stats["duplicates"] == 0
+
+
+def test_persistently_failing_row_is_dead_lettered_and_the_rest_written(make_writer, tmp_path):
+    container = FlakyContainer(lambda r: r["userId"] == "u3")
+    container.gate.clear()
+    writer = make_writer(container, max_delay=0.2, retry_backoff=0.01, max_attempts=3)
+    for i in range(8):
+        writer.submit(row(i))
+    container.gate.set()
+    assert wait_for(lambda: writer.stats()["outstanding"] == 0)
+    stats = writer.stats()
+    assert sorted(container.items) == sorted(row(i)["id"] for i in range(8) if i != 3)
+    assert stats["flushed"] == 7
+    assert stats["deadLettered"] == 1
+    dead = [json.loads(line) for line in (tmp_path / "spool.jsonl.dead").read_text().splitlines()]
+    assert [d["row"] for d in dead] == [row(3)]
+
+    # The queue keeps moving after the dead letter
+    writer.submit(row(9))
+    assert wait_for(lambda: "att-u9-20240601" in container.items)
+
+
+def test_daily_mark_index_claim_lets_one_record_win():
+    index = DailyMarkIndex(lambda day: [])
+    first, second = row(1), {**row(1), "device": "kiosk-2"}
+    assert index.claim(first, "2024-06-01") is None
+    assert index.claim(second, "2024-06-01") is first
+    assert index.get("u1", "2024-06-01") is first
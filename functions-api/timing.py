@@ -0,0 +1,301 @@
+import asyncio
+import contextvars
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Timing of the request being handled on this thread / asyncio task
+_current = contextvars.ContextVar("request_timing", default=None)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram (HDR-style) over whole microseconds.
+    - Values below SUB_BUCKETS are exact; above that every power of two is split
+      into SUB_BUCKETS equal slots, so a reported quantile is within ~3% of the
+      recorded value at any magnitude.
+    - Only occupied slots are stored; recording is one dict increment.
+    """
+
+    SUB_BUCKETS = 32
+    _SHIFT = SUB_BUCKETS.bit_length()  # bits kept below the leading one
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def _index(cls, us: int) -> int:
+        if us < cls.SUB_BUCKETS:
+            return us
+        exp = us.bit_length() - cls._SHIFT
+        return (exp + 1) * cls.SUB_BUCKETS + (us >> exp) - cls.SUB_BUCKETS
+
+    @classmethod
+    def _value(cls, index: int) -> float:
+        """Midpoint of a slot, in microseconds."""
+        if index < cls.SUB_BUCKETS:
+            return float(index)
+        exp = index // cls.SUB_BUCKETS - 1
+        low = (index % cls.SUB_BUCKETS + cls.SUB_BUCKETS) << exp
+        return low + ((1 << exp) - 1) / 2
+
+    def record(self, seconds: float):
+        index = self._index(max(0, int(seconds * 1e6)))
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantiles(self, qs=QUANTILES) -> dict:
+        """{q: seconds} for each requested quantile (0.0 when empty)."""
+        with self._lock:
+            items = sorted(self._counts.items())
+            total = self.count
+        out = {q: 0.0 for q in qs}
+        if not total:
+            return out
+        pending = sorted(qs)
+        seen = 0
+        for index, n in items:
+            seen += n
+            while pending and seen >= pending[0] * total:
+                out[pending.pop(0)] = self._value(index) / 1e6
+            if not pending:
+                break
+        return out
+
+
+class RequestTiming:
+    """
+    Stage durations of one request, in the order they finished, plus named
+    counters (e.g. Cosmos RU) that other modules add to while it runs.
+    """
+
+    __slots__ = ("endpoint", "started", "stages", "active", "counters")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = []
+        self.active = set()
+        self.counters = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages.append((stage, seconds))
+
+    def count(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def totals(self) -> dict:
+        """Seconds per stage name; a stage entered more than once is summed."""
+        out = {}
+        for stage, seconds in self.stages:
+            out[stage] = out.get(stage, 0.0) + seconds
+        return out
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.totals().items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        parts.extend(f'{name};desc="{value:g}"' for name, value in self.counters.items())
+        return ", ".join(parts)
+
+
+def current_request():
+    """The RequestTiming of the request being handled here, or None."""
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time the enclosed block as `name` in the current request.
+    A no-op outside a request (e.g. on pool threads) and inside an enclosing
+    stage of the same name, so a helper timed at both levels counts once.
+    Also usable as a decorator on sync functions.
+    """
+    timing = _current.get()
+    if timing is None or name in timing.active:
+        yield
+        return
+    timing.active.add(name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.active.discard(name)
+        timing.add(name, time.perf_counter() - t0)
+
+
+def label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric_name(key: str) -> str:
+    """camelCase stats key -> snake_case Prometheus name segment."""
+    return re.sub(r"[^a-zA-Z0-9_]", "_", re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", key)).lower()
+
+
+class Metrics:
+    """
+    Per-endpoint, per-stage latency histograms plus component gauges.
+    - begin(endpoint) / finish(timing) bracket a request; stages recorded with
+      stage() in between land in (endpoint, stage) histograms, and the whole
+      request in (endpoint, "total").
+    - add_collector(name, fn) exposes the numeric fields of fn() (e.g. a cache's
+      stats()) as gauges named <prefix>_<name>_<field>.
+    - add_exposition(fn) appends fn(prefix)'s lines for metrics with their
+      own labels (e.g. Cosmos RU per endpoint and query).
+    - render() is the Prometheus text exposition of all of it.
+    """
+
+    def __init__(self, prefix: str = "attendance"):
+        self.prefix = prefix
+        self._histograms = {}
+        self._collectors = {}
+        self._expositions = []
+        self._lock = threading.Lock()
+
+    def histogram(self, endpoint: str, stage_name: str) -> LatencyHistogram:
+        key = (endpoint, stage_name)
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, LatencyHistogram())
+        return hist
+
+    def observe(self, endpoint: str, stage_name: str, seconds: float):
+        self.histogram(endpoint, stage_name).record(seconds)
+
+    def begin(self, endpoint: str) -> RequestTiming:
+        timing = RequestTiming(endpoint)
+        _current.set(timing)
+        return timing
+
+    def finish(self, timing: RequestTiming) -> str:
+        """Record the request's stages; returns its Server-Timing header value."""
+        total = time.perf_counter() - timing.started
+        if _current.get() is timing:
+            _current.set(None)
+        for stage_name, seconds in timing.totals().items():
+            self.observe(timing.endpoint, stage_name, seconds)
+        self.observe(timing.endpoint, "total", total)
+        return timing.server_timing(total)
+
+    def timed(self, endpoint: str, header: bool = True):
+        """
+        Decorator for an Azure Functions HTTP handler (sync or async): times the
+        call, records it and sets Server-Timing on the response. Preflights
+        (OPTIONS) pass straight through.
+        """
+        def decorate(fn):
+            def preflight(args, kwargs):
+                req = kwargs.get("req", args[0] if args else None)
+                return getattr(req, "method", None) == "OPTIONS"
+
+            def done(timing, response):
+                value = self.finish(timing)
+                if header and response is not None:
+                    response.headers["Server-Timing"] = value
+                return response
+
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def handler(*args, **kwargs):
+                    if preflight(args, kwargs):
+                        return await fn(*args, **kwargs)
+                    timing = self.begin(endpoint)
+                    try:
+                        response = await fn(*args, **kwargs)
+                    except BaseException:
+                        self.finish(timing)
+                        raise
+                    return done(timing, response)
+            else:
+                @functools.wraps(fn)
+                def handler(*args, **kwargs):
+                    if preflight(args, kwargs):
+                        return fn(*args, **kwargs)
+                    timing = self.begin(endpoint)
+                    try:
+                        response = fn(*args, **kwargs)
+                    except BaseException:
+                        self.finish(timing)
+                        raise
+                    return done(timing, response)
+            return handler
+        return decorate
+
+    def add_collector(self, name: str, fn):
+        self._collectors[name] = fn
+
+    def add_exposition(self, fn):
+        self._expositions.append(fn)
+
+    def snapshot(self) -> dict:
+        """{endpoint: {stage: {count, sum, max, p50, p95, p99}}} in seconds."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+        out = {}
+        for (endpoint, stage_name), hist in items:
+            qs = hist.quantiles()
+            out.setdefault(endpoint, {})[stage_name] = {
+                "count": hist.count,
+                "sum": round(hist.sum, 6),
+                "max": round(hist.max, 6),
+                **{f"p{round(q * 100)}": round(v, 6) for q, v in qs.items()},
+            }
+        return out
+
+    def _gauges(self, name: str, values: dict, path=()):
+        for key, value in values.items():
+            if isinstance(value, dict):
+                yield from self._gauges(name, value, path + (key,))
+            elif isinstance(value, (int, float)):
+                field = "_".join(_metric_name(k) for k in path + (key,))
+                yield f"{self.prefix}_{_metric_name(name)}_{field}", float(value)
+
+    def render(self) -> str:
+        metric = f"{self.prefix}_stage_seconds"
+        lines = [
+            f"# HELP {metric} Handler latency per endpoint and stage",
+            f"# TYPE {metric} summary",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+        for (endpoint, stage_name), hist in items:
+            labels = f'endpoint="{label(endpoint)}",stage="{label(stage_name)}"'
+            for q, v in hist.quantiles().items():
+                lines.append(f'{metric}{{{labels},quantile="{q}"}} {v:.6f}')
+            lines.append(f"{metric}_sum{{{labels}}} {hist.sum:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {hist.count}")
+
+        for name, fn in list(self._collectors.items()):
+            try:
+                values = fn()
+            except Exception:
+                continue
+            for gauge, value in self._gauges(name, values or {}):
+                lines.append(f"# TYPE {gauge} gauge")
+                lines.append(f"{gauge} {value:g}")
+
+        for fn in list(self._expositions):
+            try:
+                lines.extend(fn(self.prefix))
+            except Exception:
+                continue
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by the handlers
+metrics = Metrics()
@@ -0,0 +1,117 @@
+"""
+Copy attendance documents into a container partitioned by /localDate.
+
+markAttendance now writes a `localDate` (IST calendar day, YYYY-MM-DD) on every
+record and getAttendance reads one day with a single-partition query. Cosmos
+cannot change a container's partition key in place, so existing history is
+copied into a new container, backfilling `localDate` from each document's
+`timestamp` (or `_ts` when that is missing). The copies get a new `_ts`, so a
+missing `timestamp` is backfilled from the original `_ts`; the API orders
+attendance by `timestamp`. Upserts make the copy re-runnable; --state lets an
+interrupted run resume from the last completed page.
+
+    python tools/migrate_attendance_partitions.py --target attendance_by_date --create
+    python tools/migrate_attendance_partitions.py --target attendance_by_date --dry-run
+
+Afterwards point COSMOS_ATTENDANCE_CONTAINER at the target container.
+Settings come from local.settings.json (like local_backend.py) or the environment.
+"""
+import argparse
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from azure.cosmos import CosmosClient, PartitionKey
+
+IST = timezone(timedelta(hours=5, minutes=30))
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts", "_lsn")
+
+
+def load_settings(path: str = "local.settings.json"):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for key, value in json.load(f).get("Values", {}).items():
+                os.environ.setdefault(key, value)
+
+
+def local_date_for(doc: dict) -> str:
+    """IST calendar day of a record, from its ISO timestamp or the Cosmos _ts."""
+    if doc.get("localDate"):
+        return doc["localDate"]
+    ts = doc.get("timestamp")
+    if ts:
+        try:
+            moment = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+            return moment.astimezone(IST).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(doc["_ts"], tz=timezone.utc).astimezone(IST).strftime("%Y-%m-%d")
+
+
+def timestamp_for(doc: dict) -> str:
+    """The record's check-in time: its own `timestamp`, else the original _ts in markAttendance's format."""
+    if doc.get("timestamp"):
+        return doc["timestamp"]
+    return datetime.fromtimestamp(doc["_ts"], tz=timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--source", default=None, help="source container (default: COSMOS_ATTENDANCE_CONTAINER)")
+    ap.add_argument("--target", required=True, help="target container partitioned by /localDate")
+    ap.add_argument("--create", action="store_true", help="create the target container if missing")
+    ap.add_argument("--dry-run", action="store_true", help="read and report only; write nothing")
+    ap.add_argument("--page-size", type=int, default=500)
+    ap.add_argument("--state", default="migrate_attendance_state.json",
+                    help="file holding the continuation token for resuming")
+    args = ap.parse_args()
+
+    load_settings()
+    client = CosmosClient(os.environ["COSMOS_URI"], os.environ["COSMOS_KEY"])
+    db = client.get_database_client(os.environ["COSMOS_DB"])
+    source = db.get_container_client(args.source or os.environ["COSMOS_ATTENDANCE_CONTAINER"])
+    if args.create and not args.dry_run:
+        target = db.create_container_if_not_exists(id=args.target, partition_key=PartitionKey(path="/localDate"))
+    else:
+        target = db.get_container_client(args.target)
+
+    token = None
+    if os.path.exists(args.state):
+        with open(args.state, "r") as f:
+            token = json.load(f).get("continuation")
+        print(f"Resuming from saved continuation token in {args.state}")
+
+    pages = source.query_items(
+        query="SELECT * FROM c",
+        enable_cross_partition_query=True,
+        max_item_count=args.page_size
+    ).by_page(token)
+
+    copied, per_day = 0, Counter()
+    for page in pages:
+        for doc in page:
+            local_date, timestamp = local_date_for(doc), timestamp_for(doc)
+            doc = {k: v for k, v in doc.items() if k not in SYSTEM_PROPERTIES}
+            doc["localDate"] = local_date
+            doc["timestamp"] = timestamp
+            per_day[doc["localDate"]] += 1
+            if not args.dry_run:
+                target.upsert_item(doc)
+            copied += 1
+        if not args.dry_run:
+            with open(args.state, "w") as f:
+                json.dump({"continuation": pages.continuation_token, "copied": copied}, f)
+        print(f"... {copied} documents")
+
+    if not args.dry_run and os.path.exists(args.state):
+        os.remove(args.state)
+    print(f"{'Would copy' if args.dry_run else 'Copied'} {copied} documents across {len(per_day)} days")
+    for day, count in sorted(per_day.items())[-10:]:
+        print(f"  {day}: {count}")
+
+
+if __name__ == "__main__":
+    main()
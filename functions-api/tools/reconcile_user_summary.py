@@ -0,0 +1,58 @@
+"""
+Recount users and rewrite the usersSummary counter document.
+
+uploadAndEnroll keeps the summary current with incremental patches; this
+recount corrects any drift (e.g. users deleted directly in Cosmos). The
+Functions app runs the same reconcile on a timer (USER_SUMMARY_RECONCILE_SCHEDULE).
+
+    python tools/reconcile_user_summary.py --create
+    python tools/reconcile_user_summary.py --dry-run
+
+Settings come from local.settings.json (like local_backend.py) or the environment.
+"""
+import argparse
+import json
+import os
+import sys
+
+from azure.cosmos import CosmosClient, PartitionKey
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from user_summary import UserSummary  # noqa: E402
+
+
+def load_settings(path: str = "local.settings.json"):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for key, value in json.load(f).get("Values", {}).items():
+                os.environ.setdefault(key, value)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--container", default=None, help="summary container (default: COSMOS_SUMMARY_CONTAINER)")
+    ap.add_argument("--create", action="store_true", help="create the summary container if missing")
+    ap.add_argument("--dry-run", action="store_true", help="count and print only; write nothing")
+    args = ap.parse_args()
+
+    load_settings()
+    client = CosmosClient(os.environ["COSMOS_URI"], os.environ["COSMOS_KEY"])
+    db = client.get_database_client(os.environ["COSMOS_DB"])
+    users = db.get_container_client(os.environ["COSMOS_USERS_CONTAINER"])
+    name = args.container or os.environ.get("COSMOS_SUMMARY_CONTAINER")
+    if not name:
+        ap.error("set COSMOS_SUMMARY_CONTAINER or pass --container")
+    if args.create and not args.dry_run:
+        container = db.create_container_if_not_exists(id=name, partition_key=PartitionKey(path="/id"))
+    else:
+        container = db.get_container_client(name)
+
+    summary = UserSummary(container, users)
+    doc = summary.count_users() if args.dry_run else summary.reconcile()
+    print(f"{'Counted' if args.dry_run else 'Reconciled'} {doc['totalUsers']} users")
+    for section, count in sorted(doc["sections"].items()):
+        print(f"  {section}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+
+# Fields listUsers may project; lastEnrollBlob is only returned when asked for
+USER_FIELDS = ("id", "userId", "name", "roll", "classLabel", "section", "createdAt", "lastEnrollBlob")
+DEFAULT_USER_FIELDS = ("id", "userId", "name", "roll", "classLabel", "section", "createdAt")
+
+USERS_PAGE_DEFAULT = int(os.getenv("USERS_PAGE_DEFAULT", "100"))
+USERS_PAGE_MAX = int(os.getenv("USERS_PAGE_MAX", "1000"))
+
+
+def parse_user_list_params(params) -> dict:
+    """
+    Validate listUsers query params.
+    - limit: page size (default USERS_PAGE_DEFAULT, at most USERS_PAGE_MAX)
+    - fields: comma-separated projection from USER_FIELDS (id is always included)
+    - q: case-insensitive prefix matched against name and roll
+    - continuation: token from the previous page
+    """
+    raw_limit = params.get("limit")
+    try:
+        limit = int(raw_limit) if raw_limit else USERS_PAGE_DEFAULT
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= USERS_PAGE_MAX:
+        raise ValueError(f"limit must be between 1 and {USERS_PAGE_MAX}")
+
+    fields = DEFAULT_USER_FIELDS
+    if params.get("fields"):
+        requested = [f.strip() for f in params.get("fields").split(",") if f.strip()]
+        unknown = [f for f in requested if f not in USER_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}; allowed: {', '.join(USER_FIELDS)}")
+        fields = tuple(dict.fromkeys(["id"] + requested))
+
+    return {
+        "limit": limit,
+        "fields": fields,
+        "prefix": (params.get("q") or "").strip() or None,
+        "continuation": params.get("continuation") or None,
+    }
+
+
+def build_user_query(fields, prefix: str = None) -> tuple:
+    """(query, parameters) selecting `fields`, optionally filtered by a name/roll prefix."""
+    query = "SELECT " + ", ".join(f"c.{f}" for f in fields) + " FROM c"
+    parameters = []
+    if prefix:
+        query += " WHERE STARTSWITH(c.name, @p, true) OR STARTSWITH(c.roll, @p, true)"
+        parameters.append({"name": "@p", "value": prefix})
+    return query, parameters
+
+
+def query_user_page(container, opts: dict) -> dict:
+    """
+    Run one page of the listUsers query against the users container.
+    The projection, filter and page size are pushed down to Cosmos, so each call
+    costs at most one page of RUs; `continuation` is None on the last page.
+    """
+    query, parameters = build_user_query(opts["fields"], opts["prefix"])
+    pages = container.query_items(
+        query=query,
+        parameters=parameters,
+        enable_cross_partition_query=True,
+        max_item_count=opts["limit"]
+    ).by_page(opts["continuation"])
+    items = list(next(pages, []))
+    return {
+        "ok": True,
+        "count": len(items),
+        "items": items,
+        "continuation": pages.continuation_token,
+    }
@@ -0,0 +1,119 @@
+import logging
+from collections import Counter
+from datetime import datetime
+
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+SUMMARY_DOC_ID = "users-summary"
+
+# Key used in `sections` for users enrolled without a section
+NO_SECTION = "_none"
+
+
+def _section_key(section) -> str:
+    return section or NO_SECTION
+
+
+def _pointer(key: str) -> str:
+    """Escape a section name for use in a JSON patch path."""
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+class UserSummary:
+    """
+    Counter document for usersSummary: {"totalUsers": N, "sections": {section: n}}.
+    - Lives in its own container (partition key /id) so user queries never see it.
+    - record_enrollment() applies the delta for one enrollment with a patch
+      (atomic server-side increments), so concurrent enrollments don't race.
+    - reconcile() recounts the users container and replaces the document;
+      run it periodically to correct any drift.
+    """
+
+    def __init__(self, container, users_container, doc_id: str = SUMMARY_DOC_ID):
+        self.container = container
+        self.users = users_container
+        self.doc_id = doc_id
+
+    def read(self) -> dict:
+        """Point read of the summary; reconciles first if it does not exist yet."""
+        try:
+            doc = self.container.read_item(self.doc_id, partition_key=self.doc_id)
+        except exceptions.CosmosResourceNotFoundError:
+            doc = self.reconcile()
+        return {
+            "totalUsers": doc.get("totalUsers", 0),
+            "sections": doc.get("sections", {}),
+            "updatedAt": doc.get("updatedAt"),
+        }
+
+    def record_enrollment(self, new_section, previous=None, is_new: bool = True):
+        """
+        Apply one enrollment: a new user adds one to the total and their section;
+        an existing user only moves between sections when the section changed.
+        """
+        new_key = _section_key(new_section)
+        ops = []
+        if is_new:
+            ops.append({"op": "incr", "path": "/totalUsers", "value": 1})
+            ops.append({"op": "incr", "path": f"/sections/{_pointer(new_key)}", "value": 1})
+        else:
+            old_key = _section_key(previous)
+            if old_key == new_key:
+                return
+            ops.append({"op": "incr", "path": f"/sections/{_pointer(old_key)}", "value": -1})
+            ops.append({"op": "incr", "path": f"/sections/{_pointer(new_key)}", "value": 1})
+        ops.append({"op": "set", "path": "/updatedAt", "value": datetime.utcnow().isoformat() + "Z"})
+        try:
+            self.container.patch_item(self.doc_id, partition_key=self.doc_id, patch_operations=ops)
+        except exceptions.CosmosResourceNotFoundError:
+            # First enrollment since the summary was dropped; a recount includes this user
+            self.reconcile()
+
+    def count_users(self) -> dict:
+        """Recount from the users container (one cross-partition scan)."""
+        sections = Counter()
+        for section in self.users.query_items(
+            query="SELECT VALUE c.section FROM c",
+            enable_cross_partition_query=True
+        ):
+            sections[_section_key(section)] += 1
+        # Users with no section property at all are not returned by SELECT VALUE
+        total = list(self.users.query_items(
+            query="SELECT VALUE COUNT(1) FROM c",
+            enable_cross_partition_query=True
+        ))[0]
+        missing = total - sum(sections.values())
+        if missing > 0:
+            sections[NO_SECTION] += missing
+        return {"totalUsers": total, "sections": dict(sections)}
+
+    def reconcile(self, attempts: int = 3) -> dict:
+        """
+        Replace the summary with a fresh count. The replace is conditional on the
+        document's etag, so an enrollment landing mid-recount triggers a retry
+        instead of being overwritten.
+        """
+        for _ in range(max(1, attempts)):
+            try:
+                current = self.container.read_item(self.doc_id, partition_key=self.doc_id)
+            except exceptions.CosmosResourceNotFoundError:
+                current = None
+            counts = self.count_users()
+            doc = {"id": self.doc_id, **counts, "updatedAt": datetime.utcnow().isoformat() + "Z"}
+            try:
+                if current is None:
+                    self.container.create_item(doc)
+                else:
+                    self.container.replace_item(
+                        self.doc_id, doc,
+                        etag=current["_etag"],
+                        match_condition=MatchConditions.IfNotModified
+                    )
+            except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceExistsError):
+                continue
+            if current is not None and (current.get("totalUsers") != doc["totalUsers"]
+                                        or current.get("sections") != doc["sections"]):
+                logging.warning(f"User summary drift corrected: {current.get('totalUsers')} -> {doc['totalUsers']}")
+            return doc
+        raise RuntimeError("User summary kept changing during reconcile; try again later")
@@ -0,0 +1,326 @@
+import glob
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from azure.cosmos import exceptions
+
+# Cosmos transactional batches take at most 100 operations
+MAX_TRANSACTIONAL_BATCH = 100
+
+
+class AttendanceWriteBehind:
+    """
+    Write-behind queue for attendance inserts.
+    - submit() appends the record to a local JSONL spool (flushed + fsynced) and
+      queues it; the caller can respond as soon as it returns True.
+    - A background thread drains the queue when `max_batch` records are waiting or
+      the oldest has waited `max_delay` seconds, groups them by partition key and
+      writes each group with a transactional batch (single records: create_item).
+    - The queue is bounded: submit() waits up to `enqueue_timeout` and then returns
+      False so the caller writes synchronously instead (backpressure). The wait
+      happens outside the spool lock, so one blocked caller doesn't hold up the rest.
+    - The spool is a series of segments (<spool_path>.<n>) rotated at
+      `segment_bytes`; a segment is deleted once every record in it is written,
+      so the spool stays bounded by the unwritten backlog under steady load.
+    - Records already in Cosmos (409) are not new marks: they are counted as
+      `duplicates` and logged. Replaying the spool after a crash is still safe.
+    - A failed flush is retried with backoff, skipping the partition groups it
+      already wrote. After `max_attempts` the rest is split to isolate the rows
+      that keep failing; those are appended to <spool_path>.dead (`deadLettered`)
+      so one bad record can't stall the queue.
+    - close() stops the thread after flushing what is queued.
+    """
+
+    def __init__(self, container, spool_path: str, partition_key_field: str = "localDate",
+                 max_queue: int = 10000, max_batch: int = 100, max_delay: float = 0.5,
+                 enqueue_timeout: float = 0.25, retry_backoff: float = 1.0,
+                 max_attempts: int = 5, segment_bytes: int = 1 << 20):
+        self.container = container
+        self.spool_path = spool_path
+        self.partition_key_field = partition_key_field
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = float(max_delay)
+        self.enqueue_timeout = float(enqueue_timeout)
+        self.retry_backoff = float(retry_backoff)
+        self.max_attempts = max(1, int(max_attempts))
+        self.dead_letter_path = f"{spool_path}.dead"
+        self.segment_bytes = max(1, int(segment_bytes))
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._spool_lock = threading.Lock()
+        self._segments = {}  # segment number -> [path, records not yet written]
+        self._stop = threading.Event()
+        self.flushed = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+        self.dead_lettered = 0
+
+        replay = self._read_spool()
+        self._segment = max(self._segments, default=0) + 1
+        self._segments[self._segment] = [self._segment_path(self._segment), 0]
+        self._spool = open(self._segments[self._segment][0], "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="attendance-write-behind", daemon=True)
+        self._thread.start()
+        # Re-queue records a previous process spooled but may not have written
+        for item in replay:
+            self._queue.put(item)
+
+    @classmethod
+    def from_env(cls, container):
+        return cls(
+            container,
+            spool_path=os.getenv("ATTENDANCE_SPOOL_PATH",
+                                 os.path.join(tempfile.gettempdir(), "attendance_spool.jsonl")),
+            partition_key_field=os.getenv("ATTENDANCE_PARTITION_KEY_FIELD", "localDate"),
+            max_queue=int(os.getenv("ATTENDANCE_QUEUE_MAX", "10000")),
+            max_batch=int(os.getenv("ATTENDANCE_BATCH_MAX", "100")),
+            max_delay=float(os.getenv("ATTENDANCE_FLUSH_SECONDS", "0.5")),
+            enqueue_timeout=float(os.getenv("ATTENDANCE_ENQUEUE_TIMEOUT", "0.25")),
+            max_attempts=int(os.getenv("ATTENDANCE_WRITE_ATTEMPTS", "5")),
+            segment_bytes=int(os.getenv("ATTENDANCE_SPOOL_SEGMENT_BYTES", str(1 << 20))),
+        )
+
+    def _segment_path(self, number: int) -> str:
+        return f"{self.spool_path}.{number:06d}"
+
+    def _read_spool(self) -> list:
+        """(segment, row) for every record left by a previous process, oldest segment first."""
+        paths = {}
+        if os.path.exists(self.spool_path):
+            paths[0] = self.spool_path  # single-file spool from before segments
+        for path in glob.glob(glob.escape(self.spool_path) + ".*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                paths[int(suffix)] = path
+        replay = []
+        for number in sorted(paths):
+            with open(paths[number], "r", encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+            if not rows:
+                os.remove(paths[number])
+                continue
+            self._segments[number] = [paths[number], len(rows)]
+            replay.extend((number, row) for row in rows)
+        if replay:
+            logging.info(f"Write-behind replaying {len(replay)} spooled attendance records")
+        return replay
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, row: dict) -> bool:
+        """Durably spool and queue `row`; False means the queue is full (write it yourself)."""
+        if self._stop.is_set():
+            return False
+        with self._spool_lock:
+            if self._spool.closed:
+                return False
+            segment = self._segment
+            self._spool.write(json.dumps(row) + "\n")
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+            # Counted before it is queued, so the flusher can't acknowledge it first
+            self._segments[segment][1] += 1
+            if self._spool.tell() >= self.segment_bytes:
+                self._rotate_locked()
+        try:
+            self._queue.put((segment, row), timeout=self.enqueue_timeout)
+        except queue.Full:
+            # Spooled but not queued: the caller writes it, and a replay would only 409
+            self.rejected += 1
+            self._acknowledge({segment: 1})
+            return False
+        return True
+
+    def _rotate_locked(self):
+        self._spool.close()
+        previous = self._segment
+        self._segment += 1
+        self._segments[self._segment] = [self._segment_path(self._segment), 0]
+        self._spool = open(self._segments[self._segment][0], "a", encoding="utf-8")
+        self._release_locked(previous)
+
+    def _release_locked(self, number: int):
+        """Drop a segment whose records are all written (the active one is truncated instead)."""
+        path, pending = self._segments[number]
+        if pending:
+            return
+        if number != self._segment:
+            del self._segments[number]
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        elif not self._spool.closed:
+            self._spool.truncate(0)
+            self._spool.seek(0)
+
+    def _acknowledge(self, counts: dict):
+        with self._spool_lock:
+            for number, n in counts.items():
+                self._segments[number][1] -= n
+                self._release_locked(number)
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write_with_retry(batch)
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.max_delay)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Pick up anything already queued without waiting further
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_with_retry(self, batch: list):
+        rows = [row for _, row in batch]
+        done = set()  # indexes into rows already written (or found to exist) by this flush
+        delay = self.retry_backoff
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._write(rows, done)
+                break
+            except Exception as e:
+                self.errors += 1
+                if self._stop.is_set():
+                    # Shutting down: leave the rest in the spool for the next start
+                    logging.error(f"Write-behind giving up on {len(rows) - len(done)} records at shutdown: {str(e)}")
+                    self._acknowledge_rows(batch, done)
+                    return
+                if attempt == self.max_attempts:
+                    logging.error(f"Write-behind flush of {len(rows) - len(done)} records failed "
+                                  f"{attempt} times: {str(e)}; isolating the failing records")
+                    self._isolate(rows, [i for i in range(len(rows)) if i not in done], done)
+                    break
+                logging.error(f"Write-behind flush of {len(rows) - len(done)} records failed: {str(e)}; "
+                              f"retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        self.batches += 1
+        self._acknowledge_rows(batch, range(len(batch)))
+
+    def _acknowledge_rows(self, batch: list, indexes):
+        counts = defaultdict(int)
+        for i in indexes:
+            counts[batch[i][0]] += 1
+        if counts:
+            self._acknowledge(counts)
+
+    def _isolate(self, rows: list, indexes: list, done: set):
+        """Bisect `indexes` (one attempt per half) until the failing rows are alone, then dead-letter them."""
+        try:
+            self._write(rows, done, indexes)
+            return
+        except Exception as e:
+            if len(indexes) == 1:
+                self._dead_letter(rows[indexes[0]], e)
+                return
+        middle = len(indexes) // 2
+        for half in (indexes[:middle], indexes[middle:]):
+            remaining = [i for i in half if i not in done]
+            if remaining:
+                self._isolate(rows, remaining, done)
+
+    def _dead_letter(self, row: dict, error: Exception):
+        self.dead_lettered += 1
+        logging.error(f"Write-behind dead-lettering attendance {row.get('id')}: {str(error)}")
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"row": row, "error": str(error)}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write(self, rows: list, done: set, indexes=None):
+        """
+        Write rows[i] for each i in `indexes` (default: all) not yet in `done`,
+        adding each index to `done` once it is written or found to exist already.
+        """
+        groups = defaultdict(list)
+        for i in range(len(rows)) if indexes is None else indexes:
+            if i not in done:
+                groups[rows[i].get(self.partition_key_field)].append(i)
+        for pk, group in groups.items():
+            if len(group) == 1:
+                self._create_one(rows, group[0], done)
+                continue
+            for start in range(0, len(group), MAX_TRANSACTIONAL_BATCH):
+                chunk = group[start:start + MAX_TRANSACTIONAL_BATCH]
+                try:
+                    self.container.execute_item_batch(
+                        batch_operations=[("create", (rows[i],)) for i in chunk],
+                        partition_key=pk
+                    )
+                except exceptions.CosmosBatchOperationError:
+                    # One conflicting record fails the whole batch; write them one by one
+                    for i in chunk:
+                        self._create_one(rows, i, done)
+                    continue
+                self.flushed += len(chunk)
+                done.update(chunk)
+
+    def _create_one(self, rows: list, i: int, done: set):
+        if self._create(rows[i]):
+            self.flushed += 1
+        done.add(i)
+
+    def _create(self, row: dict) -> bool:
+        try:
+            self.container.create_item(row)
+            return True
+        except exceptions.CosmosResourceExistsError:
+            # Acknowledged to the caller as new, but another instance (or an
+            # earlier attempt before a crash) already wrote this user's mark
+            self.duplicates += 1
+            logging.warning(f"Write-behind: attendance {row.get('id')} already existed in Cosmos")
+            return False
+
+    def close(self, timeout: float = 10.0):
+        """Flush what is queued and stop the background thread."""
+        self._stop.set()
+        self._thread.join(timeout)
+        with self._spool_lock:
+            self._spool.close()
+            path, pending = self._segments[self._segment]
+            if not pending and os.path.exists(path):
+                os.remove(path)
+
+    def stats(self) -> dict:
+        with self._spool_lock:
+            outstanding = sum(pending for _, pending in self._segments.values())
+            segments = len(self._segments)
+        return {
+            "queueDepth": self.depth,
+            "outstanding": outstanding,
+            "spoolSegments": segments,
+            "flushed": self.flushed,
+            "duplicates": self.duplicates,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "deadLettered": self.dead_lettered,
+        }